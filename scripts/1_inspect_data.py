@@ -1,25 +1,317 @@
 # 檔案路徑: scripts/1_inspect_data.py
-from datasets import load_dataset
-import pandas as pd
+# 串流掃描完整資料集 (Hub 串流，或本地的 Arrow/Parquet cache)，以 record batch 為單位、
+# 用 Arrow compute / NumPy 向量化統計:
+#   PyraNet 的 rank 分布與各 rank 門檻的保留率、compile status 計數、
+#   instruction / code 字元長度分布、以實際 tokenizer 計算的 Alpaca 格式 token 長度分位數。
+# 長度以固定 bin 的直方圖累計，記憶體只與 batch 大小及 bin 數有關，與資料集筆數無關。
+# 報告寫入 data/profile_report.json，scripts/2_process_data.py 由此選擇 rank 門檻。
+#
+# 用法:
+#   python scripts/1_inspect_data.py                          # 從 Hub 串流完整資料集
+#   python scripts/1_inspect_data.py --pyranet ~/.cache/huggingface/datasets/bnadimi___pyra_net-verilog
+#   python scripts/1_inspect_data.py --no-tokens              # 不載入 tokenizer，只統計字元長度
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import time
 
-# 設定顯示選項
-pd.set_option('display.max_colwidth', 50)
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
-def inspect_dataset(name, split="train"):
-    print(f"\n{'='*20} 正在檢查: {name} {'='*20}")
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_REPORT_PATH = "./data/profile_report.json"
+TOKENIZER_NAME = "unsloth/llama-3-8b-bnb-4bit"
+BATCH_SIZE = 2000
+MAX_TOKEN_BIN = 32768     # token 長度直方圖的上限，更長的樣本歸入最後一格
+MAX_CHAR_BIN = 1 << 18
+QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+SEQ_LENGTH_CANDIDATES = (512, 1024, 2048, 4096, 8192)
+# 建議值: 保留至少 MIN_RETENTION 的 PyraNet 資料的最高 rank 門檻，
+# 以及能完整容納 COVERAGE 比例樣本的最小 max_seq_length
+MIN_RETENTION = 0.2
+COVERAGE = 0.99
+
+SOURCES = {
+    "pyranet": {"dataset": "bnadimi/PyraNet-Verilog", "instruction": "description", "code": "code"},
+    "synthetic": {"dataset": "sonyashijin/RTL_verilog_synthetic_Claude_3.7_verified_to_compile",
+                  "instruction": "evolved_nl", "code": "rtl"},
+}
+
+# PyraNet 的 description 是 JSON 字串；以正規表示式向量化擷取欄位，不逐筆 json.loads
+RANK_RE = r'"rank"\s*:\s*"?(?P<rank>-?\d+(?:\.\d+)?)'
+STATUS_RE = r'"compile_status"\s*:\s*"(?P<status>[^"]*)"'
+INSTRUCTION_RE = r'"description"\s*:\s*"(?P<text>(?:[^"\\]|\\.)*)"'
+
+def load_process_module():
+    # 2_process_data.py 的檔名不是合法的模組名稱，以檔案路徑載入，沿用同一份 Alpaca 模板與 MIN_RANK
+    spec = importlib.util.spec_from_file_location("process_data", os.path.join(SCRIPTS_DIR, "2_process_data.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class Histogram:
+    """整數值的固定 bin 直方圖；超過 max_value 的值歸入最後一格，另外記錄實際最大值"""
+
+    def __init__(self, max_value):
+        self.max_value = max_value
+        self.counts = np.zeros(max_value + 1, dtype=np.int64)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values):
+            return
+        self.total += len(values)
+        self.sum += int(values.sum())
+        self.max = max(self.max, int(values.max()))
+        counts = np.bincount(np.minimum(values, self.max_value))
+        self.counts[:len(counts)] += counts
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        value = int(np.searchsorted(np.cumsum(self.counts), max(1, int(np.ceil(q * self.total)))))
+        return self.max if value >= self.max_value else value
+
+    def fraction_within(self, limit):
+        if not self.total:
+            return None
+        return float(self.counts[:min(limit, self.max_value - 1) + 1].sum() / self.total)
+
+    def summary(self):
+        if not self.total:
+            return {"count": 0}
+        stats = {"count": self.total, "mean": self.sum / self.total, "max": self.max}
+        stats.update({f"p{q * 100:g}": self.quantile(q) for q in QUANTILES})
+        return stats
+
+# --- 1. 讀取來源: 本地 Arrow/Parquet 檔案，或 Hub 串流 ---
+def expand_paths(patterns):
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))) or [pattern]:
+            if os.path.isdir(path):
+                found = glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True)
+                found += glob.glob(os.path.join(path, "**", "*.arrow"), recursive=True)
+                paths.extend(sorted(found))
+            else:
+                paths.append(path)
+    return paths
+
+def iter_local_batches(paths, columns, batch_size):
+    for path in paths:
+        if path.endswith(".parquet"):
+            yield from pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+            continue
+        # datasets 的 cache 檔是 Arrow IPC stream 格式；也接受 IPC file 格式
+        with pa.memory_map(path) as source:
+            try:
+                reader = pa.ipc.open_stream(source)
+                batches = iter(reader)
+            except pa.ArrowInvalid:
+                reader = pa.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            for batch in batches:
+                yield batch.select(columns)
+
+def iter_hub_batches(name, columns, batch_size):
+    from datasets import load_dataset
+    ds = load_dataset(name, split="train", streaming=True).select_columns(columns)
+    for batch in ds.iter(batch_size=batch_size):
+        yield pa.RecordBatch.from_pydict(batch)
+
+# --- 2. 逐 batch 統計 ---
+class SourceProfile:
+    def __init__(self, name, has_rank):
+        self.name = name
+        self.has_rank = has_rank
+        self.rows = 0
+        self.rank_counts = {}
+        self.status_counts = {}
+        self.instruction_chars = Histogram(MAX_CHAR_BIN)
+        self.code_chars = Histogram(MAX_CHAR_BIN)
+        # rank -> token 長度直方圖，才能算出「通過 rank 門檻的樣本」的長度分布
+        self.tokens = {}
+
+    def _count(self, counter, values, missing):
+        for entry in pc.value_counts(values).to_pylist():
+            key = missing if entry["values"] is None else entry["values"]
+            counter[key] = counter.get(key, 0) + entry["counts"]
+
+    def add_batch(self, instructions, codes, token_lengths=None, ranks=None, statuses=None):
+        self.rows += len(codes)
+        self.instruction_chars.add(pc.utf8_length(instructions).fill_null(0).to_numpy(zero_copy_only=False))
+        self.code_chars.add(pc.utf8_length(codes).fill_null(0).to_numpy(zero_copy_only=False))
+        if ranks is not None:
+            self._count(self.rank_counts, ranks, None)
+            self._count(self.status_counts, statuses, "(missing)")
+        if token_lengths is None:
+            return
+        if ranks is None:
+            self.tokens.setdefault(None, Histogram(MAX_TOKEN_BIN)).add(token_lengths)
+            return
+        rank_values = ranks.fill_null(np.nan).to_numpy(zero_copy_only=False)
+        for rank in np.unique(rank_values):
+            mask = np.isnan(rank_values) if np.isnan(rank) else rank_values == rank
+            key = None if np.isnan(rank) else float(rank)
+            self.tokens.setdefault(key, Histogram(MAX_TOKEN_BIN)).add(token_lengths[mask])
+
+    def retention(self):
+        """各 rank 門檻 (rank >= t) 保留的比例；擷取不到 rank 的資料視為被過濾"""
+        table, kept = {}, 0
+        for rank in sorted((r for r in self.rank_counts if r is not None), reverse=True):
+            kept += self.rank_counts[rank]
+            table[rank] = kept / self.rows
+        return dict(sorted(table.items()))
+
+    def token_histogram(self, min_rank=None):
+        merged = Histogram(MAX_TOKEN_BIN)
+        for rank, hist in self.tokens.items():
+            if min_rank is None or (rank is not None and rank >= min_rank):
+                merged.merge(hist)
+        return merged
+
+    def report(self):
+        report = {
+            "rows": self.rows,
+            "instruction_chars": self.instruction_chars.summary(),
+            "code_chars": self.code_chars.summary(),
+        }
+        if self.has_rank:
+            report["rank"] = {
+                "histogram": {("(missing)" if rank is None else str(rank)): count
+                              for rank, count in sorted(self.rank_counts.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))},
+                "retention": {str(rank): fraction for rank, fraction in self.retention().items()},
+            }
+            report["compile_status"] = dict(sorted(self.status_counts.items(), key=lambda kv: -kv[1]))
+        if self.tokens:
+            tokens = self.token_histogram()
+            report["tokens"] = tokens.summary()
+            report["tokens"]["fraction_within"] = {str(n): tokens.fraction_within(n) for n in SEQ_LENGTH_CANDIDATES}
+        return report
+
+def decode_json_string(escaped):
     try:
-        # 只下載前 5 筆
-        ds = load_dataset(name, split=f"{split}[:5]")
-        
-        print(f"✅ 欄位名稱 (Columns): {ds.column_names}")
-        print(f"✅ 範例資料 (第一筆):")
-        df = ds.to_pandas()
-        print(df.iloc[0])
-        return ds.column_names
-    except Exception as e:
-        print(f"❌ 讀取失敗: {e}")
-        return []
-
-# 檢查兩個資料集
-inspect_dataset("bnadimi/PyraNet-Verilog")
-inspect_dataset("sonyashijin/RTL_verilog_synthetic_Claude_3.7_verified_to_compile")
\ No newline at end of file
+        return json.loads(f'"{escaped}"')
+    except ValueError:
+        return escaped
+
+def profile_source(name, batches, tokenizer, format_alpaca, max_rows=None):
+    spec = SOURCES[name]
+    profile = SourceProfile(name, has_rank=name == "pyranet")
+    start = time.perf_counter()
+    for batch in batches:
+        if max_rows is not None and profile.rows + batch.num_rows > max_rows:
+            batch = batch.slice(0, max_rows - profile.rows)
+        codes = batch.column(spec["code"])
+        raw = batch.column(spec["instruction"])
+        ranks = statuses = None
+        if profile.has_rank:
+            ranks = pc.cast(pc.struct_field(pc.extract_regex(raw, RANK_RE), [0]), pa.float64())
+            statuses = pc.struct_field(pc.extract_regex(raw, STATUS_RE), [0])
+            instructions = pc.struct_field(pc.extract_regex(raw, INSTRUCTION_RE), [0])
+        else:
+            instructions = raw
+
+        token_lengths = None
+        if tokenizer is not None:
+            texts = instructions.to_pylist()
+            if profile.has_rank:
+                texts = [decode_json_string(text) if text is not None else "" for text in texts]
+            texts = [format_alpaca(instruction, code or "") for instruction, code in zip(texts, codes.to_pylist())]
+            token_lengths = np.fromiter(
+                (len(ids) for ids in tokenizer(texts, add_special_tokens=True, return_attention_mask=False)["input_ids"]),
+                dtype=np.int64, count=len(texts),
+            )
+        profile.add_batch(instructions, codes, token_lengths, ranks, statuses)
+
+        elapsed = time.perf_counter() - start
+        print(f"\r   {name}: {profile.rows:,} 筆 ({profile.rows / max(elapsed, 1e-9):,.0f} rows/s)", end="", flush=True)
+        if max_rows is not None and profile.rows >= max_rows:
+            break
+    print()
+    return profile
+
+# --- 3. 建議門檻 ---
+def recommend(pyranet, synthetic):
+    retention = pyranet.retention()
+    passing = [rank for rank, fraction in retention.items() if fraction >= MIN_RETENTION]
+    min_rank = max(passing) if passing else None
+    result = {"min_rank": min_rank, "min_retention": MIN_RETENTION}
+    if pyranet.tokens or synthetic.tokens:
+        # 以實際會被保留的樣本 (通過 rank 門檻的 PyraNet + 全部 Synthetic) 計算長度覆蓋率
+        kept = pyranet.token_histogram(min_rank).merge(synthetic.token_histogram())
+        covering = [n for n in SEQ_LENGTH_CANDIDATES if kept.fraction_within(n) >= COVERAGE]
+        result["max_seq_length"] = covering[0] if covering else SEQ_LENGTH_CANDIDATES[-1]
+        result["coverage"] = kept.fraction_within(result["max_seq_length"])
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="串流統計完整資料集並輸出過濾門檻建議")
+    parser.add_argument("--pyranet", nargs="+", help="本地 PyraNet Arrow/Parquet 檔案、目錄或 glob (預設從 Hub 串流)")
+    parser.add_argument("--synthetic", nargs="+", help="本地 Synthetic Arrow/Parquet 檔案、目錄或 glob")
+    parser.add_argument("--tokenizer", default=TOKENIZER_NAME)
+    parser.add_argument("--no-tokens", action="store_true", help="不計算 token 長度 (不需下載 tokenizer)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-rows", type=int, default=None, help="每個來源最多讀取的筆數 (快速預覽)")
+    parser.add_argument("--output", default=PROFILE_REPORT_PATH)
+    args = parser.parse_args()
+
+    process = load_process_module()
+    tokenizer = None
+    if not args.no_tokens:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+    start = time.perf_counter()
+    profiles = {}
+    for name, spec in SOURCES.items():
+        columns = [spec["instruction"], spec["code"]]
+        local = getattr(args, name)
+        if local:
+            paths = expand_paths(local)
+            print(f"📂 {name}: 讀取 {len(paths)} 個本地檔案")
+            batches = iter_local_batches(paths, columns, args.batch_size)
+        else:
+            print(f"🌐 {name}: 從 Hub 串流 {spec['dataset']}")
+            batches = iter_hub_batches(spec["dataset"], columns, args.batch_size)
+        profiles[name] = profile_source(name, batches, tokenizer, process.format_alpaca, args.max_rows)
+
+    recommended = recommend(profiles["pyranet"], profiles["synthetic"])
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tokenizer": None if tokenizer is None else args.tokenizer,
+        "sources": {name: {"dataset": SOURCES[name]["dataset"], **profile.report()} for name, profile in profiles.items()},
+        "recommended": recommended,
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, args.output)
+
+    pyranet = profiles["pyranet"]
+    retention = pyranet.retention()
+    print(f"⏱️  耗時 {time.perf_counter() - start:.1f}s")
+    print(f"📊 PyraNet rank 保留率: " + ", ".join(f">= {rank:g}: {fraction:.1%}" for rank, fraction in retention.items()))
+    current = retention.get(float(process.MIN_RANK))
+    if current is not None:
+        print(f"   目前 MIN_RANK = {process.MIN_RANK} 保留 {current:.1%}")
+    print(f"✅ 建議 min_rank = {recommended['min_rank']}"
+          + (f", max_seq_length = {recommended['max_seq_length']} (涵蓋 {recommended['coverage']:.2%})"
+             if "max_seq_length" in recommended else ""))
+    print(f"📄 報告已寫入 {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 # 檔案路徑: scripts/2_process_data.py
 from datasets import load_dataset, concatenate_datasets
+import argparse
 import json
+import math
+import numpy as np
 import os
-import shutil
+import time
+
+from verilog_dedup import deduplicate
 
 # 定義 Alpaca 格式模板
 alpaca_prompt = """Below is an instruction that describes a hardware design task. Write the corresponding Verilog code.
@@ -16,83 +21,194 @@ alpaca_prompt = """Below is an instruction that describes a hardware design task
 ### Response:
 {}"""
 
-# --- 1. 過濾函數：只保留 Rank >= 18 的高品質資料 ---
-def filter_high_quality(example):
+# 過濾門檻與平行處理設定 (有 scripts/1_inspect_data.py 的報告時改用其建議的 rank 門檻)
+MIN_RANK = 18
+PROFILE_REPORT_PATH = "./data/profile_report.json"
+NUM_PROC = os.cpu_count() or 1
+BATCH_SIZE = 1000
+DEFAULT_INSTRUCTION = "Implement the Verilog module based on the code structure."
+
+# --- 1. 解析函數：每筆 description 只呼叫一次 json.loads ---
+def parse_pyranet_description(raw_desc):
+    """回傳 (rank, instruction)；若 description 不是合法的 JSON 物件則 rank 為 None"""
+    # PyraNet 的 description 是一個 JSON 字串
+    if not isinstance(raw_desc, str):
+        return None, ""
     try:
-        # PyraNet 的 description 是一個 JSON 字串
-        raw_desc = example['description']
-        if not isinstance(raw_desc, str):
-            return False
-            
         data = json.loads(raw_desc)
-        
         # 取得 rank，預設為 0
         rank = data.get('rank', 0)
-        
-        # 嘗試轉換為 float (因為可能是字串 "20" 或數字 20)
-        try:
-            rank = float(rank)
-        except (ValueError, TypeError):
-            rank = 0
-
-        # 【關鍵條件】 Rank 必須 >= 18
-        # 你也可以順便檢查 compile_status 是否為 "No error"，但 rank 通常已包含此隱含意義
-        if rank >= 18:
-            return True
-            
+        instruction = data.get('description', "")
     except Exception:
         # 如果 JSON 解析失敗，視為壞資料，過濾掉
-        return False
-        
-    return False
+        return None, ""
 
-# --- 2. 格式化函數 ---
-def format_pyranet(example):
-    # 因為我們在 filter 階段已經解析過一次，但為了 map 方便，這裡再解析一次取 description
-    # 效能影響微乎其微
-    instruction = ""
+    # 嘗試轉換為 float (因為可能是字串 "20" 或數字 20)
     try:
-        data = json.loads(example['description'])
-        instruction = data.get('description', "")
-    except:
-        pass
-
-    output = example['code']
-    
+        rank = float(rank)
+    except (ValueError, TypeError):
+        rank = 0.0
+    except OverflowError:
+        return None, ""
+    return rank, instruction
+
+def format_alpaca(instruction, output):
     # 確保有內容
-    if not instruction: 
-        instruction = "Implement the Verilog module based on the code structure."
+    if not instruction:
+        instruction = DEFAULT_INSTRUCTION
+    return alpaca_prompt.format(instruction, "", output) + "<|end_of_text|>"
+
+# --- 2. 批次處理：一次解析、過濾並格式化整個 record batch ---
+def process_pyranet_batch(batch, min_rank=MIN_RANK):
+    texts, codes = [], []
+    for raw_desc, code in zip(batch['description'], batch['code']):
+        rank, instruction = parse_pyranet_description(raw_desc)
+        # 【關鍵條件】 Rank 必須 >= min_rank
+        # 你也可以順便檢查 compile_status 是否為 "No error"，但 rank 通常已包含此隱含意義
+        # 寫成 not >= 而非 <：NaN 的比較永遠是 False，兩條路徑才會一致地丟掉它
+        if rank is None or not rank >= min_rank:
+            continue
+        texts.append(format_alpaca(instruction, code))
+        codes.append(code)
+    # batched map 允許輸出筆數少於輸入筆數，過濾與格式化因此可在同一趟完成
+    # code 欄位保留給去重階段使用，寫檔前移除
+    return {"text": texts, "code": codes}
+
+# --- 逐筆版本：保留作為對照路徑 (--per-row)，輸出應與批次版本完全一致 ---
+def filter_high_quality(example, min_rank=MIN_RANK):
+    rank, _ = parse_pyranet_description(example['description'])
+    return rank is not None and rank >= min_rank
 
-    text = alpaca_prompt.format(instruction, "", output) + "<|end_of_text|>"
-    return {"text": text}
+def format_pyranet(example):
+    _, instruction = parse_pyranet_description(example['description'])
+    return {"text": format_alpaca(instruction, example['code']), "code": example['code']}
 
 def format_synthetic(example):
     # Synthetic 資料已經是高品質，直接使用
     instruction = example['evolved_nl']
     output = example['rtl']
     text = alpaca_prompt.format(instruction, "", output) + "<|end_of_text|>"
-    return {"text": text}
+    return {"text": text, "code": output}
+
+def process_pyranet(ds, per_row=False, min_rank=MIN_RANK):
+    start = time.perf_counter()
+    # 門檻以 fn_kwargs 傳入，num_proc 的子行程才會拿到同一個值
+    if per_row:
+        ds = ds.filter(filter_high_quality, fn_kwargs={"min_rank": min_rank})
+        ds = ds.map(format_pyranet, remove_columns=ds.column_names)
+    else:
+        ds = ds.map(
+            process_pyranet_batch,
+            fn_kwargs={"min_rank": min_rank},
+            batched=True,
+            batch_size=BATCH_SIZE,
+            num_proc=NUM_PROC,
+            remove_columns=ds.column_names,
+        )
+    return ds, time.perf_counter() - start
+
+# --- 3. 輸出設定：大小受限的 Parquet shards + manifest ---
+OUTPUT_PATH = "./data/processed"
+MANIFEST_NAME = "manifest.json"
+MAX_SHARD_BYTES = 256 * 1024**2   # 以未壓縮的 Arrow 大小計算，壓縮後的檔案只會更小
+ROW_GROUP_SIZE = 1000             # 每個 row group 的筆數 (pyarrow 會自動寫入欄位統計)
+DEDUP_REPORT_PATH = "./data/dedup_report.json"
+# 近似重複移除超過此比例時提醒檢查 (正常情況下同一題目的重複不會佔大多數)
+DEDUP_WARN_FRACTION = 0.2
+
+def interleave_sources(datasets):
+    # 依各來源的相對位置交錯排列，讓每個 shard 都包含比例相同的兩種資料
+    # 只產生一個 index 對應表，不做全域 shuffle；真正的打亂交給訓練端的 buffer shuffle
+    keys = np.concatenate([(np.arange(len(ds)) + 0.5) / max(len(ds), 1) for ds in datasets])
+    order = np.argsort(keys, kind="stable")
+    return concatenate_datasets(datasets).select(order)
+
+def load_profile_report(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def resolve_min_rank(args, report):
+    """回傳 (門檻, 來源)：--min-rank 優先，其次是資料分析報告的建議值，最後是 MIN_RANK"""
+    if args.min_rank is not None:
+        return args.min_rank, "--min-rank"
+    if report and report.get("recommended", {}).get("min_rank") is not None:
+        return report["recommended"]["min_rank"], args.profile
+    return MIN_RANK, "預設值"
+
+def selected_nbytes(ds):
+    # select / 去重後 ds.data 仍是整張底層表 (只多了 index 對應表)，依實際選取的筆數比例估計
+    if not ds.data.num_rows:
+        return 0
+    return ds.data.nbytes * len(ds) / ds.data.num_rows
+
+def write_parquet_shards(ds, output_path, sources, filters=None):
+    os.makedirs(output_path, exist_ok=True)
+    num_shards = max(1, math.ceil(selected_nbytes(ds) / MAX_SHARD_BYTES))
+    shards = []
+    for i in range(num_shards):
+        shard = ds.shard(num_shards=num_shards, index=i, contiguous=True)
+        filename = f"shard-{i:05d}-of-{num_shards:05d}.parquet"
+        shard.to_parquet(os.path.join(output_path, filename), batch_size=ROW_GROUP_SIZE)
+        shards.append({
+            "file": filename,
+            "num_rows": len(shard),
+            "num_bytes": os.path.getsize(os.path.join(output_path, filename)),
+        })
+        print(f"   📦 {filename}: {len(shard)} 筆")
+
+    manifest = {
+        "format": "parquet",
+        "columns": ds.column_names,
+        "num_rows": len(ds),
+        "row_group_size": ROW_GROUP_SIZE,
+        "sources": sources,
+        "filters": filters or {},
+        "shards": shards,
+    }
+    # 先寫暫存檔再 rename，訓練端不會讀到寫一半的 manifest
+    tmp_path = os.path.join(output_path, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_path, MANIFEST_NAME))
+
+    # 只清掉不在新 manifest 中的舊檔案 (舊的 shard 或 save_to_disk 的輸出)
+    keep = {s["file"] for s in shards} | {MANIFEST_NAME}
+    for name in os.listdir(output_path):
+        path = os.path.join(output_path, name)
+        if name not in keep and os.path.isfile(path):
+            os.remove(path)
+    return manifest
 
 def main():
-    print("🧹 正在清理舊資料...")
-    output_path = "./data/processed"
-    if os.path.exists(output_path):
-        shutil.rmtree(output_path)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--per-row", action="store_true", help="使用逐筆 filter/map 路徑 (用於比對輸出)")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85, help="MinHash 估計 Jaccard 相似度高於此值視為重複")
+    parser.add_argument("--no-dedup", action="store_true", help="略過近似重複移除")
+    parser.add_argument("--min-rank", type=float, default=None, help="PyraNet rank 門檻 (預設取資料分析報告的建議值)")
+    parser.add_argument("--profile", default=PROFILE_REPORT_PATH, help="scripts/1_inspect_data.py 產生的報告")
+    args = parser.parse_args()
+    report = load_profile_report(args.profile)
+    min_rank, rank_source = resolve_min_rank(args, report)
 
     # 1. 處理 PyraNet (加入過濾步驟)
     print("⬇️  正在處理 PyraNet...")
     ds1 = load_dataset("bnadimi/PyraNet-Verilog", split="train")
     original_count = len(ds1)
     
-    print("🔍 正在執行品質過濾 (Rank >= 18)...")
-    # 使用 filter 函數
-    ds1 = ds1.filter(filter_high_quality)
+    mode = "逐筆" if args.per_row else f"批次, num_proc={NUM_PROC}"
+    print(f"🔍 正在執行品質過濾與格式化 (Rank >= {min_rank:g}，來自{rank_source}, {mode})...")
+    ds1, elapsed = process_pyranet(ds1, per_row=args.per_row, min_rank=min_rank)
     filtered_count = len(ds1)
-    
-    print(f"   📉 過濾結果: {original_count} -> {filtered_count} 筆 (保留率: {filtered_count/original_count:.1%})")
 
-    print("📝 正在格式化 PyraNet...")
-    ds1 = ds1.map(format_pyranet, remove_columns=ds1.column_names)
+    print(f"   📉 過濾結果: {original_count} -> {filtered_count} 筆 (保留率: {filtered_count/original_count:.1%})")
+    # 舊版或只分析了部分來源的報告可能沒有 pyranet 這一段
+    retention = (report or {}).get("sources", {}).get("pyranet", {}).get("rank", {}).get("retention", {})
+    expected = retention.get(str(float(min_rank)))
+    if expected is not None:
+        print(f"   📊 資料分析報告預估保留率: {expected:.1%}")
+    print(f"   ⏱️  耗時 {elapsed:.1f}s ({original_count / max(elapsed, 1e-9):,.0f} rows/s)")
 
     # 2. 處理 Synthetic
     print("⬇️  正在處理 Synthetic (全部保留)...")
@@ -100,15 +216,30 @@ def main():
     ds2 = ds2.map(format_synthetic, remove_columns=ds2.column_names)
     print(f"   Synthetic 處理完成: {len(ds2)} 筆")
 
-    # 3. 合併與打亂
+    # 3. 合併 (交錯排列，不做全域 shuffle)
     print("🔄 正在合併資料集...")
-    combined = concatenate_datasets([ds1, ds2])
-    combined = combined.shuffle(seed=3407)
-
-    # 4. 存檔
-    print(f"💾 正在儲存至 {output_path}...")
-    combined.save_to_disk(output_path)
-    print(f"✅ 資料準備完成！總筆數: {len(combined)}")
+    combined = interleave_sources([ds1, ds2])
+
+    # 4. 跨來源近似重複移除 (MinHash + LSH)
+    if not args.no_dedup:
+        print(f"🧬 正在移除近似重複 (Jaccard >= {args.dedup_threshold})...")
+        start = time.perf_counter()
+        combined, dedup_report = deduplicate(combined, threshold=args.dedup_threshold, num_proc=NUM_PROC)
+        os.makedirs(os.path.dirname(DEDUP_REPORT_PATH), exist_ok=True)
+        with open(DEDUP_REPORT_PATH, "w") as f:
+            json.dump(dedup_report, f, indent=2)
+        print(f"   🗑️  移除 {dedup_report['removed']} / {dedup_report['total']} 筆 ({dedup_report['removed_fraction']:.1%}, "
+              f"{len(dedup_report['clusters'])} clusters, {time.perf_counter() - start:.1f}s)")
+        if dedup_report["removed_fraction"] > DEDUP_WARN_FRACTION:
+            print(f"   ⚠️  移除比例超過 {DEDUP_WARN_FRACTION:.0%}，請檢查 {DEDUP_REPORT_PATH} 中最大的 clusters 或提高 --dedup-threshold")
+        print(f"   📄 報告已寫入 {DEDUP_REPORT_PATH}")
+    combined = combined.remove_columns("code")
+
+    # 5. 存檔
+    print(f"💾 正在寫入 Parquet shards 至 {OUTPUT_PATH}...")
+    manifest = write_parquet_shards(combined, OUTPUT_PATH, {"pyranet": len(ds1), "synthetic": len(ds2)},
+                                    {"min_rank": min_rank})
+    print(f"✅ 資料準備完成！總筆數: {manifest['num_rows']} ({len(manifest['shards'])} shards)")
     print("   👉 請執行 scripts/3_train_from_local.py 開始訓練")
 
 if __name__ == "__main__":
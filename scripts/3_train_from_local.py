@@ -3,13 +3,45 @@ from unsloth import FastLanguageModel
 import torch
 from trl import SFTTrainer
 from transformers import TrainingArguments
-from datasets import load_from_disk 
+from datasets import load_dataset
+import json
+import math
+import os
+import sys
+
+from torch.utils.data import DataLoader
+from pack_tokens import (
+    LengthGroupedBatchSampler, PackedCollator, PackedTokenDataset, PaddingCollator,
+    TokenSampleDataset, build_packed_dataset, packed_mask_dtype, verify_packed_isolation,
+)
+from train_metrics import ThroughputCallback
+from train_resume import PREEMPTED_EXIT_CODE, PreemptionCallback, checkpoint_step, latest_checkpoint
 
 # ==========================================
 # 1. 設定與載入
 # ==========================================
 max_seq_length = 2048
 output_dir = "models/verilog_llama3"
+data_dir = "./data/processed"
+packed_dir = "./data/packed"
+per_device_train_batch_size = 2 # 12GB VRAM 建議值
+gradient_accumulation_steps = 4 # 累積梯度，模擬 Batch Size = 8
+num_train_epochs = 1 # 跑完一輪即可
+# packed:   預先 tokenize 並打包成固定長度 block (scripts/pack_tokens.py)，只在資料或參數變更時重建
+# bucketed: 同樣使用預先 tokenize 的資料，但不打包，改以長度相近的樣本組成 batch
+# text:     讀取原始文字，由 SFTTrainer 在每次訓練時 tokenize
+data_format = "packed"
+# 超過 max_seq_length 的樣本: "truncate" | "drop" | "module" (截在 endmodule) | "split"
+overlong_policy = "module"
+# bucketed 模式的長度分界 (token 數)
+length_buckets = [256, 512, 1024, 2048]
+# (text 模式) streaming=True: 逐 shard 讀取並以 buffer 打亂，不需等全部資料讀完即可開始訓練
+# streaming=False: 轉成 memory-mapped Arrow cache，由 Trainer 的 sampler 打亂
+streaming = True
+shuffle_buffer_size = 10_000
+# 自動從 outputs/ 下最新的 checkpoint 續訓 (optimizer、scheduler、RNG 與資料位置一併還原)；False 則一律從頭開始
+resume = True
+save_steps = 100 # 被搶占時最多重跑這麼多 step；收到 SIGTERM 時另會立即存一份
 
 print("🔥 正在載入模型 (Llama-3-8B 4-bit)...")
 model, tokenizer = FastLanguageModel.from_pretrained(
@@ -35,29 +67,98 @@ model = FastLanguageModel.get_peft_model(
 # ==========================================
 # 2. 載入處理好的資料
 # ==========================================
-print("📂 讀取本地資料集 (data/processed)...")
+print(f"📂 讀取本地資料集 ({data_dir})...")
 try:
-    dataset = load_from_disk("./data/processed")
-    print(f"   ✅ 成功載入: {len(dataset)} 筆資料")
+    with open(os.path.join(data_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    train_batch_sampler = None
+    if data_format == "packed":
+        streaming = False
+        build_packed_dataset(tokenizer, data_dir, packed_dir, max_seq_length, overlong_policy)
+        dataset = PackedTokenDataset(packed_dir)
+        print(f"   ✅ 成功載入: {manifest['num_rows']} 筆資料 -> {len(dataset)} 個 {max_seq_length}-token blocks")
+    elif data_format == "bucketed":
+        streaming = False
+        build_packed_dataset(tokenizer, data_dir, packed_dir, max_seq_length, overlong_policy)
+        dataset = TokenSampleDataset(packed_dir)
+        train_batch_sampler = LengthGroupedBatchSampler(
+            dataset.sample_lengths(), per_device_train_batch_size, length_buckets, seed = 3407,
+        )
+        print(f"   ✅ 成功載入: {len(dataset)} 筆資料 (依長度分組)")
+    else:
+        data_files = [os.path.join(data_dir, shard["file"]) for shard in manifest["shards"]]
+        dataset = load_dataset("parquet", data_files = data_files, split = "train", streaming = streaming)
+        if streaming:
+            # shard 順序與 buffer 內的樣本都會被打亂，記憶體只佔用 buffer 大小
+            dataset = dataset.shuffle(seed = 3407, buffer_size = shuffle_buffer_size)
+        print(f"   ✅ 成功載入: {manifest['num_rows']} 筆資料 ({len(data_files)} shards, streaming={streaming})")
 except Exception as e:
     print(f"   ❌ 載入失敗，請確認是否已執行 scripts/2_process_data.py")
     raise e
 
+# IterableDataset 沒有長度，需由 manifest 推算總步數
+max_steps = -1
+if streaming:
+    max_steps = num_train_epochs * math.ceil(
+        manifest["num_rows"] / (per_device_train_batch_size * gradient_accumulation_steps)
+    )
+
+if data_format == "packed":
+    # 非 flash-attention 2 時改用 block-diagonal attention_mask 隔離同一 block 內的樣本，並在訓練前實測確認
+    mask_dtype = packed_mask_dtype(model)
+    data_collator = PackedCollator(tokenizer.pad_token_id, max_seq_length, mask_dtype)
+    diff = verify_packed_isolation(model, data_collator)
+    print(f"   🧱 Packed attention: {'varlen (position_ids)' if mask_dtype is None else f'block mask ({mask_dtype})'}, "
+          f"樣本隔離檢查通過 (log-prob 差異 {diff:.4f})")
+elif data_format == "bucketed":
+    data_collator = PaddingCollator(tokenizer.pad_token_id)
+
+if data_format in ("packed", "bucketed"):
+    # 已經 tokenize 過，跳過 SFTTrainer 的資料前處理
+    data_kwargs = dict(
+        data_collator = data_collator,
+        dataset_kwargs = {"skip_prepare_dataset": True},
+    )
+else:
+    data_kwargs = dict(
+        dataset_text_field = "text", # 對應處理腳本中的 key
+        dataset_num_proc = None if streaming else 2, # IterableDataset 的 map 不支援多行程
+    )
+
 # ==========================================
 # 3. 訓練參數設定
 # ==========================================
-trainer = SFTTrainer(
+class BucketedSFTTrainer(SFTTrainer):
+    # 有指定 batch sampler 時改用它建立 DataLoader (bucketed 模式)
+    def __init__(self, *args, train_batch_sampler = None, **kwargs):
+        self.train_batch_sampler = train_batch_sampler
+        super().__init__(*args, **kwargs)
+
+    def get_train_dataloader(self):
+        if self.train_batch_sampler is None:
+            return super().get_train_dataloader()
+        dataloader = DataLoader(
+            self.train_dataset,
+            batch_sampler = self.train_batch_sampler,
+            collate_fn = self.data_collator,
+            num_workers = self.args.dataloader_num_workers,
+            pin_memory = self.args.dataloader_pin_memory,
+        )
+        return self.accelerator.prepare(dataloader)
+
+trainer = BucketedSFTTrainer(
     model = model,
     tokenizer = tokenizer,
     train_dataset = dataset,
-    dataset_text_field = "text", # 對應處理腳本中的 key
+    train_batch_sampler = train_batch_sampler,
     max_seq_length = max_seq_length,
-    dataset_num_proc = 2,
+    **data_kwargs,
     args = TrainingArguments(
-        per_device_train_batch_size = 2, # 12GB VRAM 建議值
-        gradient_accumulation_steps = 4, # 累積梯度，模擬 Batch Size = 8
+        per_device_train_batch_size = per_device_train_batch_size,
+        gradient_accumulation_steps = gradient_accumulation_steps,
         warmup_steps = 5,
-        num_train_epochs = 1, # 跑完一輪即可
+        num_train_epochs = num_train_epochs,
+        max_steps = max_steps,
         learning_rate = 2e-4,
         fp16 = not torch.cuda.is_bf16_supported(),
         bf16 = torch.cuda.is_bf16_supported(),
@@ -67,19 +168,36 @@ trainer = SFTTrainer(
         lr_scheduler_type = "linear",
         seed = 3407,
         output_dir = "outputs",
+        save_steps = save_steps,
+        save_total_limit = 3,
         report_to = "none", # 關閉 wandb 上傳
+        remove_unused_columns = data_format == "text", # 保留 position_ids 給 packed block
     ),
 )
 
+# 每個 step 記錄 tokens/s、資料讀取 vs 計算時間與峰值記憶體 (outputs/throughput.jsonl)
+ThroughputCallback("outputs/throughput.jsonl", pad_token_id = tokenizer.pad_token_id).attach(trainer)
+# SIGTERM (排程器搶占) 時於本 step 結束後存 checkpoint 再離開
+preemption = PreemptionCallback().install()
+trainer.add_callback(preemption)
+
 # ==========================================
 # 4. 開始訓練
 # ==========================================
 print("🚀 開始訓練...")
 # 顯示顯存資訊
-gpu_stats = torch.cuda.get_device_properties(0)
-print(f"   GPU: {gpu_stats.name}. Max Memory: {gpu_stats.total_memory / 1024**3:.2f} GB")
+if torch.cuda.is_available():
+    gpu_stats = torch.cuda.get_device_properties(0)
+    print(f"   GPU: {gpu_stats.name}. Max Memory: {gpu_stats.total_memory / 1024**3:.2f} GB")
+
+resume_from = latest_checkpoint("outputs") if resume else None
+if resume_from:
+    print(f"⏩ 從 {resume_from} 續訓 (step {checkpoint_step(resume_from)})")
+trainer_stats = trainer.train(resume_from_checkpoint = resume_from)
 
-trainer_stats = trainer.train()
+if preemption.interrupted:
+    print("⏸️ 訓練被中斷，略過儲存最終 adapter")
+    sys.exit(PREEMPTED_EXIT_CODE)
 
 # ==========================================
 # 5. 儲存 LoRA Adapter
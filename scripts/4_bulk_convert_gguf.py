@@ -1,8 +1,15 @@
 import os
-import glob
+import json
 import shutil
+import subprocess
+import sys
+import time
 import torch
 import gc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fingerprint import HashCache, path_digest
+from gguf_inspect import GGUFError, validate_gguf
 
 # 1. FORCE USE OF STANDARD HOME CACHE
 # Since we verified that ~/.cache/huggingface has 21GB of data, we should use it.
@@ -14,18 +21,74 @@ os.environ["HF_HOME"] = active_cache
 os.environ["HUGGINGFACE_HUB_CACHE"] = os.path.join(active_cache, "hub")
 
 # Now import ML libraries
-from unsloth import FastLanguageModel
+from lora_merge import merge_lora_streaming
+from train_resume import latest_checkpoint
+
+LLAMA_CPP_DIR = os.environ.get("LLAMA_CPP_DIR", "llama.cpp")
+# 需要的量化版本 (llama-quantize 的型別名稱)；增加 Q5_K_M / Q8_0 只會多一次量化，不會多載入模型
+TARGET_QUANTS = ["Q4_K_M", "Q3_K_M"]
+# 同時執行的 llama-quantize 行程數，CPU 執行緒會平均分配
+QUANT_WORKERS = 2
+# 合併方式:
+#   "stream":  在 CPU 上直接對 safetensors shard 逐 tensor 套用 LoRA (scripts/lora_merge.py)，不需 GPU、記憶體用量低
+#   "unsloth": 以 4-bit 載入 adapter 後呼叫 save_pretrained_merged (需要 GPU)
+MERGE_MODE = os.environ.get("MERGE_MODE", "stream")
+# stream 模式使用的 16-bit 基礎模型；None 表示由 adapter_config.json 推得 (去掉 -bnb-4bit)
+BASE_MODEL_FP16 = None
 
 def get_latest_checkpoint(base_dir):
-    checkpoints = glob.glob(os.path.join(base_dir, "checkpoint-*"))
+    # 訓練跑完才會有 final_adapter，優先使用；否則取最新且完整的 checkpoint (存到一半被砍的會略過)
     final_adapter = os.path.join(base_dir, "final_adapter")
-    
     if os.path.exists(final_adapter):
         return final_adapter
-    if not checkpoints:
+    return latest_checkpoint(base_dir)
+
+def find_llama_cpp_tool(name):
+    # Unsloth 會把 llama.cpp clone 到工作目錄；也可用 LLAMA_CPP_DIR 指定
+    candidates = [os.path.join(LLAMA_CPP_DIR, name), os.path.join(LLAMA_CPP_DIR, "build", "bin", name)]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    found = shutil.which(name)
+    if found:
+        return found
+    raise FileNotFoundError(f"{name} not found in {LLAMA_CPP_DIR} or PATH")
+
+def quantize_gguf(f16_path, output_path, quant_type, threads):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [find_llama_cpp_tool("llama-quantize"), f16_path, output_path, quant_type, str(threads)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"llama-quantize exited with {result.returncode}")
+    return output_path, time.perf_counter() - start
+
+def check_gguf(path, quant_type):
+    """搬到最終位置前先檢查 header / tensor table，截斷或損毀的檔案不會覆蓋好的版本"""
+    gguf = validate_gguf(path)
+    if gguf.file_type_name != quant_type:
+        raise GGUFError(f"{path}: file type {gguf.file_type_name}, expected {quant_type}")
+    return gguf
+
+def read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read().strip()
+
+def read_json(path):
+    if not os.path.exists(path):
         return None
-    checkpoints.sort(key=lambda x: int(x.split("-")[-1]))
-    return checkpoints[-1]
+    with open(path) as f:
+        return json.load(f)
+
+def write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
 
 def convert_adapter_to_gguf(adapter_path, output_base_name):
     if not adapter_path or not os.path.exists(adapter_path):
@@ -43,29 +106,49 @@ def convert_adapter_to_gguf(adapter_path, output_base_name):
 
     # 1. 定義 FP16 永久存放路徑 (在 HF cache 內)
     fp16_cache_dir = os.path.join(active_cache, "merged_models", output_base_name + "-fp16")
-    
-    is_merged_exists = os.path.exists(os.path.join(fp16_cache_dir, "config.json"))
+
+    # Adapter 內容的雜湊：FP16 cache 與 GGUF 都記錄自己是由哪個 adapter 產生的
+    hash_cache = HashCache()
+    adapter_digest = path_digest(adapter_path, hash_cache)
+    hash_cache.save()
+    merged_source_path = os.path.join(fp16_cache_dir, "adapter_digest.txt")
+    gguf_manifest_path = os.path.join(gguf_models_dir, f"{output_base_name}.manifest.json")
+
+    is_merged_exists = os.path.exists(os.path.join(fp16_cache_dir, "config.json")) and \
+        read_text(merged_source_path) == adapter_digest
 
     try:
         if not is_merged_exists:
-            print(f"🔄 [Step 1] Merging Adapter to Base (First time only)...")
+            print(f"🔄 [Step 1] Merging Adapter to Base (adapter changed or first run)...")
+            # 舊的合併結果來自不同的 adapter，整個清掉避免殘留舊 shard
+            if os.path.exists(fp16_cache_dir):
+                shutil.rmtree(fp16_cache_dir)
             os.makedirs(fp16_cache_dir, exist_ok=True)
-            # 只有不存在時才載入 Adapter 並合併
-            model, tokenizer = FastLanguageModel.from_pretrained(
-                model_name = adapter_path,
-                max_seq_length = 2048,
-                dtype = None,
-                load_in_4bit = True, # 改回 True 以適應 12GB VRAM
-            )
-            print(f"💾 Saving merged FP16 to cache: {fp16_cache_dir}")
-            model.save_pretrained_merged(fp16_cache_dir, tokenizer, save_method = "merged_16bit")
+            if MERGE_MODE == "stream":
+                print(f"💾 Streaming merge on CPU to cache: {fp16_cache_dir}")
+                merge_lora_streaming(adapter_path, fp16_cache_dir, BASE_MODEL_FP16)
+            else:
+                # Unsloth 需要 GPU，只在這個模式下才載入
+                from unsloth import FastLanguageModel
+                # 只有不存在時才載入 Adapter 並合併
+                model, tokenizer = FastLanguageModel.from_pretrained(
+                    model_name = adapter_path,
+                    max_seq_length = 2048,
+                    dtype = None,
+                    load_in_4bit = True, # 改回 True 以適應 12GB VRAM
+                )
+                print(f"💾 Saving merged FP16 to cache: {fp16_cache_dir}")
+                model.save_pretrained_merged(fp16_cache_dir, tokenizer, save_method = "merged_16bit")
+
+                # 釋放記憶體，確保後續步驟有乾淨環境
+                del model
+                del tokenizer
+                gc.collect()
+                torch.cuda.empty_cache()
+            # 合併完成後才寫入來源標記，中途失敗的 cache 不會被當成有效
+            with open(merged_source_path, "w") as f:
+                f.write(adapter_digest)
             print("✅ FP16 model saved.")
-            
-            # 釋放記憶體，確保後續步驟有乾淨環境
-            del model
-            del tokenizer
-            gc.collect()
-            torch.cuda.empty_cache()
         else:
             print(f"⏩ [Step 1] Found existing FP16 in cache. Skipping merge & write.")
 
@@ -73,86 +156,85 @@ def convert_adapter_to_gguf(adapter_path, output_base_name):
         print(f"❌ Failed in Step 1: {e}")
         return
 
-    # 定義我們需要的量化版本
-    target_quants = [
-        ("q4_k_m", "Q4_K_M"),
-        ("q3_k_m", "Q3_K_M")
-    ]
+    # 2. 由 FP16 合併模型產生一次 F16 GGUF (存放在 FP16 cache 內，adapter 變更時一起失效)
+    f16_gguf_path = os.path.join(fp16_cache_dir, f"{output_base_name}.F16.gguf")
+    f16_valid = False
+    if os.path.exists(f16_gguf_path):
+        try:
+            check_gguf(f16_gguf_path, "F16")
+            f16_valid = True
+        except GGUFError as e:
+            print(f"⚠️ Existing F16 GGUF is invalid, rebuilding: {e}")
+    if f16_valid:
+        print(f"⏩ [Step 2] Found existing F16 GGUF: {f16_gguf_path}")
+    else:
+        print(f"🔄 [Step 2] Converting merged FP16 to F16 GGUF...")
+        start = time.perf_counter()
+        tmp_f16_path = f16_gguf_path + ".tmp"
+        try:
+            subprocess.run(
+                [sys.executable, find_llama_cpp_tool("convert_hf_to_gguf.py"), fp16_cache_dir,
+                 "--outfile", tmp_f16_path, "--outtype", "f16"],
+                check=True,
+            )
+            check_gguf(tmp_f16_path, "F16")
+            os.replace(tmp_f16_path, f16_gguf_path)
+        except Exception as e:
+            print(f"❌ Failed in Step 2: {e}")
+            return
+        print(f"✅ F16 GGUF ready ({time.perf_counter() - start:.1f}s)")
+
+    # GGUF 只有在由同一個 adapter 產生時才可沿用
+    gguf_manifest = read_json(gguf_manifest_path) or {}
+    if gguf_manifest.get("adapter_digest") != adapter_digest:
+        gguf_manifest = {"adapter_digest": adapter_digest, "adapter_path": adapter_path, "quants": {}}
+
+    pending = []
+    for quant_type in TARGET_QUANTS:
+        final_path = os.path.join(gguf_models_dir, f"{output_base_name}.{quant_type}.gguf")
+        if os.path.exists(final_path) and quant_type in gguf_manifest["quants"]:
+            print(f"⏩ Skip: {final_path} already built from this adapter.")
+        else:
+            pending.append((quant_type, final_path))
+    if not pending:
+        return
 
+    # 3. 以 CPU worker 平行量化：每個量化只需一次 llama-quantize，不再重新載入模型
+    os.makedirs(temp_base_dir, exist_ok=True)
+    workers = min(QUANT_WORKERS, len(pending))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    print(f"\n⚙️  [Step 3] Quantizing {', '.join(q for q, _ in pending)} ({workers} workers x {threads_per_worker} threads)")
+    start = time.perf_counter()
     try:
-        for q_method, suffix in target_quants:
-            output_filename = f"{output_base_name}.{suffix}.gguf"
-            final_path = os.path.join(gguf_models_dir, output_filename)
-            
-            if os.path.exists(final_path):
-                print(f"⏩ Skip: {final_path} already exists.")
-                continue
-
-            print(f"\n⚙️  Processing {suffix} -> {final_path}")
-            
-            # 為每個量化任務建立乾淨的子目錄
-            current_temp_dir = os.path.join(temp_base_dir, q_method)
-            if os.path.exists(current_temp_dir):
-                shutil.rmtree(current_temp_dir)
-            os.makedirs(current_temp_dir)
-            
-            try:
-                # 每次轉換前重新載入模型，確保狀態乾淨
-                # 回退到使用 adapter_path，因為從 merged_fp16 + load_in_4bit 進行 GGUF 轉換不穩定
-                print(f"🔄 Loading adapter for {q_method}...")
-                model, tokenizer = FastLanguageModel.from_pretrained(
-                    model_name = adapter_path,
-                    max_seq_length = 2048,
-                    dtype = None,
-                    load_in_4bit = True,
-                )
-
-                # 使用 Unsloth 內建轉換
-                model.save_pretrained_gguf(
-                    current_temp_dir, 
-                    tokenizer, 
-                    quantization_method = q_method
-                )
-                
-                # 尋找並移動檔案
-                found = False
-                for f in os.listdir(current_temp_dir):
-                    if f.endswith(".gguf"):
-                        src = os.path.join(current_temp_dir, f)
-                        shutil.move(src, final_path)
-                        print(f"✅ Saved: {final_path}")
-                        found = True
-                        break
-                
-                if not found:
-                    print(f"❌ Error: No GGUF generated for {q_method}")
-
-            except Exception as e:
-                print(f"❌ Failed processing {q_method}: {e}")
-            
-            finally:
-                # 每個迴圈結束都釋放記憶體
-                if 'model' in locals(): del model
-                if 'tokenizer' in locals(): del tokenizer
-                gc.collect()
-                torch.cuda.empty_cache()
-            
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(quantize_gguf, f16_gguf_path, os.path.join(temp_base_dir, os.path.basename(final_path)),
+                            quant_type, threads_per_worker): (quant_type, final_path)
+                for quant_type, final_path in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                quant_type, final_path = futures[future]
+                try:
+                    tmp_path, elapsed = future.result()
+                    gguf = check_gguf(tmp_path, quant_type)
+                except Exception as e:
+                    print(f"❌ [{done}/{len(pending)}] Failed processing {quant_type}: {e}")
+                    continue
+                shutil.move(tmp_path, final_path)
+                gguf_manifest["quants"][quant_type] = os.path.basename(final_path)
+                write_json(gguf_manifest_path, gguf_manifest)
+                size_gb = gguf.file_size / 1024**3
+                print(f"✅ [{done}/{len(pending)}] Saved: {final_path} ({size_gb:.2f} GB, "
+                      f"{len(gguf.tensors)} tensors validated, {elapsed:.1f}s)")
     finally:
         # 【關鍵】無論發生什麼事，最後一定強制刪除整個暫存資料夾
-        # 這會把裡面任何自動產生的 .cache 都一併清掉
         if os.path.exists(temp_base_dir):
             print("🧹 Cleaning up temporary directories...")
             try:
                 shutil.rmtree(temp_base_dir)
             except OSError as e:
                 print(f"⚠️ Warning: Failed to fully clean temp dir: {e}")
-
-    # 清理記憶體
-    print("🧹 Cleaning up memory...")
-    if 'model' in locals(): del model
-    if 'tokenizer' in locals(): del tokenizer
-    gc.collect()
-    torch.cuda.empty_cache()
+    print(f"⏱️  Quantization wall time: {time.perf_counter() - start:.1f}s")
 
 if __name__ == "__main__":
     verilog_adapter = get_latest_checkpoint("outputs")
@@ -1,120 +1,475 @@
-import subprocess
-import re
+import argparse
+import asyncio
 import os
 import json
+import math
+import shutil
+import sys
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+from dataclasses import dataclass
+
+from benchmark_history import BenchmarkHistory
+from benchmark_suite import SUITE_PATH, ResultLog, load_suite, parse_shard, select_shard
+from generation_cache import GenerationCache, cache_key
+from model_residency import ModelResidency, plan_by_model
+from ollama_client import OllamaClient, OllamaError
+from verilog_check import check_many, code_fingerprint, simulator_check
+from verilog_extract import VerilogStreamExtractor, extract_code
 
 # Configuration
 MODEL_NAME = "verilog-llama3-q3"
 OUTPUT_DIR = "benchmark_results"
+# Ollama server address (default: $OLLAMA_HOST or http://127.0.0.1:11434)
+OLLAMA_HOST = None
+# Requests in flight at once; set the server's OLLAMA_NUM_PARALLEL to match
+CONCURRENCY = 4
+# Latency metrics aggregated into summary.json
+LATENCY_METRICS = ["ttft", "elapsed", "prompt_tokens_per_s", "gen_tokens_per_s", "total_tokens"]
+PERCENTILES = (50, 90, 99)
+# pass@k mode (--samples N > 1): default temperature and the k values to report
+SAMPLE_TEMPERATURE = 0.8
+PASS_AT_K = [1, 5, 10]
+# Prompts (Levels 1-4) are loaded from benchmarks/verilog_suite.jsonl (see benchmark_suite.py)
+
+async def run_ollama(client, model, prompt, early_stop=True, options=None, keep_alive=None):
+    """Streams a completion from the Ollama HTTP API; returns (output, extracted code, metrics).
 
-# Benchmark Prompts (Levels 1-4)
-BENCHMARKS = [
-    # Level 1: Basic & Combinational
-    {"id": "L1_01_Mux2to1", "prompt": "Write a 2-to-1 multiplexer in Verilog. Inputs: a, b, sel. Output: y. Use a continuous assignment (assign)."},
-    {"id": "L1_02_Comparator", "prompt": "Write a module that compares two 4-bit numbers A and B. Output a single bit 'equal' which is high if they are the same."},
-    {"id": "L1_03_PriorityEnc", "prompt": "Implement a 4-to-2 priority encoder in Verilog. If multiple bits are high, the highest index bit should take priority. Include a 'valid' output."},
-    
-    # Level 2: Sequential Logic
-    {"id": "L2_01_BCDCounter", "prompt": "Design a 4-bit BCD (Binary Coded Decimal) counter. It should count from 0 to 9 and then wrap around to 0. Inputs: clk, reset (synchronous)."},
-    {"id": "L2_02_EdgeDetect", "prompt": "Write a module that detects the rising edge of an input signal 'in'. Output a pulse 'edge_detected' for exactly one clock cycle."},
-    {"id": "L2_03_UnivShiftReg", "prompt": "Create an 8-bit shift register with modes: 00: Hold, 01: Shift Right, 10: Shift Left, 11: Load Parallel Data. Use a 2-bit 'mode' input."},
-
-    # Level 3: FSM & Arithmetic
-    {"id": "L3_01_SeqDetect", "prompt": "Design a Moore-type FSM to detect the sequence '1101'. Output 'found' should be high when the sequence is detected. Use localparam for state definitions."},
-    {"id": "L3_02_TrafficLight", "prompt": "Write a simplified traffic light controller for a crossroad. States: Green (10 cycles), Yellow (2 cycles), Red (10 cycles). Use a 'timer' counter internally."},
-    {"id": "L3_03_SatAdder", "prompt": "Implement an 8-bit signed adder. If the result overflows, saturate it to the maximum or minimum possible value (clipping) instead of wrapping around."},
-
-    # Level 4: Architecture
-    {"id": "L4_01_DualPortRAM", "prompt": "Write a Verilog module for a dual-port RAM. Parameters: DATA_WIDTH (default 8), ADDR_WIDTH (default 4). Port A is write-only, Port B is read-only."},
-    {"id": "L4_02_ClockDiv", "prompt": "Create a clock divider that takes a 50MHz input clock and produces a 1Hz output clock. Use parameters for the division ratio calculation."},
-    {"id": "L4_03_UART_Tx", "prompt": "Design a module that takes an 8-bit byte and formats it into a UART frame: 1 start bit (low), 8 data bits, and 1 stop bit (high). Output the serial data bit by bit."}
-]
-
-def run_ollama(prompt):
-    """Executes Ollama and returns the output."""
+    With early_stop the connection is dropped as soon as the extractor sees the
+    complete module, which makes the server stop generating the tail.
+    """
+    start_time = time.perf_counter()
+    extractor = VerilogStreamExtractor()
+    ttft = last_token_time = None
+    tokens = 0
+    complete_at = None
+    final = {}
+    error = None
     try:
-        cmd = ["ollama", "run", MODEL_NAME, prompt]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Ollama: {e}")
-        return ""
-
-def extract_verilog(text):
-    """Extracts Verilog code block from Markdown."""
-    # Pattern to find ```verilog ... ``` or just ``` ... ```
-    pattern = r"```(?:verilog)?\s*(.*?)"""
-    matches = re.findall(pattern, text, re.DOTALL)
-    if matches:
-        return matches[0].strip() # Return the first code block
-    
-    # Fallback: if no markdown blocks, check for module/endmodule
-    if "module" in text and "endmodule" in text:
-        return text.strip()
-        
-    return ""
-
-def basic_syntax_check(code):
-    """Performs very basic checks since iverilog is missing."""
-    issues = []
-    if "module" not in code:
-        issues.append("Missing 'module' keyword")
-    if "endmodule" not in code:
-        issues.append("Missing 'endmodule' keyword")
-    if ";" not in code:
-        issues.append("No semicolons found (likely malformed)")
-    
-    return "PASS" if not issues else f"FAIL: {', '.join(issues)}"
+        async with aclosing(client.generate_stream(model, prompt, options=options, keep_alive=keep_alive)) as stream:
+            async for chunk in stream:
+                if chunk.get("done"):
+                    # Keep reading to the end of the body so the connection can be reused
+                    final = chunk
+                    continue
+                tokens += 1
+                last_token_time = time.perf_counter() - start_time
+                if ttft is None:
+                    ttft = last_token_time
+                if extractor.feed(chunk["response"]) and complete_at is None:
+                    complete_at = tokens
+                    if early_stop:
+                        break
+    except OllamaError as e:
+        # Recorded on the row (status ERROR) rather than aborting the run
+        error = str(e)
+    extractor.finish()
+
+    metrics = stream_metrics(final, ttft, time.perf_counter() - start_time)
+    if not final and tokens:
+        # Cancelled streams carry no server stats; each streamed chunk is one token
+        metrics["gen_tokens"] = tokens
+        if tokens > 1 and last_token_time > ttft:
+            metrics["gen_tokens_per_s"] = (tokens - 1) / (last_token_time - ttft)
+    metrics["stopped_early"] = bool(early_stop and complete_at)
+    # Tokens generated after the module was already complete (what early stop saves)
+    metrics["tail_tokens"] = metrics["gen_tokens"] - complete_at if complete_at else 0
+    metrics["error"] = error
+    return extractor.text, extractor.code, metrics
+
+def stream_metrics(final, ttft, elapsed):
+    """Combines client-side timing with the server stats in the final chunk (durations in ns).
+
+    A cancelled stream (early stop) never gets the final chunk, so the figures
+    only the server knows (load and prompt-eval) are None rather than 0.
+    """
+    if not final:
+        return {
+            "elapsed": elapsed, "ttft": ttft, "load_time": None, "prompt_tokens": None, "gen_tokens": 0,
+            "total_tokens": None, "prompt_tokens_per_s": None, "gen_tokens_per_s": None,
+        }
+    prompt_tokens = final.get("prompt_eval_count", 0)
+    gen_tokens = final.get("eval_count", 0)
+    prompt_seconds = final.get("prompt_eval_duration", 0) / 1e9
+    gen_seconds = final.get("eval_duration", 0) / 1e9
+    return {
+        "elapsed": elapsed,
+        "ttft": ttft,
+        "load_time": final.get("load_duration", 0) / 1e9,
+        "prompt_tokens": prompt_tokens,
+        "gen_tokens": gen_tokens,
+        "total_tokens": prompt_tokens + gen_tokens,
+        "prompt_tokens_per_s": prompt_tokens / prompt_seconds if prompt_seconds else None,
+        "gen_tokens_per_s": gen_tokens / gen_seconds if gen_seconds else None,
+    }
+
+def check_codes(results, codes, suite):
+    """Structural pre-filter over all generated code, then iverilog on the candidates that pass.
+
+    Completions are collapsed on their normalized code first, so repeated
+    samples of the same answer are only checked once.
+    """
+    benches = {bench["id"]: bench for bench in suite}
+    unique = {}
+    for r, code in zip(results, codes):
+        if code:
+            r["code_hash"] = code_fingerprint(code)
+            unique.setdefault((r["id"], r["code_hash"]), code)
+    keys = list(unique)
+    start = time.perf_counter()
+    structural = check_many([(unique[key], benches[key[0]]["ports"], None) for key in keys])
+    elapsed = time.perf_counter() - start
+    candidates = [key for key, check in zip(keys, structural) if check.ok]
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        simulated = dict(zip(candidates, pool.map(simulator_check, [unique[key] for key in candidates])))
+
+    verdicts = {key: (check.status, simulated.get(key)) for key, check in zip(keys, structural)}
+    for r in results:
+        if r["code_hash"] is not None:
+            r["structural"], r["simulator"] = verdicts[r["id"], r["code_hash"]]
+            r["status"] = r["simulator"] or r["structural"]
+    sim_note = f"{len(candidates)} sent to iverilog" if shutil.which("iverilog") else "iverilog not installed"
+    print(f"🔎 Structural check: {len(candidates)}/{len(keys)} unique candidates passed "
+          f"({sum(1 for code in codes if code)} completions) in {elapsed * 1000:.0f}ms ({sim_note})")
+
+def pass_at_k(n, c, k):
+    """Unbiased pass@k estimate from n samples with c correct: 1 - C(n-c, k) / C(n, k)."""
+    if n - c < k:
+        return 1.0
+    return 1.0 - math.prod(1 - k / i for i in range(n - c + 1, n + 1))
+
+def _percentile(values, q):
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo, hi = int(pos), min(int(pos) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+def aggregate(results, ks=()):
+    # Failed requests say nothing about the model; they are only counted
+    errors = sum(1 for r in results if r["status"] == "ERROR")
+    results = [r for r in results if r["status"] != "ERROR"]
+    stats = {"count": len(results), "passed": sum(1 for r in results if r["status"] == "PASS"), "errors": errors}
+    if ks:
+        # Estimate per prompt, then average over the prompts with at least k samples left
+        samples = defaultdict(list)
+        for r in results:
+            samples[r["id"]].append(r["status"] == "PASS")
+        stats["pass_at_k"] = {f"pass@{k}": _mean([pass_at_k(len(v), sum(v), k) for v in samples.values() if len(v) >= k])
+                              for k in ks}
+    # Cached rows carry the latencies of the run that generated them, so only fresh rows are timed
+    fresh = [r for r in results if not r.get("cached")]
+    stats["cached"] = len(results) - len(fresh)
+    for metric in LATENCY_METRICS:
+        values = [r[metric] for r in fresh if r[metric] is not None]
+        stats[metric] = {f"p{q}": _percentile(values, q / 100) for q in PERCENTILES} if values else None
+    return stats
+
+def summarize(results, models, ks=()):
+    """Percentile (and pass@k) aggregates per model, overall and per difficulty level."""
+    summary = {}
+    for model in models:
+        rows = [r for r in results if r["model"] == model]
+        levels = sorted({r["level"] for r in rows})
+        summary[model] = {
+            "overall": aggregate(rows, ks),
+            "levels": {level: aggregate([r for r in rows if r["level"] == level], ks) for level in levels},
+        }
+    return summary
+
+def print_latency_table(aggregates, ks=()):
+    def fmt(stats, metric, q, scale=1.0):
+        value = stats[metric] and stats[metric][f"p{q}"]
+        return f"{value * scale:7.1f}" if value is not None else "      -"
+
+    pass_k = "".join(f"{'pass@' + str(k):>9}" for k in ks)
+    print(f"{'model / level':<28}{'pass':>6}  {'TTFT p50/p90/p99 (ms)':>23}  {'gen tok/s p50':>13}  {'prompt tok/s p50':>16}{pass_k}")
+    for model, groups in aggregates.items():
+        for name, stats in [("all", groups["overall"]), *groups["levels"].items()]:
+            ttft = "/".join(fmt(stats, "ttft", q, 1000).strip() for q in PERCENTILES)
+            pass_k = "".join(f"{value:>9.3f}" if (value := stats['pass_at_k'][f'pass@{k}']) is not None else f"{'-':>9}"
+                             for k in ks)
+            cached = f"  ({stats['cached']} cached, not timed)" if stats["cached"] else ""
+            print(f"{model + ' ' + name:<28}{stats['passed']:>3}/{stats['count']:<2}  {ttft:>23}  "
+                  f"{fmt(stats, 'gen_tokens_per_s', 50):>13}  {fmt(stats, 'prompt_tokens_per_s', 50):>16}{pass_k}{cached}")
+
+@dataclass
+class RunContext:
+    client: OllamaClient
+    slots: asyncio.Semaphore
+    early_stop: bool
+    cache: GenerationCache = None
+    refresh: bool = False
+    digests: dict = None
+    quants: dict = None
+    samples: int = 1
+    residency: ModelResidency = None
+    # model -> why it could not be looked up (e.g. not pulled); its jobs become ERROR rows
+    unavailable: dict = None
+
+async def generate(ctx, model, prompt, options=None):
+    """Returns (output, code, metrics, cached), reusing a cached generation when possible."""
+    if model in ctx.unavailable:
+        raise OllamaError(ctx.unavailable[model])
+    key = None
+    if ctx.cache is not None:
+        # Early stop truncates the stored output, so it is part of the key
+        key = cache_key(ctx.digests[model], prompt, options, early_stop=ctx.early_stop)
+        entry = None if ctx.refresh else ctx.cache.get(key)
+        if entry is not None:
+            # Re-extract so changes to the extraction logic apply to cached outputs
+            return entry["response"], extract_code(entry["response"]), entry["metrics"], True
+
+    # The cold load is timed on its own, so TTFT only covers a resident model
+    await ctx.residency.ensure_loaded(model)
+    # Start the clock only once a slot is free so queueing is not counted as latency
+    async with ctx.slots:
+        raw_output, verilog_code, metrics = await run_ollama(ctx.client, model, prompt, ctx.early_stop, options,
+                                                             ctx.residency.keep_alive)
+    if key is not None and metrics["gen_tokens"] and not metrics["error"]:
+        ctx.cache.put(key, {"response": raw_output, "metrics": metrics}, model, ctx.digests[model])
+    return raw_output, verilog_code, metrics, False
+
+def sampling_options(args, sample):
+    """Ollama options for one completion; None keeps the model's defaults."""
+    options = {}
+    temperature = args.temperature
+    if temperature is None and args.samples > 1:
+        temperature = SAMPLE_TEMPERATURE
+    if temperature is not None:
+        options["temperature"] = temperature
+    if args.samples > 1 or args.seed is not None:
+        # A distinct seed per sample keeps every draw reproducible
+        options["seed"] = (args.seed or 0) + sample
+    return options or None
+
+async def run_benchmark(ctx, model, bench, sample=0, options=None):
+    try:
+        raw_output, verilog_code, metrics, cached = await generate(ctx, model, bench['prompt'], options)
+    except OllamaError as e:
+        # e.g. the model failed to load after all retries
+        raw_output, verilog_code, cached = "", None, False
+        metrics = {**stream_metrics({}, None, 0.0), "stopped_early": False, "tail_tokens": 0, "error": str(e)}
+    error = metrics.get("error")
+    if error:
+        # A cut-off stream is not the model's answer
+        raw_output += f"\n\n[ERROR] {error}"
+        verilog_code = None
+
+    # Save raw output and code
+    base_filename = f"{OUTPUT_DIR}/{model}/{bench['id']}"
+    if ctx.samples > 1:
+        base_filename += f"_s{sample:02d}"
+    with open(f"{base_filename}.md", "w") as f:
+        f.write(f"# Prompt\n{bench['prompt']}\n\n# Raw Output\n{raw_output}")
+
+    if verilog_code:
+        with open(f"{base_filename}.v", "w") as f:
+            f.write(verilog_code)
+
+    # status is filled in by check_codes once every generation is done
+    return verilog_code, {
+        "model": model,
+        "id": bench['id'],
+        "level": bench['level'],
+        "model_digest": ctx.digests[model],
+        "quant": ctx.quants[model],
+        "sample": sample,
+        "seed": (options or {}).get("seed"),
+        # ERROR rows are left out of the aggregates and retried by --resume
+        "status": "ERROR" if error else "NO_CODE",
+        "error": error,
+        "structural": None,
+        "simulator": None,
+        "code_hash": None,
+        "has_code": bool(verilog_code),
+        "length": len(verilog_code) if verilog_code else 0,
+        "cached": cached,
+        **metrics,
+    }
+
+async def run_all(args, jobs, log):
+    """Generates the jobs, appending each finished one to the result log; returns (results, cold loads)."""
+    results = {}
+    cache = None if args.no_cache else GenerationCache()
+    async with OllamaClient(OLLAMA_HOST, concurrency=args.concurrency) as client:
+        ctx = RunContext(client, asyncio.Semaphore(args.concurrency), not args.no_early_stop, cache, args.refresh,
+                         samples=args.samples, residency=ModelResidency(client))
+        # The digest identifies the build in the cache and the benchmark history
+        infos, ctx.unavailable = {}, {}
+        for model in {model for model, _, _ in jobs}:
+            try:
+                infos[model] = await client.model_info(model)
+            except OllamaError as e:
+                ctx.unavailable[model] = str(e)
+                print(f"❌ {model}: {e}")
+        ctx.digests = {model: infos[model]["digest"] if model in infos else None for model, _, _ in jobs}
+        ctx.quants = {model: infos[model].get("details", {}).get("quantization_level") if model in infos else None
+                      for model, _, _ in jobs}
+        # One model at a time so each is loaded once instead of swapping between builds
+        plan = plan_by_model(jobs, key=lambda job: job[0])
+        done = 0
+        for i, (model, group) in enumerate(plan):
+            # The model's samples go out at once; the slots semaphore keeps `concurrency` of them in flight
+            tasks = [asyncio.ensure_future(run_benchmark(ctx, model, bench, sample, sampling_options(args, sample)))
+                     for _, bench, sample in group]
+            for task in asyncio.as_completed(tasks):
+                code, r = await task
+                done += 1
+                results[ResultLog.key(r)] = code, r
+                log.append({**r, "code": code})
+                ttft = f"{r['ttft'] * 1000:.0f}ms" if r["ttft"] is not None else "-"
+                source = "cached" if r["cached"] else f"{r['elapsed']:.2f}s"
+                name = f"{r['id']}#{r['sample']}" if args.samples > 1 else r["id"]
+                outcome = "ERROR" if r["error"] else "code" if code else "NO_CODE"
+                print(f"[{done}/{len(jobs)}] {r['model']} {name}: {outcome} "
+                      f"(TTFT {ttft}, {r['gen_tokens']} tokens, {source})")
+            last = i == len(plan) - 1
+            await ctx.residency.release(model, last)
+            if model in ctx.residency.loads:
+                load = ctx.residency.loads[model]
+                state = "already resident" if load["was_resident"] else f"cold load {load['load_time']:.2f}s"
+                kept = f"kept alive {ctx.residency.idle_keep_alive}" if last or load["was_resident"] else "unloaded"
+                print(f"🧊 {model}: {state} before its first prompt, {kept}")
+        print(f"🔌 {client.requests} requests over {client.connections_opened} connection(s), {client.retries_used} retries")
+    if cache is not None:
+        print(f"🗄️  Generation cache: {cache.hits} hits, {cache.misses} misses ({cache.path})")
+        cache.close()
+    return results, ctx.residency.loads
+
+def load_logs(paths):
+    """Merges result logs (e.g. one per shard) into {key: (code, row)}."""
+    results = {}
+    for path in paths:
+        for key, record in ResultLog(path).load().items():
+            code = record.pop("code")
+            results[key] = code, record
+    return results
+
+def resumable_results(path):
+    """Completions --resume keeps; ERROR rows are dropped so their jobs run again."""
+    return {key: (code, r) for key, (code, r) in load_logs([path]).items() if r["status"] != "ERROR"}
+
+def samples_per_prompt(results):
+    counts = defaultdict(int)
+    for r in results:
+        counts[r["model"], r["id"]] += 1
+    return min(counts.values(), default=0)
 
 def main():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-        
-    print(f"🚀 Starting Benchmark on model: {MODEL_NAME}")
-    print(f"📂 Results will be saved to: {OUTPUT_DIR}/")
-    print("-" * 60)
-    
-    results_summary = []
-
-    for bench in BENCHMARKS:
-        print(f"Running: {bench['id']} ... ", end="", flush=True)
-        start_time = time.time()
-        
-        raw_output = run_ollama(bench['prompt'])
-        verilog_code = extract_verilog(raw_output)
-        
-        elapsed = time.time() - start_time
-        
-        # Save raw output and code
-        base_filename = f"{OUTPUT_DIR}/{bench['id']}"
-        with open(f"{base_filename}.md", "w") as f:
-            f.write(f"# Prompt\n{bench['prompt']}\n\n# Raw Output\n{raw_output}")
-            
-        status = "NO_CODE"
-        if verilog_code:
-            with open(f"{base_filename}.v", "w") as f:
-                f.write(verilog_code)
-            status = basic_syntax_check(verilog_code)
-        
-        print(f"[{status}] ({elapsed:.2f}s)")
-        
-        results_summary.append({
-            "id": bench['id'],
-            "status": status,
-            "has_code": bool(verilog_code),
-            "length": len(verilog_code) if verilog_code else 0
-        })
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=[MODEL_NAME], help="Ollama models to compare (e.g. q3 and q4 builds)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Requests in flight at once")
+    parser.add_argument("--no-early-stop", action="store_true",
+                        help="Generate full completions (measures the tail tokens early stop would save)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the generation cache")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate everything and overwrite cached entries")
+    parser.add_argument("--samples", type=int, default=1, help="Completions per prompt; more than 1 reports pass@k")
+    parser.add_argument("--temperature", type=float, default=None,
+                        help=f"Sampling temperature (default: model's own, or {SAMPLE_TEMPERATURE} with --samples)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the first sample; sample i uses seed + i")
+    parser.add_argument("--k", type=int, nargs="+", default=PASS_AT_K, help="k values for pass@k (at most --samples)")
+    parser.add_argument("--suite", default=SUITE_PATH, help="Benchmark suite (JSONL, or YAML with PyYAML installed)")
+    parser.add_argument("--shard", default=None, help="Run only shard I of N (e.g. 2/4), dealt round-robin by prompt id")
+    parser.add_argument("--resume", action="store_true", help="Keep the result log and skip completions already in it (ERROR rows are retried)")
+    parser.add_argument("--merge", nargs="+", metavar="LOG", default=None,
+                        help="Summarize existing result logs (e.g. from every shard) without generating")
+    parser.add_argument("--no-history", action="store_true", help="Do not record this run in the benchmark history")
+    args = parser.parse_args()
+
+    suite = load_suite(args.suite)
+    suffix = ""
+    if args.shard:
+        index, count = parse_shard(args.shard)
+        suite = select_shard(suite, index, count)
+        suffix = f".shard{index}of{count}"
+
+    start_time = time.perf_counter()
+    if args.merge:
+        results, loads = load_logs(args.merge), {}
+        models = sorted({model for model, _, _ in results})
+        print(f"🧩 Merged {len(results)} completions from {len(args.merge)} log(s)")
+    else:
+        models = args.models
+        for model in models:
+            os.makedirs(f"{OUTPUT_DIR}/{model}", exist_ok=True)
+        log = ResultLog(f"{OUTPUT_DIR}/results{suffix}.jsonl")
+        results = resumable_results(log.path) if args.resume else {}
+        if not args.resume:
+            log.reset()
+        jobs = [(model, bench, sample) for model in models for bench in suite for sample in range(args.samples)]
+        pending = [job for job in jobs if (job[0], job[1]["id"], job[2]) not in results]
+        loads = {}
+
+        print(f"🚀 Starting Benchmark on model(s): {', '.join(models)}")
+        print(f"📂 Results will be saved to: {OUTPUT_DIR}/ (log: {log.path})")
+        if args.resume:
+            print(f"⏩ Resuming: {len(jobs) - len(pending)}/{len(jobs)} completions already in the log")
+        print("-" * 60)
+        if pending:
+            try:
+                generated, loads = asyncio.run(run_all(args, pending, log))
+                results.update(generated)
+            except KeyboardInterrupt:
+                sys.exit(f"\n⏸️  Interrupted; finished completions are in {log.path}, rerun with --resume to continue")
+        # Keep the summary in suite order regardless of completion order
+        results = {(model, bench["id"], sample): results[model, bench["id"], sample] for model, bench, sample in jobs}
+
+    if not results:
+        # e.g. a shard of a suite with fewer prompts than shards
+        print("⚠️  No completions to summarize (empty shard or result logs)")
+        return
+    codes = [code for code, _ in results.values()]
+    results = [r for _, r in results.values()]
+    check_codes(results, codes, suite)
+    wall_time = time.perf_counter() - start_time
+    samples = samples_per_prompt(results)
+    ks = [k for k in args.k if k <= samples] if samples > 1 else []
+    aggregates = summarize(results, models, ks)
 
     # Write summary
     print("-" * 60)
     print("📊 Benchmark Summary:")
-    passed = sum(1 for r in results_summary if r['status'] == 'PASS')
-    print(f"Total Tests: {len(BENCHMARKS)}")
-    print(f"Structure Check Pass: {passed}/{len(BENCHMARKS)}")
-    
-    with open(f"{OUTPUT_DIR}/summary.json", "w") as f:
-        json.dump(results_summary, f, indent=2)
+    prompts = len({r["id"] for r in results})
+    print(f"Total Tests: {len(results)} ({prompts} prompts x {samples} sample(s) x {len(models)} model(s))")
+    print(f"Wall time: {wall_time:.2f}s (sequential estimate: {sum(r['elapsed'] for r in results):.2f}s)")
+    tail = sum(r["tail_tokens"] for r in results)
+    if args.no_early_stop:
+        print(f"Tokens after module completion: {tail} of {sum(r['gen_tokens'] for r in results)} "
+              f"(early stop would save {tail / len(results):.1f} per prompt)")
+    else:
+        stopped = sum(r["stopped_early"] for r in results)
+        print(f"Early stop: {stopped}/{len(results)} completions cancelled once the module was complete")
+    print_latency_table(aggregates, ks)
+    errors = [r for r in results if r["status"] == "ERROR"]
+    if errors:
+        print(f"❌ {len(errors)} completion(s) failed and are left out of the pass rates "
+              f"(first: {errors[0]['error']}); rerun with --resume to retry them")
+    unmeasured = sum(1 for r in results if r["stopped_early"] and r["prompt_tokens"] is None)
+    if unmeasured:
+        print(f"ℹ️  Prompt tok/s and total tokens come from the server's final chunk, which the {unmeasured} "
+              f"early-stopped completion(s) never receive; rerun with --no-early-stop to measure them")
+    if loads:
+        cold = ", ".join(f"{model} " + ("already resident" if load["was_resident"] else f"{load['load_time']:.2f}s")
+                         for model, load in loads.items())
+        print(f"🧊 Cold load (excluded from latency): {cold}")
+
+    with open(f"{OUTPUT_DIR}/summary{suffix}.json", "w") as f:
+        sampling = {"samples": samples, "options": None if args.merge else sampling_options(args, 0), "k": ks}
+        json.dump({"models": models, "sampling": sampling, "cold_loads": loads, "aggregates": aggregates,
+                   "results": results}, f, indent=2)
+
+    # A shard is only part of a run; its merged summary is recorded instead
+    if not args.shard and not args.no_history:
+        history = BenchmarkHistory()
+        run_id = history.record_run(results, args.suite, samples, sampling["options"],
+                                    None if args.merge else not args.no_early_stop)
+        history.close()
+        print(f"🗃️  Recorded as run {run_id} in {history.path} (compare builds with scripts/benchmark_history.py)")
 
 if __name__ == "__main__":
     main()
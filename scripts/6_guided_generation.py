@@ -1,8 +1,19 @@
-import subprocess
+import argparse
+import asyncio
 import os
 
+from generation_cache import GenerationCache, cache_key
+from model_residency import ModelResidency
+from ollama_client import OllamaClient
+from verilog_check import check_verilog
+from verilog_extract import extract_code
+
 MODEL_NAME = "verilog-llama3-q3"
 OUTPUT_DIR = "benchmark_results"
+# Ollama server address (default: $OLLAMA_HOST or http://127.0.0.1:11434)
+OLLAMA_HOST = None
+# How long the model stays loaded between variant calls
+KEEP_ALIVE = "30m"
 
 GUIDED_PROMPT = """
 You are an expert Verilog engineer. Write a module named 'fifo_controller_guided'.
@@ -29,7 +40,102 @@ It controls a synchronous FIFO with a depth of 16.
 **Constraint**: Do not use multiple always blocks for the same signal. Keep logic simple and correct.
 """
 
-def run_guided_test():
+# Variants only append to the shared spec, so every call shares its token prefix
+# (after the Modelfile SYSTEM/TEMPLATE) and the server can reuse the evaluated KV cache
+GUIDED_VARIANTS = {
+    "base": "",
+    "async_reset": "**Variant**: Use an asynchronous, active-low reset named reset_n instead of reset.",
+    "almost_full": "**Variant**: Add an output 'almost_full' that is high when count is 14 or more.",
+    "registered_flags": "**Variant**: Register 'full' and 'empty' so they update on the clock edge.",
+    "depth_param": "**Variant**: Make the depth a parameter DEPTH (default 16) and size the pointers with $clog2.",
+}
+FIFO_PORTS = ["clk", "wr_en", "rd_en", "full", "empty", "wr_ptr", "rd_ptr"]
+
+async def generate_resident(client, prompt):
+    """Loads the model before generating so the cold load is reported apart from the generation time."""
+    residency = ModelResidency(client, keep_alive=KEEP_ALIVE)
+    load_time = await residency.ensure_loaded(MODEL_NAME)
+    if not residency.loads[MODEL_NAME]["was_resident"]:
+        print(f"🧊 Cold load: {load_time:.2f}s")
+    result = await client.generate(MODEL_NAME, prompt, keep_alive=KEEP_ALIVE)
+    print(f"⏱️  Generation: {result.get('total_duration', 0) / 1e9:.2f}s (model resident)")
+    await residency.release(MODEL_NAME, last=True)
+    return result
+
+async def generate(prompt, use_cache=True, refresh=False):
+    async with OllamaClient(OLLAMA_HOST, concurrency=1) as client:
+        if not use_cache:
+            return await generate_resident(client, prompt)
+        cache = GenerationCache()
+        try:
+            key = cache_key(await client.model_digest(MODEL_NAME), prompt)
+            result = None if refresh else cache.get(key)
+            if result is not None:
+                print("🗄️  Using cached generation")
+                return result
+            result = await generate_resident(client, prompt)
+            cache.put(key, result, MODEL_NAME)
+            return result
+        finally:
+            cache.close()
+
+def variant_prompt(name):
+    tail = GUIDED_VARIANTS[name]
+    return GUIDED_PROMPT + tail + "\n" if tail else GUIDED_PROMPT
+
+def prompt_eval(result):
+    return result.get("prompt_eval_count", 0), result.get("prompt_eval_duration", 0) / 1e9
+
+async def run_variants(names, baseline=False):
+    """Runs spec variants back to back against a resident model, reusing the evaluated spec.
+
+    The model is unloaded and loaded again first (the cold load is reported on
+    its own) so that a warm-up call evaluates the shared spec from scratch
+    (generating one token), which is also the reference one-shot cost; every
+    variant then only pays prompt-eval for its own tail. Calls go one at a time:
+    each server slot has its own KV cache, so parallel calls would each
+    re-evaluate the spec. With baseline, every variant is first run cold
+    (keep_alive=0 unloads the model, like the old one-shot `ollama run`).
+    Generations are not cached here since the point is to time them.
+    """
+    rows = []
+    async with OllamaClient(OLLAMA_HOST, concurrency=1) as client:
+        for name in names if baseline else []:
+            cold = await client.generate(MODEL_NAME, variant_prompt(name), keep_alive=0)
+            rows.append({"name": name, "cold": prompt_eval(cold)})
+        await client.unload(MODEL_NAME)
+        load_time = await ModelResidency(client, keep_alive=KEEP_ALIVE).ensure_loaded(MODEL_NAME)
+        print(f"🧊 Cold load: {load_time:.2f}s")
+        warm = await client.generate(MODEL_NAME, GUIDED_PROMPT, options={"num_predict": 1}, keep_alive=KEEP_ALIVE)
+        warm_tokens, warm_seconds = prompt_eval(warm)
+        print(f"🔥 Warm-up: evaluated {warm_tokens} prompt tokens in {warm_seconds * 1000:.0f}ms (kept alive {KEEP_ALIVE})")
+
+        rows = rows or [{"name": name} for name in names]
+        for row in rows:
+            result = await client.generate(MODEL_NAME, variant_prompt(row["name"]), keep_alive=KEEP_ALIVE)
+            row["reused"] = prompt_eval(result)
+            row["code"] = extract_code(result["response"])
+            with open(f"{OUTPUT_DIR}/Guided_FIFO_{row['name']}.v", "w") as f:
+                f.write(f"// Prompt: {variant_prompt(row['name'])}\n\n")
+                f.write(result["response"])
+    return warm_seconds, rows
+
+def print_variant_report(warm_seconds, rows):
+    print(f"{'variant':<18}{'eval tokens':>12}{'prompt eval':>13}{'one-shot':>10}{'saved':>9}  check")
+    saved_total = 0.0
+    for row in rows:
+        tokens, seconds = row["reused"]
+        # Without a cold baseline, a one-shot call re-evaluates the spec on top of this call's tail
+        one_shot = row["cold"][1] if "cold" in row else warm_seconds + seconds
+        saved_total += one_shot - seconds
+        status = check_verilog(row["code"], FIFO_PORTS, "fifo_controller_guided").status if row["code"] else "NO_CODE"
+        print(f"{row['name']:<18}{tokens:>12}{seconds * 1000:>11.0f}ms{one_shot * 1000:>8.0f}ms"
+              f"{(one_shot - seconds) * 1000:>7.0f}ms  {status[:60]}")
+    source = "measured cold" if rows and "cold" in rows[0] else "estimated from the warm-up"
+    print(f"⏱️  Prompt-eval saved: {saved_total / len(rows) * 1000:.0f}ms per call over {len(rows)} variants "
+          f"(one-shot cost {source})")
+
+def run_guided_test(use_cache=True, refresh=False):
     print(f"🧭 Testing GUIDED GENERATION on: {MODEL_NAME}")
     print("Prompt: FIFO Controller with explicit logic steps.")
     print("-" * 60)
@@ -38,13 +144,12 @@ def run_guided_test():
         os.makedirs(OUTPUT_DIR)
 
     try:
-        cmd = ["ollama", "run", MODEL_NAME, GUIDED_PROMPT]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = asyncio.run(generate(GUIDED_PROMPT, use_cache, refresh))
         
         filename = f"{OUTPUT_DIR}/Guided_FIFO.v"
         with open(filename, "w") as f:
             f.write(f"// Prompt: {GUIDED_PROMPT}\n\n")
-            f.write(result.stdout)
+            f.write(result["response"])
         
         print(f"Done. Result saved to: {filename}")
         
@@ -52,4 +157,17 @@ def run_guided_test():
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    run_guided_test()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the generation cache")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate and overwrite the cached entry")
+    parser.add_argument("--variants", nargs="*", choices=list(GUIDED_VARIANTS), default=None,
+                        help="Run spec variants (default: all) reusing the evaluated spec prefix")
+    parser.add_argument("--baseline", action="store_true",
+                        help="With --variants, also time each variant cold to measure the saving")
+    args = parser.parse_args()
+    if args.variants is None:
+        run_guided_test(not args.no_cache, args.refresh)
+    else:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        print(f"🧭 Guided spec variants on: {MODEL_NAME}")
+        print_variant_report(*asyncio.run(run_variants(args.variants or list(GUIDED_VARIANTS), args.baseline)))
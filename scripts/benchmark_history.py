@@ -0,0 +1,324 @@
+# 檔案路徑: scripts/benchmark_history.py
+# 評測歷史 (SQLite) 與模型版本之間的退步檢查：
+#   每次 5_benchmark.py 執行的每筆結果都連同 Ollama 模型 digest (涵蓋 GGUF 與 Modelfile) 與量化類型一起保存，
+#   benchmark_results/ 被覆寫後仍可比較不同 adapter、checkpoint 與量化類型。
+#
+# `compare BASE NEW` 檢定 NEW 是否比 BASE 差：
+#   - 生成 tokens/s 與 TTFT：平均值的單尾 permutation test (排除快取的結果，其時間來自舊的執行)
+#   - 整體與各難度的通過率：單尾 Fisher exact test
+#   p 值在所有檢定之間做多重比較校正 (預設 Holm)，有顯著退步時 exit code 為 1。
+#   兩次執行的題目 id、題庫檔、樣本數、取樣參數或 early stop 不同時不比較 (exit code 2)，除非加上 --force。
+# 版本以模型名稱或 digest 前綴指定，可用 NAME@RUN_ID 指定某次執行；預設取該版本最新的一次。
+#
+# 用法:
+#   python scripts/benchmark_history.py runs
+#   python scripts/benchmark_history.py compare verilog-llama3-q3@4 verilog-llama3-q3
+#   python scripts/benchmark_history.py prompt L2_01_BCDCounter
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from fingerprint import STORE_DIR
+
+HISTORY_PATH = os.path.join(STORE_DIR, "benchmark_history.sqlite")
+ALPHA = 0.05
+# 吞吐量 / 延遲的相對變化低於此值時，即使顯著也不標記
+MIN_EFFECT = 0.05
+PERMUTATIONS = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    suite TEXT,
+    suite_digest TEXT,
+    samples INTEGER,
+    options TEXT,
+    early_stop INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    created_at REAL NOT NULL,
+    model TEXT NOT NULL,
+    model_digest TEXT,
+    quant TEXT,
+    prompt_id TEXT NOT NULL,
+    level TEXT,
+    sample INTEGER,
+    status TEXT,
+    passed INTEGER NOT NULL,
+    cached INTEGER NOT NULL,
+    ttft REAL,
+    elapsed REAL,
+    prompt_tokens_per_s REAL,
+    gen_tokens_per_s REAL,
+    gen_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_model_digest ON results (model_digest, created_at);
+CREATE INDEX IF NOT EXISTS results_quant ON results (quant, created_at);
+CREATE INDEX IF NOT EXISTS results_prompt ON results (prompt_id, created_at);
+CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, model);
+"""
+
+def _file_digest(path):
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+class BenchmarkHistory:
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record_run(self, results, suite=None, samples=1, options=None, early_stop=None):
+        # 儲存一次執行與其結果 (格式同 summary.json)，回傳 run id
+        now = time.time()
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (created_at, suite, suite_digest, samples, options, early_stop) VALUES (?, ?, ?, ?, ?, ?)",
+                (now, suite, _file_digest(suite), samples, json.dumps(options), early_stop),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, now, r["model"], r.get("model_digest"), r.get("quant"), r["id"], r["level"],
+                  r.get("sample", 0), r["status"], r["status"] == "PASS", bool(r.get("cached")), r["ttft"],
+                  r["elapsed"], r["prompt_tokens_per_s"], r["gen_tokens_per_s"], r["gen_tokens"])
+                 # 請求失敗是環境問題，不是該版本模型的結果
+                 for r in results if r["status"] != "ERROR"],
+            )
+        return run_id
+
+    def runs(self, limit=20):
+        return self.db.execute(
+            "SELECT r.id, r.created_at, res.model, res.model_digest, res.quant, COUNT(*) AS n,"
+            " SUM(res.passed) AS passed, AVG(CASE WHEN res.cached = 0 THEN res.gen_tokens_per_s END) AS tps"
+            " FROM runs r JOIN results res ON res.run_id = r.id"
+            " WHERE r.id IN (SELECT id FROM runs ORDER BY id DESC LIMIT ?)"
+            " GROUP BY r.id, res.model ORDER BY r.id DESC, res.model",
+            (limit,),
+        ).fetchall()
+
+    def resolve(self, selector):
+        # 解析 NAME、DIGEST_PREFIX、NAME@RUN 或 DIGEST_PREFIX@RUN，回傳 (model, digest, run_id)
+        name, _, run = selector.partition("@")
+        query = ("SELECT model, model_digest, run_id FROM results WHERE (model = ? OR model_digest LIKE ?)"
+                 + (" AND run_id = ?" if run else "") + " ORDER BY created_at DESC LIMIT 1")
+        params = (name, name + "%", int(run)) if run else (name, name + "%")
+        row = self.db.execute(query, params).fetchone()
+        if row is None:
+            raise ValueError(f"no benchmark results for '{selector}'")
+        return row["model"], row["model_digest"], row["run_id"]
+
+    def run_settings(self, run_ids):
+        # 指定 run id 的 runs 資料列 (題庫、樣本數、取樣參數、early stop)
+        run_ids = sorted(set(run_ids))
+        return self.db.execute(f"SELECT * FROM runs WHERE id IN ({', '.join('?' * len(run_ids))})", run_ids).fetchall()
+
+    def build_results(self, selector, all_runs=False):
+        model, digest, run_id = self.resolve(selector)
+        if all_runs:
+            rows = self.db.execute("SELECT * FROM results WHERE model_digest = ?", (digest,)).fetchall()
+            label = f"{model} ({(digest or '')[:12]}, all runs)"
+        else:
+            rows = self.db.execute("SELECT * FROM results WHERE run_id = ? AND model = ?", (run_id, model)).fetchall()
+            label = f"{model} ({(digest or '')[:12]}, run {run_id})"
+        return label, rows
+
+    def prompt_history(self, prompt_id, limit=50):
+        return self.db.execute(
+            "SELECT run_id, created_at, model, model_digest, quant, COUNT(*) AS n, SUM(passed) AS passed,"
+            " AVG(CASE WHEN cached = 0 THEN gen_tokens_per_s END) AS tps FROM results WHERE prompt_id = ?"
+            " GROUP BY run_id, model ORDER BY created_at DESC LIMIT ?",
+            (prompt_id, limit),
+        ).fetchall()
+
+# --- 顯著性檢定 ---
+def permutation_test(base, new, permutations=PERMUTATIONS, seed=0):
+    # 平均值 permutation test 的單尾 p 值 (新版本較低, 新版本較高)
+    observed = sum(new) / len(new) - sum(base) / len(base)
+    pooled = list(base) + list(new)
+    rng = random.Random(seed)
+    lower = higher = 0
+    for _ in range(permutations):
+        rng.shuffle(pooled)
+        diff = sum(pooled[len(base):]) / len(new) - sum(pooled[:len(base)]) / len(base)
+        lower += diff <= observed
+        higher += diff >= observed
+    return (lower + 1) / (permutations + 1), (higher + 1) / (permutations + 1)
+
+def fisher_exact(base_passed, base_total, new_passed, new_total):
+    # Fisher exact test 的單尾 p 值 (新版本通過率較低, 新版本通過率較高)
+    passed, total = base_passed + new_passed, base_total + new_total
+    denominator = math.comb(total, new_total)
+
+    def prob(k):
+        return math.comb(passed, k) * math.comb(total - passed, new_total - k) / denominator
+
+    support = range(max(0, new_total - (total - passed)), min(passed, new_total) + 1)
+    lower = sum(prob(k) for k in support if k <= new_passed)
+    higher = sum(prob(k) for k in support if k >= new_passed)
+    return min(lower, 1.0), min(higher, 1.0)
+
+def holm(p_values):
+    # Holm-Bonferroni 校正後的 p 值，順序與輸入相同
+    order = sorted(range(len(p_values)), key=lambda i: p_values[i])
+    adjusted, running = [0.0] * len(p_values), 0.0
+    for rank, i in enumerate(order):
+        running = max(running, min((len(p_values) - rank) * p_values[i], 1.0))
+        adjusted[i] = running
+    return adjusted
+
+def bonferroni(p_values):
+    return [min(len(p_values) * p, 1.0) for p in p_values]
+
+CORRECTIONS = {"holm": holm, "bonferroni": bonferroni, "none": list}
+
+# 會改變結果意義的執行設定；兩邊一致才比較
+RUN_SETTINGS = (("suite_digest", "suite file"), ("samples", "samples per prompt"),
+                ("options", "sampling options"), ("early_stop", "early stop"))
+
+def _describe(values):
+    return ", ".join("-" if v is None else str(v)[:12] for v in values)
+
+def comparability_issues(base_rows, new_rows, base_runs, new_runs):
+    # 兩組結果無法直接比較的原因；可比較時回傳空 list
+    issues = []
+    base_ids, new_ids = {r["prompt_id"] for r in base_rows}, {r["prompt_id"] for r in new_rows}
+    if base_ids != new_ids:
+        issues.append(f"prompt ids differ: {len(base_ids - new_ids)} only in base, {len(new_ids - base_ids)} only in new")
+    for field, label in RUN_SETTINGS:
+        base_values = sorted({r[field] for r in base_runs}, key=str)
+        new_values = sorted({r[field] for r in new_runs}, key=str)
+        if base_values != new_values:
+            issues.append(f"{label} differs: base {_describe(base_values)}, new {_describe(new_values)}")
+    return issues
+
+def _verdict(p_worse, p_better, change, alpha, min_effect):
+    if p_worse < alpha and abs(change) >= min_effect:
+        return "REGRESSION"
+    if p_better < alpha and abs(change) >= min_effect:
+        return "improved"
+    return "-"
+
+def compare(base_rows, new_rows, alpha=ALPHA, min_effect=MIN_EFFECT, correction="holm"):
+    # 每個指標回傳一筆 (metric, base, new, change, 退步的 p 值, verdict)
+    # 每個指標都是獨立的檢定，p 值先做多重比較校正 (預設 Holm) 再與 alpha 比較
+    tests = []
+    for metric, higher_is_better in (("gen_tokens_per_s", True), ("ttft", False)):
+        base = [r[metric] for r in base_rows if not r["cached"] and r[metric] is not None]
+        new = [r[metric] for r in new_rows if not r["cached"] and r[metric] is not None]
+        if len(base) < 2 or len(new) < 2:
+            continue
+        base_mean, new_mean = sum(base) / len(base), sum(new) / len(new)
+        lower, higher = permutation_test(base, new)
+        p_worse, p_better = (lower, higher) if higher_is_better else (higher, lower)
+        change = (new_mean - base_mean) / base_mean if base_mean else 0.0
+        tests.append((metric, base_mean, new_mean, change, p_worse, p_better, min_effect))
+
+    levels = sorted({r["level"] for r in base_rows} & {r["level"] for r in new_rows})
+    for level in [None, *levels]:
+        base = [r["passed"] for r in base_rows if level in (None, r["level"])]
+        new = [r["passed"] for r in new_rows if level in (None, r["level"])]
+        base_rate, new_rate = sum(base) / len(base), sum(new) / len(new)
+        p_worse, p_better = fisher_exact(sum(base), len(base), sum(new), len(new))
+        # 通過率只要顯著下降，不論幅度都算退步
+        tests.append((f"pass_rate {level or 'all'}", base_rate, new_rate, new_rate - base_rate, p_worse, p_better, 0.0))
+
+    adjust = CORRECTIONS[correction]
+    p_worse = adjust([t[4] for t in tests])
+    p_better = adjust([t[5] for t in tests])
+    return [(metric, base, new, change, worse, _verdict(worse, better, change, alpha, effect))
+            for (metric, base, new, change, _, _, effect), worse, better in zip(tests, p_worse, p_better)]
+
+def _when(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark history and regression checks between model builds.")
+    parser.add_argument("--db", default=HISTORY_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    runs = sub.add_parser("runs", help="List recent runs")
+    runs.add_argument("--limit", type=int, default=20)
+    cmp = sub.add_parser("compare", help="Flag significant regressions of NEW against BASE")
+    cmp.add_argument("base", help="Model name or digest prefix, optionally @RUN_ID")
+    cmp.add_argument("new", help="Model name or digest prefix, optionally @RUN_ID")
+    cmp.add_argument("--all-runs", action="store_true", help="Pool every run of each build instead of the latest")
+    cmp.add_argument("--alpha", type=float, default=ALPHA)
+    cmp.add_argument("--min-effect", type=float, default=MIN_EFFECT,
+                     help="Smallest relative tokens/s or TTFT change worth flagging")
+    cmp.add_argument("--correction", choices=CORRECTIONS, default="holm",
+                     help="Multiple-comparison correction across the metrics")
+    cmp.add_argument("--force", action="store_true",
+                     help="Compare even if the runs differ in suite, samples, options or early stop")
+    prompt = sub.add_parser("prompt", help="Pass rate and tokens/s of one prompt across runs")
+    prompt.add_argument("prompt_id")
+    args = parser.parse_args()
+
+    history = BenchmarkHistory(args.db)
+    if args.command == "runs":
+        print(f"{'run':>5}  {'when':<17}{'model':<28}{'digest':<14}{'quant':<9}{'pass':>9}  {'gen tok/s':>9}")
+        for r in history.runs(args.limit):
+            tps = f"{r['tps']:9.1f}" if r["tps"] is not None else "        -"
+            print(f"{r['id']:>5}  {_when(r['created_at']):<17}{r['model']:<28}{(r['model_digest'] or '-')[:12]:<14}"
+                  f"{r['quant'] or '-':<9}{r['passed']:>4}/{r['n']:<4}  {tps}")
+    elif args.command == "prompt":
+        for r in history.prompt_history(args.prompt_id):
+            tps = f"{r['tps']:.1f} tok/s" if r["tps"] is not None else "cached"
+            print(f"run {r['run_id']:>4}  {_when(r['created_at'])}  {r['model']:<28}{r['quant'] or '-':<9}"
+                  f"{r['passed']}/{r['n']} passed  {tps}")
+    else:
+        try:
+            base_label, base_rows = history.build_results(args.base, args.all_runs)
+            new_label, new_rows = history.build_results(args.new, args.all_runs)
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        print(f"Base: {base_label}, {len(base_rows)} completions")
+        print(f"New:  {new_label}, {len(new_rows)} completions")
+        issues = comparability_issues(base_rows, new_rows,
+                                      history.run_settings(r["run_id"] for r in base_rows),
+                                      history.run_settings(r["run_id"] for r in new_rows))
+        for issue in issues:
+            print(f"⚠️  {issue}")
+        if issues and not args.force:
+            print("❌ The runs are not comparable; rerun with matching settings or pass --force")
+            history.close()
+            sys.exit(2)
+        if issues:
+            # 只有兩個版本都回答過的題目能反映兩者的差異
+            common = {r["prompt_id"] for r in base_rows} & {r["prompt_id"] for r in new_rows}
+            base_rows = [r for r in base_rows if r["prompt_id"] in common]
+            new_rows = [r for r in new_rows if r["prompt_id"] in common]
+            if not common:
+                sys.exit("❌ No prompts in common")
+            print(f"⚠️  Comparing anyway (--force) on the {len(common)} prompts in common")
+        findings = compare(base_rows, new_rows, args.alpha, args.min_effect, args.correction)
+        print(f"{'metric':<22}{'base':>10}{'new':>10}{'change':>9}{'p (' + args.correction + ')':>16}  verdict")
+        for metric, base, new, change, p, verdict in findings:
+            change = f"{change * 100:+.1f}{'pp' if metric.startswith('pass_rate') else '%'}"
+            print(f"{metric:<22}{base:>10.3f}{new:>10.3f}{change:>9}{p:>16.4f}  {verdict}")
+        regressions = [f[0] for f in findings if f[-1] == "REGRESSION"]
+        if regressions:
+            print(f"❌ Significant regression (alpha {args.alpha}, {args.correction}): {', '.join(regressions)}")
+        else:
+            print(f"✅ No significant regression (alpha {args.alpha}, {args.correction})")
+        history.close()
+        sys.exit(1 if regressions else 0)
+    history.close()
+
+if __name__ == "__main__":
+    main()
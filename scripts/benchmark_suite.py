@@ -0,0 +1,91 @@
+# 檔案路徑: scripts/benchmark_suite.py
+# 題庫檔、分片選擇與只追加的結果紀錄：
+#   題庫為 JSONL (安裝 PyYAML 時也可用 YAML list)，每筆一個題目：
+#     {"id": "L1_01_Mux2to1", "level": "L1", "prompt": "...", "ports": ["a", "b", "sel", "y"]}
+#   只有 id 與 prompt 為必填；level 預設取 id 第一個底線之前的部分，ports 預設為空。
+#   分片依排序後的 id 輪流分配，各分片大小最多差一，且與題庫檔中的順序無關。
+#   每完成一題即在 JSONL 紀錄追加一行，中斷後續跑時略過紀錄中已有的部分。
+import json
+import os
+
+SUITE_PATH = "benchmarks/verilog_suite.jsonl"
+
+def _load_records(path):
+    if path.endswith((".yaml", ".yml")):
+        import yaml
+        with open(path) as f:
+            return [(i, record) for i, record in enumerate(yaml.safe_load(f) or [], 1)]
+    records = []
+    with open(path) as f:
+        for lineno, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    records.append((lineno, json.loads(line)))
+                except ValueError as e:
+                    raise ValueError(f"{path}:{lineno}: invalid JSON ({e})") from None
+    return records
+
+def load_suite(path=SUITE_PATH):
+    # 回傳題目 dict 的 list (含 id、level、prompt 與 ports)
+    suite, seen = [], set()
+    for lineno, record in _load_records(path):
+        if not isinstance(record, dict) or not record.get("id") or not record.get("prompt"):
+            raise ValueError(f"{path}:{lineno}: every entry needs an 'id' and a 'prompt'")
+        if record["id"] in seen:
+            raise ValueError(f"{path}:{lineno}: duplicate id '{record['id']}'")
+        seen.add(record["id"])
+        suite.append({
+            **record,
+            "level": record.get("level") or record["id"].split("_")[0],
+            "ports": list(record.get("ports") or []),
+        })
+    return suite
+
+def parse_shard(spec):
+    # 將 'I/N' (從 1 起算，例如 '2/4') 解析為 (index, count)
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"shard must look like I/N, got '{spec}'") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+def select_shard(suite, index, count):
+    # 共 count 片中第 index 片 (從 1 起算) 的題目，維持題庫中的順序
+    ids = {prompt_id for i, prompt_id in enumerate(sorted(bench["id"] for bench in suite)) if i % count == index - 1}
+    return [bench for bench in suite if bench["id"] in ids]
+
+class ResultLog:
+    # 已完成生成的只追加 JSONL 紀錄，以 (model, id, sample) 為 key
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def key(record):
+        return record["model"], record["id"], record["sample"]
+
+    def load(self):
+        # 紀錄中已有的結果；當機時寫到一半的最後一行會從檔案中移除
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(complete)
+        for line in data[:complete].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                records[self.key(record)] = record
+        return records
+
+    def reset(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        open(self.path, "w").close()
+
+    def append(self, record):
+        # 每行一次寫入，當機時最多只有最後一行不完整
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
@@ -0,0 +1,320 @@
+# 檔案路徑: scripts/fake_ollama_server.py
+# 模擬推論延遲的 Ollama 替身伺服器 (只用標準函式庫)，不需要 GPU 或模型即可測試與量測 benchmark client。
+# 以 keep-alive HTTP/1.1 提供部分 Ollama HTTP API：
+#   GET  /api/tags       列出 --models
+#   GET  /api/ps         列出已載入的模型與到期時間
+#   POST /api/generate   串流 (NDJSON) 或一次回傳固定的 Verilog 答案；temperature > 0 時依 seed 從數個變體中挑選
+#
+# 每個請求先等待 --latency 秒加上依 --prompt-tps 計算的 prompt-eval 時間，再以 --tokens-per-s 逐 token 輸出。
+# 同時最多處理 --parallel 個請求 (如 OLLAMA_NUM_PARALLEL)，其餘排隊；每個 slot 保留上一個 prompt 的 token，
+# 只有最長共同前綴之後的部分要付 prompt-eval。--error-rate (隨機) 與 --fail-first (前 N 個) 讓 generate 請求回 503，
+# 用來測試 client 的重試；--drop-after 在串流 N 個 chunk 後直接斷線，模擬 runner 當掉。
+# 載入未常駐的模型需 --load-time 秒 (回報為 load_duration)，最多 --max-loaded 個模型常駐，超過時逐出最久未用的
+# (如 OLLAMA_MAX_LOADED_MODELS)。模型在最後一個請求結束後保留該請求的 keep_alive (預設 5m)；keep_alive=0 立即卸載。
+#
+# 用法:
+#   python scripts/fake_ollama_server.py --port 11435 --latency 0.2 --parallel 4
+#   OLLAMA_HOST=127.0.0.1:11435 python scripts/5_benchmark.py
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import OrderedDict
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+
+CANNED_RESPONSE = """Here is the Verilog implementation:
+
+```verilog
+module top (
+    input  wire clk,
+    input  wire reset,
+    input  wire [7:0] a,
+    output reg  [7:0] y
+);
+    always @(posedge clk) begin
+        if (reset)
+            y <= 8'd0;
+        else
+            y <= a;
+    end
+endmodule
+```
+
+The module registers the input on every rising clock edge and clears the
+output on a synchronous reset. You can extend it with an enable signal or
+parameterize the width if you need a more general register.
+"""
+
+# 取樣時 (temperature > 0) 的變體：只有排版與註解不同、功能不同、以及少了一個 `end`
+SAMPLED_RESPONSES = [
+    CANNED_RESPONSE,
+    CANNED_RESPONSE.replace("    always @(posedge clk) begin", "    // Register stage\n  always @(posedge clk)\n  begin"),
+    CANNED_RESPONSE.replace("y <= a;", "y <= a + 8'd1;"),
+    CANNED_RESPONSE.replace("    end\nendmodule", "endmodule"),
+]
+
+def sample_response(options):
+    # 模擬取樣挑選回應：temperature 0 時固定，否則依 seed 可重現
+    if not options.get("temperature"):
+        return CANNED_RESPONSE
+    return random.Random(options.get("seed")).choice(SAMPLED_RESPONSES)
+
+DEFAULT_KEEP_ALIVE = "5m"
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def parse_keep_alive(value):
+    # 模型保留的秒數：數字 (秒) 或 '30m' 之類的時間長度；負值代表永久保留
+    if value is None:
+        value = DEFAULT_KEEP_ALIVE
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"(-?[\d.]+)(ms|s|m|h)?", str(value).strip())
+    if not match:
+        raise ValueError(f"invalid keep_alive '{value}'")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+def tokenize(text):
+    # 以空白粗略切 token (每個 token 保留前面的空白)
+    return re.findall(r"\s*\S+|\s+$", text) or [text]
+
+class FakeOllama:
+    def __init__(self, args):
+        self.args = args
+        self.slots = asyncio.Semaphore(args.parallel)
+        self.requests = 0
+        # model -> 每個 slot 的 KV cache 所保存的 prompt token
+        self.prompt_cache = {}
+        # 常駐模型 (LRU 順序) -> monotonic 到期時間 (None：使用中或永久保留)
+        self.loaded = OrderedDict()
+        self.in_use = {}
+        self.load_lock = asyncio.Lock()
+        self.loads = 0
+        # 已收到但回應尚未送完的請求數與其峰值 (測試用來確認 client 的並行上限)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.generate_requests = 0
+        self.connections = 0
+
+    def model_info(self, name):
+        return {
+            "name": name, "model": name, "size": 4 * 1024**3,
+            "digest": hashlib.sha256(name.encode()).hexdigest(),
+            "details": {"format": "gguf", "family": "llama", "quantization_level": name.rsplit("-", 1)[-1].upper()},
+        }
+
+    def expire(self):
+        now = time.monotonic()
+        for model, expires in list(self.loaded.items()):
+            if expires is not None and expires <= now and not self.in_use.get(model):
+                self.unload(model)
+
+    def unload(self, model):
+        self.loaded.pop(model, None)
+        self.prompt_cache.pop(model, None)
+
+    async def acquire_model(self, model):
+        # 標記模型使用中，必要時先載入 (並逐出最久未用的模型)；回傳載入時間
+        self.in_use[model] = self.in_use.get(model, 0) + 1
+        async with self.load_lock:
+            self.expire()
+            if model in self.loaded:
+                self.loaded.move_to_end(model)
+                self.loaded[model] = None
+                return 0.0
+            while len(self.loaded) >= self.args.max_loaded:
+                self.unload(next(iter(self.loaded)))
+            await asyncio.sleep(self.args.load_time)
+            self.loads += 1
+            self.loaded[model] = None
+            return self.args.load_time
+
+    def release_model(self, model, keep_alive):
+        # 最後一個請求結束後開始計算該模型的 keep_alive
+        self.in_use[model] -= 1
+        seconds = parse_keep_alive(keep_alive)
+        if seconds == 0:
+            self.unload(model)
+        elif model in self.loaded and not self.in_use[model]:
+            self.loaded[model] = None if seconds < 0 else time.monotonic() + seconds
+
+    def running(self):
+        self.expire()
+        now, wall = time.monotonic(), datetime.now(timezone.utc)
+        return [{
+            **self.model_info(model),
+            "size_vram": self.model_info(model)["size"],
+            # 使用中或永久保留時回報遙遠的到期時間，與 Ollama 相同
+            "expires_at": (wall + timedelta(seconds=expires - now) if expires is not None
+                           else datetime(2318, 1, 1, tzinfo=timezone.utc)).isoformat(),
+        } for model, expires in self.loaded.items()]
+
+    def load_cache_slot(self, model, prompt_tokens):
+        # 挑選與 prompt 共同前綴最長的 slot，回傳可沿用的 token 數
+        slots = self.prompt_cache.setdefault(model, [[] for _ in range(self.args.parallel)])
+        best, cached = 0, 0
+        for i, slot in enumerate(slots):
+            n = 0
+            for a, b in zip(slot, prompt_tokens):
+                if a != b:
+                    break
+                n += 1
+            if n > cached:
+                best, cached = i, n
+        slots[best] = prompt_tokens
+        # 最後一個 prompt token 一定要計算，才能產生第一個 logits
+        return min(cached, len(prompt_tokens) - 1)
+
+    async def generate_chunks(self, payload):
+        options = payload.get("options") or {}
+        async with self.slots:
+            start = time.perf_counter()
+            load_time = await self.acquire_model(payload["model"])
+            try:
+                prompt = tokenize(payload.get("prompt", ""))
+                prompt_tokens = len(prompt) - self.load_cache_slot(payload["model"], prompt)
+                tokens = tokenize(sample_response(options))
+                if options.get("num_predict", -1) >= 0:
+                    tokens = tokens[:options["num_predict"]]
+                prompt_time = prompt_tokens / self.args.prompt_tps
+                await asyncio.sleep(self.args.latency + prompt_time)
+                eval_start = time.perf_counter()
+                for token in tokens:
+                    await asyncio.sleep(1 / self.args.tokens_per_s)
+                    yield {"model": payload["model"], "response": token, "done": False}
+                now = time.perf_counter()
+            finally:
+                # client 提前中斷串流時也會執行
+                self.release_model(payload["model"], payload.get("keep_alive"))
+        yield {
+            "model": payload["model"], "response": "", "done": True, "done_reason": "stop",
+            "total_duration": int((now - start) * 1e9), "load_duration": int(load_time * 1e9),
+            "prompt_eval_count": prompt_tokens, "prompt_eval_duration": int(prompt_time * 1e9),
+            "eval_count": len(tokens), "eval_duration": int((now - eval_start) * 1e9),
+        }
+
+    async def handle_generate(self, payload):
+        if payload.get("model") not in self.args.models:
+            return 404, {"error": f"model '{payload.get('model')}' not found"}
+        try:
+            keep_alive = parse_keep_alive(payload.get("keep_alive"))
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        self.generate_requests += 1
+        if self.generate_requests <= self.args.fail_first or random.random() < self.args.error_rate:
+            return 503, {"error": "server busy"}
+        if not payload.get("prompt"):
+            # 空 prompt 只載入模型；keep_alive=0 時則是卸載
+            if keep_alive == 0:
+                self.unload(payload["model"])
+                return 200, {"model": payload["model"], "response": "", "done": True, "done_reason": "unload"}
+            load_time = await self.acquire_model(payload["model"])
+            self.release_model(payload["model"], payload.get("keep_alive"))
+            return 200, {"model": payload["model"], "response": "", "done": True, "done_reason": "load",
+                         "load_duration": int(load_time * 1e9)}
+        chunks = self.generate_chunks(payload)
+        # 與 Ollama 相同，除非請求另外指定，否則預設串流
+        if payload.get("stream", True):
+            return 200, chunks
+        text = []
+        async for chunk in chunks:
+            text.append(chunk["response"])
+        chunk["response"] = "".join(text)
+        return 200, chunk
+
+    async def dispatch(self, method, path, payload):
+        self.requests += 1
+        if method == "GET" and path == "/api/tags":
+            return 200, {"models": [self.model_info(name) for name in self.args.models]}
+        if method == "GET" and path == "/api/ps":
+            return 200, {"models": self.running()}
+        if method == "POST" and path == "/api/generate":
+            return await self.handle_generate(payload)
+        return 404, {"error": f"{method} {path} not found"}
+
+    async def serve_connection(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.loads(body) if body else {}
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    await self.respond(writer, *await self.dispatch(method, path, payload))
+                finally:
+                    self.in_flight -= 1
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, response):
+        status_line = f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+        if isinstance(response, dict):
+            data = json.dumps(response).encode()
+            writer.write(f"{status_line}Content-Type: application/json\r\n"
+                         f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+        else:
+            writer.write(f"{status_line}Content-Type: application/x-ndjson\r\n"
+                         f"Transfer-Encoding: chunked\r\n\r\n".encode())
+            async with aclosing(response) as chunks:
+                sent = 0
+                async for chunk in chunks:
+                    if sent == self.args.drop_after:
+                        # 模擬 runner 當掉：送出部分 token 後直接斷線，不送結束的 chunk
+                        raise ConnectionResetError("simulated drop")
+                    data = json.dumps(chunk).encode() + b"\n"
+                    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    await writer.drain()
+                    sent += 1
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+
+async def serve(args):
+    app = FakeOllama(args)
+    server = await asyncio.start_server(app.serve_connection, args.host, args.port)
+    print(f"🧪 Fake Ollama listening on http://{args.host}:{args.port} (models: {', '.join(args.models)})")
+    async with server:
+        await server.serve_forever()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stand-in Ollama server with simulated latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", nargs="+", default=["verilog-llama3-q3", "verilog-llama3-q4"])
+    parser.add_argument("--latency", type=float, default=0.2, help="Fixed per-request overhead in seconds")
+    parser.add_argument("--prompt-tps", type=float, default=2000.0, help="Simulated prompt-eval tokens/s")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="Simulated generation tokens/s")
+    parser.add_argument("--parallel", type=int, default=4, help="Requests served concurrently")
+    parser.add_argument("--load-time", type=float, default=1.5, help="Seconds to load a model that is not resident")
+    parser.add_argument("--max-loaded", type=int, default=1, help="Models resident at once (LRU eviction)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N generate requests with 503")
+    parser.add_argument("--drop-after", type=int, default=-1,
+                        help="Drop the connection after streaming N chunks (simulates a crashed runner)")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
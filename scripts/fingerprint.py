@@ -0,0 +1,67 @@
+# 檔案路徑: scripts/fingerprint.py
+# 內容雜湊工具：檔案 / 目錄的 sha256，並以 (size, mtime) 快取結果，
+# 讓沒有變動的大檔案 (資料 shard、adapter、GGUF) 不必每次重新讀取。
+import hashlib
+import json
+import os
+
+STORE_DIR = ".pipeline"
+HASH_CACHE_PATH = os.path.join(STORE_DIR, "hash_cache.json")
+IGNORED_NAMES = {"__pycache__", ".cache", ".DS_Store"}
+CHUNK_SIZE = 1 << 20
+
+class HashCache:
+    def __init__(self, path=HASH_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def file_digest(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["digest"]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.entries[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        self.dirty = True
+        return digest
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+def path_digest(path, cache=None):
+    """檔案回傳內容雜湊；目錄回傳所有檔案 (相對路徑 + 內容雜湊) 的雜湊；不存在時回傳 None"""
+    cache = cache or HashCache()
+    if os.path.isfile(path):
+        return cache.file_digest(path)
+    if not os.path.isdir(path):
+        return None
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_NAMES)
+        for name in sorted(files):
+            if name in IGNORED_NAMES:
+                continue
+            full = os.path.join(root, name)
+            h.update(os.path.relpath(full, path).encode())
+            h.update(cache.file_digest(full).encode())
+    return h.hexdigest()
+
+def combine(parts):
+    """將任意可 JSON 序列化的內容合成一個穩定的雜湊"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,75 @@
+# 檔案路徑: scripts/generation_cache.py
+# 模型生成結果的磁碟快取，以模型 digest、prompt 與取樣參數為 key：
+#   Ollama 模型 digest 涵蓋 GGUF 權重與 Modelfile 的 SYSTEM/TEMPLATE，搭配 prompt 即可唯一決定實際輸入。
+#   所有項目存在單一 SQLite 檔 (WAL 模式，可在同時執行的多個 benchmark 行程間共用)，
+#   內容總量超過 max_bytes 時逐出最久未使用的項目。
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from fingerprint import STORE_DIR
+
+CACHE_PATH = os.path.join(STORE_DIR, "generations.sqlite")
+MAX_BYTES = 512 * 1024**2
+
+def cache_key(model_digest, prompt, options=None, **extra):
+    # 生成請求的穩定 key；extra 放其他會改變輸出的設定
+    parts = {"model_digest": model_digest, "prompt": prompt, "options": options or {}, **extra}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+class GenerationCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " key TEXT PRIMARY KEY, model TEXT, model_digest TEXT, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        self.db.commit()
+
+    def get(self, key):
+        row = self.db.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.db:
+            self.db.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, value, model=None, model_digest=None):
+        data = json.dumps(value)
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, model_digest, data, len(data), now, now),
+            )
+        self.evict()
+
+    def evict(self):
+        # 逐出最久未使用的項目，直到內容總量不超過 max_bytes
+        (total,) = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()
+        if total <= self.max_bytes:
+            return 0
+        excess, doomed = total - self.max_bytes, []
+        for key, size in self.db.execute("SELECT key, size FROM generations ORDER BY last_used"):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        with self.db:
+            self.db.executemany("DELETE FROM generations WHERE key = ?", doomed)
+        return len(doomed)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,279 @@
+# 檔案路徑: scripts/gguf_inspect.py
+# 零複製的 GGUF 檢查工具：
+#   以 mmap 開啟 .gguf，只解析 header、metadata key-value 與 tensor info 表，不讀取 tensor 資料。
+#   驗證 magic / version、tensor type、對齊、tensor offset 是否重疊或超出範圍，以及檔案是否被截斷。
+#
+# 用法: python scripts/gguf_inspect.py gguf_models/*.gguf [--json] [--tensors]
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+GGUF_MAGIC = b"GGUF"
+SUPPORTED_VERSIONS = (2, 3)
+DEFAULT_ALIGNMENT = 32
+MAX_INLINE_ARRAY = 64
+
+# ggml type id -> (名稱, 每個 block 的元素數, 每個 block 的 byte 數)
+GGML_TYPES = {
+    0: ("F32", 1, 4), 1: ("F16", 1, 2), 2: ("Q4_0", 32, 18), 3: ("Q4_1", 32, 20),
+    6: ("Q5_0", 32, 22), 7: ("Q5_1", 32, 24), 8: ("Q8_0", 32, 34), 9: ("Q8_1", 32, 36),
+    10: ("Q2_K", 256, 84), 11: ("Q3_K", 256, 110), 12: ("Q4_K", 256, 144), 13: ("Q5_K", 256, 176),
+    14: ("Q6_K", 256, 210), 15: ("Q8_K", 256, 292), 16: ("IQ2_XXS", 256, 66), 17: ("IQ2_XS", 256, 74),
+    18: ("IQ3_XXS", 256, 98), 19: ("IQ1_S", 256, 50), 20: ("IQ4_NL", 32, 18), 21: ("IQ3_S", 256, 110),
+    22: ("IQ2_S", 256, 82), 23: ("IQ4_XS", 256, 136), 24: ("I8", 1, 1), 25: ("I16", 1, 2),
+    26: ("I32", 1, 4), 27: ("I64", 1, 8), 28: ("F64", 1, 8), 29: ("IQ1_M", 256, 56),
+    30: ("BF16", 1, 2), 34: ("TQ1_0", 256, 54), 35: ("TQ2_0", 256, 66),
+}
+
+# general.file_type (llama_ftype) -> llama-quantize 使用的名稱
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1", 10: "Q2_K",
+    11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M", 16: "Q5_K_S",
+    17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S", 22: "IQ3_XS",
+    23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M", 28: "IQ2_S",
+    29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0", 37: "TQ2_0",
+}
+
+# metadata value type id -> struct 格式 (8 = 字串、9 = 陣列，另外處理)
+VALUE_FORMATS = {0: "B", 1: "b", 2: "H", 3: "h", 4: "I", 5: "i", 6: "f", 7: "?", 10: "Q", 11: "q", 12: "d"}
+STRING_TYPE, ARRAY_TYPE = 8, 9
+
+class GGUFError(Exception):
+    pass
+
+@dataclass
+class GGUFArray:
+    # 大型 metadata 陣列 (例如 tokenizer 詞表) 的佔位物件
+    item_type: int
+    count: int
+
+    def __repr__(self):
+        return f"<array of {self.count}>"
+
+@dataclass
+class TensorInfo:
+    name: str
+    shape: list
+    ggml_type: int
+    offset: int
+
+    @property
+    def type_name(self):
+        return GGML_TYPES[self.ggml_type][0]
+
+    @property
+    def n_elements(self):
+        n = 1
+        for dim in self.shape:
+            n *= dim
+        return n
+
+    @property
+    def nbytes(self):
+        _, block_size, type_size = GGML_TYPES[self.ggml_type]
+        return self.n_elements // block_size * type_size
+
+@dataclass
+class GGUFFile:
+    path: str
+    version: int
+    file_size: int
+    alignment: int
+    data_offset: int
+    metadata: dict = field(default_factory=dict)
+    tensors: list = field(default_factory=list)
+
+    @property
+    def architecture(self):
+        return self.metadata.get("general.architecture")
+
+    @property
+    def file_type_name(self):
+        return FILE_TYPES.get(self.metadata.get("general.file_type"))
+
+    def arch_param(self, key):
+        return self.metadata.get(f"{self.architecture}.{key}")
+
+    def summary(self):
+        by_type = Counter()
+        bytes_by_type = Counter()
+        for tensor in self.tensors:
+            by_type[tensor.type_name] += 1
+            bytes_by_type[tensor.type_name] += tensor.nbytes
+        return {
+            "path": self.path,
+            "version": self.version,
+            "file_size": self.file_size,
+            "name": self.metadata.get("general.name"),
+            "architecture": self.architecture,
+            "file_type": self.file_type_name,
+            "context_length": self.arch_param("context_length"),
+            "embedding_length": self.arch_param("embedding_length"),
+            "block_count": self.arch_param("block_count"),
+            "head_count": self.arch_param("attention.head_count"),
+            "head_count_kv": self.arch_param("attention.head_count_kv"),
+            "n_tensors": len(self.tensors),
+            "n_parameters": sum(t.n_elements for t in self.tensors),
+            "tensor_bytes": sum(t.nbytes for t in self.tensors),
+            "tensor_types": {name: {"count": by_type[name], "bytes": bytes_by_type[name]} for name in by_type},
+        }
+
+class _Reader:
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def unpack(self, fmt, count=1):
+        fmt = f"<{count}{fmt}"
+        size = struct.calcsize(fmt)
+        if self.pos + size > len(self.buf):
+            raise GGUFError(f"truncated header at byte {self.pos}")
+        values = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += size
+        return values if count != 1 else values[0]
+
+    def skip(self, size):
+        if self.pos + size > len(self.buf):
+            raise GGUFError(f"truncated header at byte {self.pos}")
+        self.pos += size
+
+    def string(self):
+        length = self.unpack("Q")
+        if self.pos + length > len(self.buf):
+            raise GGUFError(f"truncated string at byte {self.pos}")
+        value = self.buf[self.pos:self.pos + length].decode("utf-8", errors="replace")
+        self.pos += length
+        return value
+
+    def value(self, value_type):
+        if value_type == STRING_TYPE:
+            return self.string()
+        if value_type == ARRAY_TYPE:
+            item_type, count = self.unpack("I"), self.unpack("Q")
+            if count <= MAX_INLINE_ARRAY:
+                return [self.value(item_type) for _ in range(count)]
+            # 大型陣列直接跳過，不實際讀出內容
+            if item_type in VALUE_FORMATS:
+                self.skip(struct.calcsize("<" + VALUE_FORMATS[item_type]) * count)
+            else:
+                for _ in range(count):
+                    self.value(item_type)
+            return GGUFArray(item_type, count)
+        if value_type not in VALUE_FORMATS:
+            raise GGUFError(f"unknown metadata value type {value_type} at byte {self.pos}")
+        return self.unpack(VALUE_FORMATS[value_type])
+
+def _align(offset, alignment):
+    return offset + (alignment - offset % alignment) % alignment
+
+def read_gguf(path):
+    # 以 mmap 解析 header、metadata 與 tensor info；格式錯誤時 raise GGUFError
+    file_size = os.path.getsize(path)
+    if file_size < 24:
+        raise GGUFError(f"{path}: file too small ({file_size} bytes)")
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = _Reader(mm)
+        if reader.buf[:4] != GGUF_MAGIC:
+            raise GGUFError(f"{path}: bad magic {bytes(reader.buf[:4])!r}")
+        reader.skip(4)
+        version = reader.unpack("I")
+        if version not in SUPPORTED_VERSIONS:
+            raise GGUFError(f"{path}: unsupported GGUF version {version} (big-endian or v1 file?)")
+        n_tensors, n_kv = reader.unpack("Q"), reader.unpack("Q")
+
+        metadata = {}
+        for _ in range(n_kv):
+            key = reader.string()
+            metadata[key] = reader.value(reader.unpack("I"))
+
+        tensors = []
+        for _ in range(n_tensors):
+            name = reader.string()
+            n_dims = reader.unpack("I")
+            shape = list(reader.unpack("Q", n_dims)) if n_dims != 1 else [reader.unpack("Q")]
+            ggml_type = reader.unpack("I")
+            offset = reader.unpack("Q")
+            tensors.append(TensorInfo(name, shape, ggml_type, offset))
+
+        alignment = metadata.get("general.alignment", DEFAULT_ALIGNMENT)
+        return GGUFFile(path, version, file_size, alignment, _align(reader.pos, alignment), metadata, tensors)
+
+def validate_gguf(path):
+    # 讀取並驗證 GGUF 檔，回傳解析後的 GGUFFile，有問題則 raise GGUFError
+    gguf = read_gguf(path)
+    if gguf.alignment <= 0 or gguf.alignment & (gguf.alignment - 1):
+        raise GGUFError(f"{path}: alignment {gguf.alignment} is not a power of two")
+
+    seen = set()
+    end = 0
+    for tensor in sorted(gguf.tensors, key=lambda t: t.offset):
+        if tensor.name in seen:
+            raise GGUFError(f"{path}: duplicate tensor {tensor.name}")
+        seen.add(tensor.name)
+        if tensor.ggml_type not in GGML_TYPES:
+            raise GGUFError(f"{path}: tensor {tensor.name} has unknown type {tensor.ggml_type}")
+        block_size = GGML_TYPES[tensor.ggml_type][1]
+        if tensor.shape and tensor.shape[0] % block_size:
+            raise GGUFError(f"{path}: tensor {tensor.name} row size {tensor.shape[0]} "
+                            f"is not a multiple of the {tensor.type_name} block size {block_size}")
+        if tensor.offset % gguf.alignment:
+            raise GGUFError(f"{path}: tensor {tensor.name} offset {tensor.offset} is not {gguf.alignment}-byte aligned")
+        if tensor.offset < end:
+            raise GGUFError(f"{path}: tensor {tensor.name} overlaps the previous tensor")
+        end = tensor.offset + tensor.nbytes
+
+    if gguf.data_offset + end > gguf.file_size:
+        raise GGUFError(f"{path}: truncated, tensor data needs {gguf.data_offset + end} bytes "
+                        f"but file has {gguf.file_size}")
+    return gguf
+
+def _format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.2f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+
+def print_report(gguf, show_tensors=False):
+    s = gguf.summary()
+    print(f"📦 {s['path']} (GGUF v{s['version']}, {_format_size(s['file_size'])})")
+    print(f"   Name: {s['name']} | Arch: {s['architecture']} | File type: {s['file_type']}")
+    print(f"   Context: {s['context_length']} | Embedding: {s['embedding_length']} | "
+          f"Blocks: {s['block_count']} | Heads: {s['head_count']}/{s['head_count_kv']}")
+    print(f"   Tensors: {s['n_tensors']} | Params: {s['n_parameters'] / 1e9:.2f}B | Data: {_format_size(s['tensor_bytes'])}")
+    for name, info in sorted(s["tensor_types"].items(), key=lambda kv: -kv[1]["bytes"]):
+        print(f"     {name:>8}: {info['count']:4d} tensors, {_format_size(info['bytes'])}")
+    if show_tensors:
+        for t in gguf.tensors:
+            print(f"     {t.name:<48} {t.type_name:>8} {str(t.shape):<20} @ {t.offset}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and validate GGUF files without loading tensor data.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--json", action="store_true", help="Print summaries as JSON")
+    parser.add_argument("--tensors", action="store_true", help="List every tensor")
+    args = parser.parse_args()
+
+    summaries, failed = [], False
+    for path in args.paths:
+        try:
+            gguf = validate_gguf(path)
+        except (GGUFError, OSError) as e:
+            print(f"❌ {e}", file=sys.stderr)
+            failed = True
+            continue
+        if args.json:
+            summaries.append(gguf.summary())
+        else:
+            print_report(gguf, args.tensors)
+            print("   ✅ Valid")
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# 檔案路徑: scripts/lora_merge.py
+# 串流式低記憶體 LoRA 合併 (僅用 CPU)：
+#   base model 的 safetensors shard 以 mmap 開啟並逐一 tensor 重寫；沒有 LoRA 的 tensor 原樣複製，
+#   目標權重則以 row chunk 為單位套用 W + B @ A * scale。合併後 dtype 與 shape 不變，
+#   每個輸出 shard 可直接沿用原本的 header，一次順序寫完；記憶體峰值約為最大權重的一個 row chunk。
+#
+# 用法: python scripts/lora_merge.py outputs/final_adapter merged_out [--base unsloth/llama-3-8b]
+import argparse
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import time
+
+import torch
+from safetensors import safe_open
+
+ROW_CHUNK = 1024
+COPY_CHUNK = 64 * 1024**2
+ADAPTER_WEIGHTS = "adapter_model.safetensors"
+SAFETENSORS_INDEX = "model.safetensors.index.json"
+TORCH_DTYPES = {"F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16}
+# 與合併後 shard 放在一起的檔案；tokenizer 優先使用 adapter 目錄中的版本
+MODEL_FILES = ["config.json", "generation_config.json"]
+TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "special_tokens_map.json", "tokenizer.model"]
+
+def resolve_base_model(adapter_config, base_model=None):
+    # 回傳存放 16-bit base model safetensors 的本地目錄
+    name = base_model or adapter_config["base_model_name_or_path"]
+    # adapter 是在 4-bit checkpoint 上訓練的，合併到對應的 16-bit 版本
+    if name.endswith("-bnb-4bit"):
+        name = name[: -len("-bnb-4bit")]
+    if os.path.isdir(name):
+        return name
+    from huggingface_hub import snapshot_download
+    return snapshot_download(name, allow_patterns=["*.safetensors", "*.json", "tokenizer*"])
+
+def load_lora_weights(adapter_path, adapter_config):
+    # 回傳 {base tensor 名稱: (A, B, scale)} 與 {base tensor 名稱: 整個替換的 tensor}
+    lora, replacements = {}, {}
+    with safe_open(os.path.join(adapter_path, ADAPTER_WEIGHTS), framework="pt") as f:
+        keys = list(f.keys())
+        tensors = {key: f.get_tensor(key) for key in keys}
+
+    for key, tensor in tensors.items():
+        name = key.removeprefix("base_model.model.")
+        if ".lora_A." in name:
+            module = name.split(".lora_A.")[0]
+            A = tensor
+            B = tensors[key.replace(".lora_A.", ".lora_B.")]
+            r = A.shape[0]
+            alpha = adapter_config.get("alpha_pattern", {}).get(module.split(".")[-1], adapter_config["lora_alpha"])
+            scale = alpha / math.sqrt(r) if adapter_config.get("use_rslora") else alpha / r
+            lora[module + ".weight"] = (A.float(), B.float(), scale)
+        elif ".lora_B." not in name:
+            # modules_to_save (例如調整過大小的 embedding) 直接取代整個 base tensor
+            replacements[name] = tensor
+    return lora, replacements
+
+def read_header(path):
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        raw = f.read(length)
+    return length, raw, json.loads(raw)
+
+def merge_shard(src_path, dst_path, lora, replacements, fan_in_fan_out=False):
+    header_len, header_raw, header = read_header(src_path)
+    data_start = 8 + header_len
+    tensors = sorted(
+        ((name, info) for name, info in header.items() if name != "__metadata__"),
+        key=lambda item: item[1]["data_offsets"][0],
+    )
+    merged = 0
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        # ACCESS_COPY 讓 torch.frombuffer 取得可寫的 view，又不會改到原檔
+        mm = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_COPY)
+        try:
+            dst.write(struct.pack("<Q", header_len))
+            dst.write(header_raw)
+            for name, info in tensors:
+                begin, end = (data_start + off for off in info["data_offsets"])
+                if dst.tell() != begin:
+                    raise ValueError(f"{src_path}: unexpected gap before tensor {name}")
+                if name in lora:
+                    _write_merged(dst, mm, begin, info, *lora[name], fan_in_fan_out)
+                    merged += 1
+                elif name in replacements:
+                    tensor = replacements[name].to(TORCH_DTYPES[info["dtype"]]).contiguous()
+                    if list(tensor.shape) != info["shape"]:
+                        raise ValueError(f"{name}: adapter shape {list(tensor.shape)} != base {info['shape']}")
+                    dst.write(tensor.view(torch.uint8).numpy().tobytes())
+                    merged += 1
+                else:
+                    for pos in range(begin, end, COPY_CHUNK):
+                        dst.write(mm[pos:min(pos + COPY_CHUNK, end)])
+        finally:
+            mm.close()
+    return merged
+
+def _write_merged(dst, mm, begin, info, A, B, scale, fan_in_fan_out):
+    dtype = TORCH_DTYPES[info["dtype"]]
+    rows, cols = info["shape"]
+    itemsize = torch.tensor([], dtype=dtype).element_size()
+    weight = torch.frombuffer(mm, dtype=dtype, count=rows * cols, offset=begin).view(rows, cols)
+    for start in range(0, rows, ROW_CHUNK):
+        stop = min(start + ROW_CHUNK, rows)
+        if fan_in_fan_out:
+            delta = (B @ A[:, start:stop]).T
+        else:
+            delta = B[start:stop] @ A
+        chunk = (weight[start:stop].float() + delta * scale).to(dtype)
+        dst.write(chunk.contiguous().view(torch.uint8).numpy().tobytes())
+    assert dst.tell() == begin + rows * cols * itemsize
+
+def merge_lora_streaming(adapter_path, output_dir, base_model=None):
+    start = time.perf_counter()
+    with open(os.path.join(adapter_path, "adapter_config.json")) as f:
+        adapter_config = json.load(f)
+    base_dir = resolve_base_model(adapter_config, base_model)
+    lora, replacements = load_lora_weights(adapter_path, adapter_config)
+    print(f"🧩 Base: {base_dir} | {len(lora)} LoRA targets, {len(replacements)} replaced tensors")
+
+    index_path = os.path.join(base_dir, SAFETENSORS_INDEX)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            shards = sorted(set(json.load(f)["weight_map"].values()))
+    else:
+        shards = ["model.safetensors"]
+
+    os.makedirs(output_dir, exist_ok=True)
+    merged = 0
+    for i, shard in enumerate(shards, 1):
+        shard_start = time.perf_counter()
+        merged += merge_shard(os.path.join(base_dir, shard), os.path.join(output_dir, shard),
+                              lora, replacements, adapter_config.get("fan_in_fan_out", False))
+        print(f"   [{i}/{len(shards)}] {shard} ({time.perf_counter() - shard_start:.1f}s)")
+
+    expected = len(lora) + len(replacements)
+    if merged != expected:
+        raise ValueError(f"Only {merged}/{expected} adapter tensors matched base weights")
+
+    for name in [SAFETENSORS_INDEX] + MODEL_FILES:
+        if os.path.exists(os.path.join(base_dir, name)):
+            shutil.copy(os.path.join(base_dir, name), output_dir)
+    # 合併後為一般 16-bit 權重：移除 config 中的量化設定
+    config_path = os.path.join(output_dir, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+        config.pop("quantization_config", None)
+        with open(config_path, "w") as f:
+            json.dump(config, f, indent=2)
+    for name in TOKENIZER_FILES:
+        for source in (adapter_path, base_dir):
+            if os.path.exists(os.path.join(source, name)):
+                shutil.copy(os.path.join(source, name), output_dir)
+                break
+    print(f"✅ Streaming merge finished in {time.perf_counter() - start:.1f}s -> {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming, low-memory LoRA merge over safetensors shards (CPU only)")
+    parser.add_argument("adapter_path")
+    parser.add_argument("output_dir")
+    parser.add_argument("--base", default=None, help="Base model repo or local directory (default: from adapter_config.json)")
+    args = parser.parse_args()
+    merge_lora_streaming(args.adapter_path, args.output_dir, args.base)
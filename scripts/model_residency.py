@@ -0,0 +1,56 @@
+# 檔案路徑: scripts/model_residency.py
+# 讓一次評測用到的模型常駐記憶體，並把冷啟動載入時間另外計算：
+#   Ollama 在第一個請求時才載入模型，最後一個請求結束 keep_alive (預設 5 分鐘) 後卸載。
+#   不處理的話，第一題要付出把整個 GGUF 讀進記憶體的時間，交錯使用多個模型 (例如 q3 與 q4) 時還會反覆換入換出 VRAM。
+#   plan_by_model() 讓同一個模型的工作連續執行；ModelResidency 在第一次生成前明確載入模型並單獨計時，
+#   延遲數據只涵蓋穩定狀態。執行期間請求帶 RUN_KEEP_ALIVE，避免在兩題之間過期；
+#   該模型的工作結束後即卸載，騰出空間給下一個模型。最後一個模型，以及評測前就已載入的模型，改回 IDLE_KEEP_ALIVE。
+#
+#   residency = ModelResidency(client)
+#   for model, group in plan_by_model(jobs, key=lambda job: job[0]):
+#       await residency.ensure_loaded(model)
+#       ...  # 以 keep_alive=residency.keep_alive 生成
+#       await residency.release(model, last=...)
+import asyncio
+import time
+
+# 模型的工作執行期間使用 (足以涵蓋檢查結果等空檔)
+RUN_KEEP_ALIVE = "30m"
+# 評測結束後的最後一個模型 (Ollama 本身的預設值)
+IDLE_KEEP_ALIVE = "5m"
+
+def plan_by_model(jobs, key):
+    # 依模型分組，順序為第一次出現的順序；回傳 [(model, jobs)]
+    groups = {}
+    for job in jobs:
+        groups.setdefault(key(job), []).append(job)
+    return list(groups.items())
+
+class ModelResidency:
+    def __init__(self, client, keep_alive=RUN_KEEP_ALIVE, idle_keep_alive=IDLE_KEEP_ALIVE):
+        self.client = client
+        self.keep_alive = keep_alive
+        self.idle_keep_alive = idle_keep_alive
+        # model -> {"load_time": 秒數, "was_resident": bool}
+        self.loads = {}
+        self._locks = {}
+
+    async def ensure_loaded(self, model):
+        # 每次評測只載入一次，同時呼叫者等待同一次載入；回傳載入時間
+        async with self._locks.setdefault(model, asyncio.Lock()):
+            if model not in self.loads:
+                was_resident = await self.client.is_loaded(model)
+                start = time.perf_counter()
+                await self.client.load(model, self.keep_alive)
+                self.loads[model] = {"load_time": time.perf_counter() - start, "was_resident": was_resident}
+        return self.loads[model]["load_time"]
+
+    async def release(self, model, last=False):
+        # 工作結束的模型卸載，或改回閒置時的 keep_alive
+        if model not in self.loads:
+            # 從未載入，例如所有生成都來自快取
+            return
+        if last or self.loads[model]["was_resident"]:
+            await self.client.load(model, self.idle_keep_alive)
+        else:
+            await self.client.unload(model)
@@ -0,0 +1,290 @@
+# 檔案路徑: scripts/ollama_client.py
+# Ollama HTTP API 的精簡 asyncio client (只用標準函式庫)：
+#   所有請求共用 keep-alive HTTP/1.1 連線池，以 semaphore 限制同時進行的請求數；
+#   連線錯誤、逾時與 429/5xx 以指數退避 (含 jitter) 重試。
+#
+#   async with OllamaClient(concurrency=4) as client:
+#       result = await client.generate("verilog-llama3-q3", "Write a 2-to-1 mux")
+#       print(result["response"])
+import asyncio
+import json
+import os
+import random
+import ssl
+from contextlib import aclosing
+from urllib.parse import urlsplit
+
+DEFAULT_HOST = "http://127.0.0.1:11434"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 連線中斷、讀到一半斷線與逾時；在回應開始之前發生時可重試
+RETRY_ERRORS = (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+class OllamaError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+def resolve_host(host=None):
+    # 依序取明確指定的 host、$OLLAMA_HOST 或預設值，回傳 (scheme, hostname, port)
+    host = host or os.environ.get("OLLAMA_HOST") or DEFAULT_HOST
+    if "://" not in host:
+        host = "http://" + host
+    parts = urlsplit(host)
+    hostname = parts.hostname or "127.0.0.1"
+    # OLLAMA_HOST=0.0.0.0 是伺服器的綁定位址，client 改連本機
+    if hostname == "0.0.0.0":
+        hostname = "127.0.0.1"
+    return parts.scheme, hostname, parts.port or (443 if parts.scheme == "https" else 11434)
+
+async def _read_head(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("connection closed by server")
+    _, status, _ = status_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return int(status), headers
+
+async def _iter_body(reader, headers):
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            line = await reader.readline()
+            if not line:
+                # 連線在 chunk 之間被關閉
+                raise asyncio.IncompleteReadError(b"", None)
+            size = int(line.split(b";")[0], 16)
+            if size == 0:
+                while await reader.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                return
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield data
+    elif "content-length" in headers:
+        length = int(headers["content-length"])
+        if length:
+            yield await reader.readexactly(length)
+    else:
+        # 沒有 framing：body 一直到伺服器關閉連線為止
+        while data := await reader.read(65536):
+            yield data
+
+def _keeps_alive(headers):
+    framed = "content-length" in headers or headers.get("transfer-encoding", "").lower() == "chunked"
+    return framed and headers.get("connection", "").lower() != "close"
+
+def _model_names(model):
+    # 沒有 tag 的模型在 Ollama 中會顯示為 NAME:latest
+    return {model, model if ":" in model else model + ":latest"}
+
+def _parse_stream_line(line):
+    try:
+        obj = json.loads(line)
+    except ValueError as e:
+        raise OllamaError(f"invalid stream line {line[:80]!r}: {e}") from e
+    if "error" in obj:
+        raise OllamaError(obj["error"])
+    return obj
+
+class _Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @property
+    def closed(self):
+        return self.writer.is_closing() or self.reader.at_eof()
+
+    async def send(self, method, path, host, body):
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+class OllamaClient:
+    def __init__(self, host=None, concurrency=4, retries=3, backoff=0.5, timeout=600.0, connect_timeout=10.0):
+        self.scheme, self.host, self.port = resolve_host(host)
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._idle = []
+        # 統計連線重用與重試次數，供報告使用
+        self.connections_opened = 0
+        self.requests = 0
+        self.retries_used = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+    async def _acquire(self):
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.closed:
+                return conn
+            conn.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port,
+                                    ssl=ssl.create_default_context() if self.scheme == "https" else None),
+            self.connect_timeout,
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def _release(self, conn, reusable):
+        if reusable and len(self._idle) < self.concurrency:
+            self._idle.append(conn)
+        else:
+            conn.close()
+
+    async def _open(self, method, path, body):
+        # 送出請求並讀取回應 header；錯誤回應 raise OllamaError
+        conn = await self._acquire()
+        try:
+            await conn.send(method, path, f"{self.host}:{self.port}", body)
+            status, headers = await _read_head(conn.reader)
+            if status < 400:
+                return conn, headers
+            data = b"".join([chunk async for chunk in _iter_body(conn.reader, headers)])
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn, _keeps_alive(headers))
+        try:
+            message = json.loads(data).get("error", data.decode(errors="replace"))
+        except ValueError:
+            message = data.decode(errors="replace")
+        raise OllamaError(f"{method} {path} returned {status}: {message}", status)
+
+    async def _body(self, conn, headers):
+        # 逐段產生 body，完整讀完後才把連線還回連線池
+        # 回應開始後的斷線、逾時或格式錯誤一律轉為 OllamaError，呼叫端只需處理這一種例外
+        reusable = False
+        chunks = _iter_body(conn.reader, headers)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), self.timeout)
+                except StopAsyncIteration:
+                    break
+                except (*RETRY_ERRORS, ValueError) as e:
+                    raise OllamaError(f"response interrupted: {e!r}") from e
+                yield chunk
+            reusable = _keeps_alive(headers)
+        finally:
+            # 中途放棄讀取會關閉連線，伺服器也會因此停止生成
+            self._release(conn, reusable)
+
+    async def _fetch(self, method, path, body):
+        conn, headers = await self._open(method, path, body)
+        async with aclosing(self._body(conn, headers)) as chunks:
+            return b"".join([chunk async for chunk in chunks])
+
+    async def _backoff(self, attempt):
+        self.retries_used += 1
+        await asyncio.sleep(self.backoff * 2**attempt * random.uniform(0.5, 1.0))
+
+    async def _retrying(self, method, path, attempt_fn):
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(attempt_fn(), self.timeout)
+            except OllamaError as e:
+                # 非串流請求的 body 讀到一半斷線，整個請求重送即可
+                retryable = e.status in RETRY_STATUSES or isinstance(e.__cause__, RETRY_ERRORS)
+                if not retryable or attempt == self.retries:
+                    raise
+            except RETRY_ERRORS as e:
+                if attempt == self.retries:
+                    raise OllamaError(f"{method} {path} failed after {attempt + 1} attempts: {e!r}") from e
+            await self._backoff(attempt)
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        async with self._semaphore:
+            self.requests += 1
+            data = await self._retrying(method, path, lambda: self._fetch(method, path, body))
+        return json.loads(data) if data else {}
+
+    async def stream(self, method, path, payload):
+        # 逐筆產生收到的 NDJSON 物件；只有在回應開始之前才會重試。
+        # 提前停止時請搭配 contextlib.aclosing()，讓連線立即關閉而不是等到 garbage collection
+        body = json.dumps(payload).encode()
+        async with self._semaphore:
+            self.requests += 1
+            conn, headers = await self._retrying(method, path, lambda: self._open(method, path, body))
+            buffer = b""
+            async with aclosing(self._body(conn, headers)) as chunks:
+                async for chunk in chunks:
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    for line in lines:
+                        if line.strip():
+                            yield _parse_stream_line(line)
+            if buffer.strip():
+                yield _parse_stream_line(buffer)
+
+    @staticmethod
+    def _generate_payload(model, prompt, stream, options, keep_alive, extra):
+        payload = {"model": model, "prompt": prompt, "stream": stream, **extra}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        return payload
+
+    async def generate(self, model, prompt, options=None, keep_alive=None, **extra):
+        # 非串流的 /api/generate，回傳最終的回應物件
+        payload = self._generate_payload(model, prompt, False, options, keep_alive, extra)
+        return await self.request("POST", "/api/generate", payload)
+
+    def generate_stream(self, model, prompt, options=None, keep_alive=None, **extra):
+        # 串流的 /api/generate：回應 chunk 的 async iterator，最後一筆 done=True
+        payload = self._generate_payload(model, prompt, True, options, keep_alive, extra)
+        return self.stream("POST", "/api/generate", payload)
+
+    async def tags(self):
+        return (await self.request("GET", "/api/tags"))["models"]
+
+    async def model_info(self, model):
+        # 本地模型在 /api/tags 中的項目 (digest、size 與 quantization_level 等 details)
+        names = _model_names(model)
+        for info in await self.tags():
+            if info.get("name") in names or info.get("model") in names:
+                return info
+        raise OllamaError(f"model '{model}' not found", 404)
+
+    async def model_digest(self, model):
+        # 本地模型 manifest 的 digest (權重、template 或 system prompt 改變時都會變)
+        return (await self.model_info(model))["digest"]
+
+    async def running(self):
+        # 伺服器目前載入在記憶體中的模型 (/api/ps)，含 expires_at 與 size_vram
+        return (await self.request("GET", "/api/ps"))["models"]
+
+    async def is_loaded(self, model):
+        names = _model_names(model)
+        return any(info.get("name") in names or info.get("model") in names for info in await self.running())
+
+    async def load(self, model, keep_alive=None):
+        # 以空 prompt 只載入模型而不生成，並保留 keep_alive 的時間
+        return await self.generate(model, "", keep_alive=keep_alive)
+
+    async def unload(self, model):
+        return await self.generate(model, "", keep_alive=0)
@@ -0,0 +1,430 @@
+# 檔案路徑: scripts/pack_tokens.py
+# 離線 tokenization + sequence packing：
+#   只 tokenize 一次，將樣本打包成固定長度 (max_seq_length) 的 block，
+#   以 memory-mapped 的扁平 token 陣列 + offsets 索引存放，訓練時直接讀取。
+#
+# 輸出目錄內容:
+#   tokens.bin   所有樣本的 token，依 block 順序連續存放 (uint16 或 uint32)
+#   offsets.npy  每個樣本在 tokens.bin 中的起點 (int64，長度 = 樣本數 + 1)
+#   blocks.npy   每個 block 在 offsets 中涵蓋的樣本範圍 (int64，長度 = block 數 + 1)
+#   meta.json    dtype、max_seq_length、來源 manifest、超長樣本處理與 padding 統計
+#
+# 樣本長度 (np.diff(offsets)) 即為長度索引，可直接用於依長度分組的 batch sampler。
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter
+
+import numpy as np
+import torch
+
+DATA_DIR = "./data/processed"
+PACKED_DIR = "./data/packed"
+TOKENIZER_NAME = "unsloth/llama-3-8b-bnb-4bit"
+MAX_SEQ_LENGTH = 2048
+NUM_PROC = os.cpu_count() or 1
+SEED = 3407
+
+# 超長樣本 (> max_seq_length) 的處理方式
+#   truncate: 直接截斷 (舊行為)
+#   drop:     丟棄整筆樣本
+#   module:   截斷在最後一個放得下的 endmodule 之後；找不到時退回直接截斷
+#   split:    切成多段 max_seq_length 長度的樣本
+OVERLONG_POLICIES = ("truncate", "drop", "module", "split")
+OVERLONG_POLICY = "module"
+_ENDMODULE_RE = re.compile(r"\bendmodule\b")
+
+# --- 1. Best-fit decreasing 打包 ---
+class _SpaceIndex:
+    # 以剩餘空間為索引的 Fenwick tree，O(log L) 找到「剩餘空間 >= n」中最小的 block
+    def __init__(self, capacity):
+        self.size = capacity + 1
+        self.tree = [0] * (self.size + 1)
+        self.bins = [[] for _ in range(self.size)]
+        self.count = 0
+
+    def _add(self, space, delta):
+        i = space + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+        self.count += delta
+
+    def _prefix(self, space):
+        i, total = space + 1, 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def push(self, space, bin_id):
+        self.bins[space].append(bin_id)
+        self._add(space, 1)
+
+    def pop_fit(self, need):
+        rank = self._prefix(need - 1) + 1
+        if rank > self.count:
+            return None
+        pos, step = 0, 1 << self.size.bit_length()
+        while step:
+            if pos + step <= self.size and self.tree[pos + step] < rank:
+                pos += step
+                rank -= self.tree[pos]
+            step >>= 1
+        bin_id = self.bins[pos].pop()
+        self._add(pos, -1)
+        return pos, bin_id
+
+def pack_lengths(lengths, capacity):
+    index = _SpaceIndex(capacity)
+    bins = []
+    for idx in np.argsort(-np.asarray(lengths), kind="stable"):
+        n = int(lengths[idx])
+        fit = index.pop_fit(n)
+        if fit is None:
+            bins.append([int(idx)])
+            bin_id, space = len(bins) - 1, capacity - n
+        else:
+            space, bin_id = fit
+            bins[bin_id].append(int(idx))
+            space -= n
+        if space > 0:
+            index.push(space, bin_id)
+    return bins
+
+# --- 2. 超長樣本處理 ---
+def _truncate_at_module(tokenizer, text, max_seq_length):
+    enc = tokenizer(text, add_special_tokens=True, return_offsets_mapping=True)
+    token_ends = [end for _, end in enc["offset_mapping"]]
+    keep = 0
+    for match in _ENDMODULE_RE.finditer(text):
+        # 包含此 endmodule 所需的 token 數，另外保留一個位置給 EOS
+        needed = bisect.bisect_left(token_ends, match.end()) + 1
+        if needed > max_seq_length - 1:
+            break
+        keep = needed
+    if not keep:
+        return None
+    return enc["input_ids"][:keep] + [tokenizer.eos_token_id]
+
+def apply_overlong_policy(tokenizer, text, ids, max_seq_length, policy):
+    # 回傳 (處理後的 token 序列列表, 對應的處理方式)
+    if len(ids) <= max_seq_length:
+        return [ids], "fit"
+    if policy == "drop":
+        return [], "drop"
+    if policy == "split":
+        return [ids[i:i + max_seq_length] for i in range(0, len(ids), max_seq_length)], "split"
+    if policy == "module":
+        truncated = _truncate_at_module(tokenizer, text, max_seq_length)
+        if truncated is not None:
+            return [truncated], "module"
+        return [ids[:max_seq_length]], "module_fallback"
+    return [ids[:max_seq_length]], "truncate"
+
+def summarize_overlong(actions, total):
+    counts = Counter(actions)
+    summary = {
+        "total": total,
+        "overlong": total - counts["fit"],
+        "truncate": counts["truncate"],
+        "module": counts["module"],
+        "module_fallback": counts["module_fallback"],
+        "split_samples": counts["split_first"],
+        "split_chunks": counts["split_first"] + counts["split"],
+    }
+    # drop 不會留下任何列，只能由總數回推
+    summary["drop"] = summary["overlong"] - summary["truncate"] - summary["module"] \
+        - summary["module_fallback"] - summary["split_samples"]
+    return summary
+
+# --- 3. 建立 packed 資料集 (參數未變時直接沿用) ---
+def _manifest_digest(data_dir):
+    with open(os.path.join(data_dir, "manifest.json"), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _build_params(data_dir, tokenizer, max_seq_length, overlong_policy):
+    return {
+        "source_manifest": _manifest_digest(data_dir),
+        "tokenizer": tokenizer.name_or_path,
+        "vocab_size": len(tokenizer),
+        "max_seq_length": max_seq_length,
+        "overlong_policy": overlong_policy,
+    }
+
+def load_meta(packed_dir):
+    path = os.path.join(packed_dir, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def build_packed_dataset(tokenizer, data_dir=DATA_DIR, packed_dir=PACKED_DIR,
+                         max_seq_length=MAX_SEQ_LENGTH, overlong_policy=OVERLONG_POLICY,
+                         num_proc=NUM_PROC, force=False):
+    from datasets import load_dataset
+
+    if overlong_policy not in OVERLONG_POLICIES:
+        raise ValueError(f"overlong_policy 必須是 {OVERLONG_POLICIES} 之一，收到 {overlong_policy!r}")
+    params = _build_params(data_dir, tokenizer, max_seq_length, overlong_policy)
+    meta = load_meta(packed_dir)
+    if not force and meta and meta["params"] == params:
+        print(f"⏩ Packed 資料已是最新 ({packed_dir})，略過 tokenization")
+        print_overlong_summary(meta["stats"]["overlong"], overlong_policy)
+        return meta
+
+    start = time.perf_counter()
+    with open(os.path.join(data_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    data_files = [os.path.join(data_dir, shard["file"]) for shard in manifest["shards"]]
+    ds = load_dataset("parquet", data_files=data_files, split="train")
+
+    print(f"🔤 正在 tokenize {len(ds)} 筆資料 (num_proc={num_proc}, overlong_policy={overlong_policy})...")
+    def tokenize(batch):
+        out_ids, actions = [], []
+        for text, ids in zip(batch["text"], tokenizer(batch["text"], add_special_tokens=True)["input_ids"]):
+            pieces, action = apply_overlong_policy(tokenizer, text, ids, max_seq_length, overlong_policy)
+            out_ids.extend(pieces)
+            # 只在第一段標記 split_first，用來統計被切開的樣本數
+            actions.extend(["split_first" if action == "split" and i == 0 else action for i in range(len(pieces))])
+        return {"input_ids": out_ids, "length": [len(x) for x in out_ids], "action": actions}
+    total = len(ds)
+    ds = ds.map(tokenize, batched=True, num_proc=num_proc, remove_columns=ds.column_names)
+    overlong = summarize_overlong(ds["action"] if len(ds) else [], total)
+    print_overlong_summary(overlong, overlong_policy)
+    if not len(ds):
+        raise ValueError(f"overlong_policy={overlong_policy} 之後沒有剩下任何樣本")
+
+    lengths = np.asarray(ds["length"], dtype=np.int64)
+    print(f"📦 正在打包成 {max_seq_length}-token blocks...")
+    bins = pack_lengths(lengths, max_seq_length)
+    # block 內依長度排序，block 之間則打亂，避免訓練順序與長度相關
+    np.random.RandomState(SEED).shuffle(bins)
+    order = np.fromiter((i for b in bins for i in b), dtype=np.int64, count=len(lengths))
+
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.uint32
+    os.makedirs(packed_dir, exist_ok=True)
+    tmp_tokens = os.path.join(packed_dir, "tokens.bin.tmp")
+    with open(tmp_tokens, "wb") as f:
+        for batch in ds.select(order).iter(batch_size=10_000):
+            f.write(np.concatenate([np.asarray(x, dtype=dtype) for x in batch["input_ids"]]).tobytes())
+
+    offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(lengths[order], out=offsets[1:])
+    blocks = np.zeros(len(bins) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in bins], out=blocks[1:])
+
+    real_tokens = int(lengths.sum())
+    stats = {
+        "overlong": overlong,
+        "num_samples": len(lengths),
+        "num_blocks": len(bins),
+        "real_tokens": real_tokens,
+        # 打包前：每筆樣本各自 pad 到 max_seq_length
+        "padding_ratio_unpacked": 1 - real_tokens / (len(lengths) * max_seq_length),
+        "padding_ratio_packed": 1 - real_tokens / (len(bins) * max_seq_length),
+    }
+    np.save(os.path.join(packed_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(packed_dir, "blocks.npy"), blocks)
+    os.replace(tmp_tokens, os.path.join(packed_dir, "tokens.bin"))
+    meta = {"params": params, "dtype": np.dtype(dtype).name, "stats": stats}
+    # meta.json 最後寫入，作為整個輸出完成的標記
+    with open(os.path.join(packed_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"   ✅ {stats['num_samples']} 筆 -> {stats['num_blocks']} blocks ({time.perf_counter() - start:.1f}s)")
+    print(f"   📉 Padding 比例: {stats['padding_ratio_unpacked']:.1%} (未打包) -> {stats['padding_ratio_packed']:.1%} (打包後)")
+    return meta
+
+def print_overlong_summary(summary, policy):
+    print(f"   ✂️  超長樣本: {summary['overlong']}/{summary['total']} (policy={policy})")
+    for key in ("truncate", "module", "module_fallback", "drop"):
+        if summary[key]:
+            print(f"      {key}: {summary[key]}")
+    if summary["split_samples"]:
+        print(f"      split: {summary['split_samples']} 筆 -> {summary['split_chunks']} 段")
+
+# --- 4. 訓練端：直接讀取 memory-mapped token 陣列 ---
+class _TokenStore(torch.utils.data.Dataset):
+    def __init__(self, packed_dir=PACKED_DIR):
+        meta = load_meta(packed_dir)
+        if meta is None:
+            raise FileNotFoundError(f"{packed_dir}/meta.json 不存在，請先執行 scripts/pack_tokens.py")
+        self.max_seq_length = meta["params"]["max_seq_length"]
+        self.tokens = np.memmap(os.path.join(packed_dir, "tokens.bin"), dtype=meta["dtype"], mode="r")
+        self.offsets = np.load(os.path.join(packed_dir, "offsets.npy"), mmap_mode="r")
+        self.blocks = np.load(os.path.join(packed_dir, "blocks.npy"), mmap_mode="r")
+
+    def sample_lengths(self):
+        return np.diff(self.offsets)
+
+class PackedTokenDataset(_TokenStore):
+    # 每個項目是一個打包好的 block
+    def __len__(self):
+        return len(self.blocks) - 1
+
+    def __getitem__(self, i):
+        starts = np.asarray(self.offsets[self.blocks[i]:self.blocks[i + 1] + 1])
+        input_ids = torch.from_numpy(self.tokens[starts[0]:starts[-1]].astype(np.int64))
+        lengths = np.diff(starts)
+        # 每個樣本的 position_ids 從 0 重新開始；flash-attention varlen 由此切段，其他實作則由 collator 產生 block mask
+        position_ids = torch.from_numpy(np.arange(len(input_ids)) - np.repeat(starts[:-1] - starts[0], lengths))
+        labels = input_ids.clone()
+        # 不要用前一個樣本的內容去預測下一個樣本的第一個 token
+        labels[torch.from_numpy(starts[1:-1] - starts[0])] = -100
+        return {"input_ids": input_ids, "position_ids": position_ids, "labels": labels}
+
+def block_attention_mask(position_ids, dtype=torch.bool):
+    # (batch, 1, L, L) 的 block-diagonal causal mask：每個 token 只看同一樣本 (position_ids 歸 0 處分段) 內之前的 token
+    # bool 給 SDPA 使用 (True = 可見)；浮點 dtype 則是 eager attention 的加法 mask (不可見處為最小值)
+    segments = torch.cumsum(position_ids == 0, dim=1)
+    causal = torch.ones(position_ids.shape[1], position_ids.shape[1], dtype=torch.bool).tril()
+    allowed = (segments[:, :, None] == segments[:, None, :]) & causal
+    if dtype == torch.bool:
+        return allowed[:, None]
+    return torch.zeros(allowed.shape, dtype=dtype).masked_fill(~allowed, torch.finfo(dtype).min)[:, None]
+
+def packed_mask_dtype(model):
+    # flash-attention 2 會依 position_ids 走 varlen，不需要 mask (None)；其餘實作都要明確的 block mask
+    implementation = getattr(model.config, "_attn_implementation", None) or "eager"
+    if "flash_attention" in implementation:
+        return None
+    return torch.bool if implementation == "sdpa" else model.dtype
+
+class PackedCollator:
+    # 將每個 block pad 到 max_seq_length；padding 自成一段 (position_ids 由 0 起算) 且不計 loss
+    # mask_dtype 不為 None 時另外附上 block-diagonal attention_mask，避免樣本看到同一 block 中前面無關的樣本
+    def __init__(self, pad_token_id, max_seq_length, mask_dtype=None):
+        self.pad_token_id = pad_token_id
+        self.max_seq_length = max_seq_length
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features):
+        batch = {
+            "input_ids": torch.full((len(features), self.max_seq_length), self.pad_token_id, dtype=torch.long),
+            "position_ids": torch.arange(self.max_seq_length).repeat(len(features), 1),
+            "labels": torch.full((len(features), self.max_seq_length), -100, dtype=torch.long),
+        }
+        for row, feature in enumerate(features):
+            n = len(feature["input_ids"])
+            for key in batch:
+                batch[key][row, :n] = feature[key]
+            batch["position_ids"][row, n:] -= n
+        if self.mask_dtype is not None:
+            batch["attention_mask"] = block_attention_mask(batch["position_ids"], self.mask_dtype)
+        return batch
+
+def verify_packed_isolation(model, collator, lengths=(12, 8), tolerance=0.1):
+    # 啟動時實測：打包在後面的樣本，其 log-prob 必須與單獨計算時一致，否則 attention 跨樣本洩漏 → 直接中止
+    generator = torch.Generator().manual_seed(SEED)
+    vocab_size = model.config.vocab_size
+    samples = [torch.randint(1, vocab_size, (n,), generator=generator) for n in lengths]
+    input_ids = torch.cat(samples)
+    position_ids = torch.cat([torch.arange(n) for n in lengths])
+    batch = collator([{"input_ids": input_ids, "position_ids": position_ids, "labels": input_ids.clone()}])
+    device = next(model.parameters()).device
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.no_grad():
+            packed = model(**{k: v.to(device) for k, v in batch.items() if k != "labels"}).logits[0]
+            alone = model(input_ids=samples[-1][None].to(device),
+                          position_ids=torch.arange(lengths[-1])[None].to(device)).logits[0]
+    finally:
+        model.train(was_training)
+    start = sum(lengths[:-1])
+    diff = (packed[start:start + lengths[-1]].float().log_softmax(-1) - alone.float().log_softmax(-1)).abs().max().item()
+    if diff > tolerance:
+        raise RuntimeError(
+            f"打包的樣本互相 attend (log-prob 差異 {diff:.3f} > {tolerance})：目前的 attention 實作沒有依 "
+            f"position_ids / attention_mask 隔離樣本，請改用 flash-attention 2 或 data_format = \"bucketed\"")
+    return diff
+
+class TokenSampleDataset(_TokenStore):
+    # 每個項目是一筆未打包的樣本，搭配 LengthGroupedBatchSampler 與 PaddingCollator 使用
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        input_ids = torch.from_numpy(self.tokens[self.offsets[i]:self.offsets[i + 1]].astype(np.int64))
+        return {"input_ids": input_ids, "labels": input_ids.clone()}
+
+class PaddingCollator:
+    # 只 pad 到該 batch 內最長的樣本
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        width = max(len(f["input_ids"]) for f in features)
+        batch = {
+            "input_ids": torch.full((len(features), width), self.pad_token_id, dtype=torch.long),
+            "attention_mask": torch.zeros((len(features), width), dtype=torch.long),
+            "labels": torch.full((len(features), width), -100, dtype=torch.long),
+        }
+        for row, feature in enumerate(features):
+            n = len(feature["input_ids"])
+            batch["input_ids"][row, :n] = feature["input_ids"]
+            batch["attention_mask"][row, :n] = 1
+            batch["labels"][row, :n] = feature["labels"]
+        return batch
+
+class LengthGroupedBatchSampler(torch.utils.data.Sampler):
+    # 依長度分 bucket，batch 只從同一個 bucket 取樣；bucket 內與 batch 之間的順序每個 epoch 重新打亂
+    def __init__(self, lengths, batch_size, boundaries, seed=SEED, drop_last=False):
+        self.batch_size = batch_size
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+        self.boundaries = sorted(boundaries)
+        bucket_ids = np.searchsorted(self.boundaries, np.asarray(lengths), side="left")
+        self.buckets = [np.flatnonzero(bucket_ids == b) for b in range(len(self.boundaries) + 1)]
+
+        lower = 0
+        print(f"🪣 Length buckets (batch_size={batch_size}):")
+        for upper, members in zip(self.boundaries + [None], self.buckets):
+            if len(members):
+                label = f"{lower + 1}-{upper}" if upper is not None else f">{lower}"
+                print(f"   {label:>12} tokens: {len(members)} 筆, {self._num_batches(len(members))} batches")
+            lower = upper
+
+    def _num_batches(self, n):
+        return n // self.batch_size if self.drop_last else -(-n // self.batch_size)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return sum(self._num_batches(len(b)) for b in self.buckets)
+
+    def __iter__(self):
+        rng = np.random.RandomState(self.seed + self.epoch)
+        batches = []
+        for members in self.buckets:
+            members = rng.permutation(members)
+            for i in range(0, self._num_batches(len(members)) * self.batch_size, self.batch_size):
+                batches.append(members[i:i + self.batch_size].tolist())
+        for i in rng.permutation(len(batches)):
+            yield batches[i]
+
+def main():
+    from transformers import AutoTokenizer
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--packed-dir", default=PACKED_DIR)
+    parser.add_argument("--tokenizer", default=TOKENIZER_NAME)
+    parser.add_argument("--max-seq-length", type=int, default=MAX_SEQ_LENGTH)
+    parser.add_argument("--overlong-policy", choices=OVERLONG_POLICIES, default=OVERLONG_POLICY)
+    parser.add_argument("--force", action="store_true", help="忽略既有輸出，重新 tokenize")
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    build_packed_dataset(tokenizer, args.data_dir, args.packed_dir, args.max_seq_length,
+                         overlong_policy=args.overlong_policy, force=args.force)
+
+if __name__ == "__main__":
+    main()
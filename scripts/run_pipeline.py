@@ -0,0 +1,165 @@
+# 檔案路徑: scripts/run_pipeline.py
+# 單一入口執行 1 ~ 5 階段，只重跑 fingerprint 有變動的階段。
+#
+# 每個階段的 fingerprint = 腳本與其輔助模組的內容 + 參數 + 所有輸入檔案的內容雜湊。
+# 執行成功後，fingerprint 與輸出檔案的雜湊會記錄在 .pipeline/state.json (artifact store)；
+# 下次執行時若 fingerprint 相同且輸出未被改動，就直接略過。
+# 上游的輸出就是下游的輸入，因此上游重跑並產生不同結果時，下游會自動失效。
+#
+# 用法:
+#   python scripts/run_pipeline.py                  # 執行所有過期的階段
+#   python scripts/run_pipeline.py --dry-run        # 只列出各階段狀態
+#   python scripts/run_pipeline.py --only convert   # 只檢查 / 執行指定階段
+#   python scripts/run_pipeline.py --force profile process  # 強制重跑 (例如遠端資料集已更新)
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+from fingerprint import STORE_DIR, HashCache, combine, path_digest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join(STORE_DIR, "state.json")
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    deps: list = field(default_factory=list)      # 腳本會 import 的輔助模組
+    inputs: list = field(default_factory=list)    # 本地輸入檔案 / 目錄
+    outputs: list = field(default_factory=list)   # 產出檔案 / 目錄
+    args: list = field(default_factory=list)
+    params: dict = field(default_factory=dict)    # 不在輸入檔案中、但會影響結果的設定
+
+DATASETS = ["bnadimi/PyraNet-Verilog", "sonyashijin/RTL_verilog_synthetic_Claude_3.7_verified_to_compile"]
+
+STAGES = [
+    Stage(
+        "profile", "1_inspect_data.py",
+        # 載入 2_process_data.py 中的 Alpaca 模板計算 token 長度
+        deps=["2_process_data.py"],
+        outputs=["data/profile_report.json"],
+        params={"datasets": DATASETS, "tokenizer": "unsloth/llama-3-8b-bnb-4bit"},
+    ),
+    Stage(
+        "process", "2_process_data.py",
+        deps=["verilog_dedup.py"],
+        inputs=["data/profile_report.json"],
+        outputs=["data/processed/manifest.json", "data/dedup_report.json"],
+        # 遠端資料集無法計算內容雜湊，以名稱作為參數；資料集更新時請使用 --force profile process
+        params={"datasets": DATASETS},
+    ),
+    Stage(
+        "train", "3_train_from_local.py",
+        deps=["pack_tokens.py", "train_metrics.py", "train_resume.py"],
+        inputs=["data/processed"],
+        outputs=["outputs/final_adapter"],
+    ),
+    Stage(
+        "convert", "4_bulk_convert_gguf.py",
+        deps=["fingerprint.py", "lora_merge.py", "gguf_inspect.py"],
+        inputs=["outputs/final_adapter"],
+        outputs=["gguf_models"],
+    ),
+    Stage(
+        "benchmark", "5_benchmark.py",
+        deps=["ollama_client.py", "verilog_extract.py", "verilog_check.py", "generation_cache.py", "fingerprint.py",
+              "benchmark_suite.py", "benchmark_history.py", "model_residency.py"],
+        inputs=["gguf_models", "Modelfile", "benchmarks/verilog_suite.jsonl"],
+        outputs=["benchmark_results/summary.json"],
+    ),
+]
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(state):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+def stage_fingerprint(stage, cache):
+    code = {name: path_digest(os.path.join(SCRIPTS_DIR, name), cache) for name in [stage.script] + stage.deps}
+    inputs = {path: path_digest(path, cache) for path in stage.inputs}
+    return combine({"code": code, "inputs": inputs, "args": stage.args, "params": stage.params}), inputs
+
+def output_digests(stage, cache):
+    return {path: path_digest(path, cache) for path in stage.outputs}
+
+def check_stage(stage, state, cache):
+    """回傳 (是否為最新, 原因, fingerprint)"""
+    fingerprint, inputs = stage_fingerprint(stage, cache)
+    missing = [path for path, digest in inputs.items() if digest is None]
+    if missing:
+        return False, f"missing input {', '.join(missing)}", fingerprint
+    record = state.get(stage.name)
+    if record is None:
+        return False, "never run", fingerprint
+    if record["fingerprint"] != fingerprint:
+        return False, "fingerprint changed", fingerprint
+    if record["outputs"] != output_digests(stage, cache):
+        return False, "outputs changed or missing", fingerprint
+    return True, "up to date", fingerprint
+
+def main():
+    parser = argparse.ArgumentParser()
+    names = [stage.name for stage in STAGES]
+    parser.add_argument("--only", nargs="+", choices=names, help="只處理指定階段")
+    parser.add_argument("--force", nargs="+", choices=names, default=[], help="強制重跑指定階段")
+    parser.add_argument("--dry-run", action="store_true", help="只列出各階段狀態，不執行")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cache = HashCache()
+    state = load_state()
+    upstream_stale = False
+
+    for stage in STAGES:
+        if args.only and stage.name not in args.only:
+            continue
+        up_to_date, reason, fingerprint = check_stage(stage, state, cache)
+        if stage.name in args.force:
+            up_to_date, reason = False, "forced"
+        elif up_to_date and upstream_stale and args.dry_run:
+            # dry-run 不會真的重跑上游，無法得知上游輸出是否改變
+            up_to_date, reason = False, "upstream stale"
+
+        if up_to_date:
+            print(f"⏩ [{stage.name}] {reason}")
+            continue
+        upstream_stale = True
+        if args.dry_run:
+            print(f"🔄 [{stage.name}] would run ({reason})")
+            continue
+
+        print(f"🚀 [{stage.name}] running {stage.script} ({reason})")
+        stage_start = time.perf_counter()
+        cmd = [sys.executable, os.path.join(SCRIPTS_DIR, stage.script), *stage.args]
+        result = subprocess.run(cmd)
+        if result.returncode != 0:
+            cache.save()
+            print(f"❌ [{stage.name}] failed with exit code {result.returncode}")
+            sys.exit(result.returncode)
+
+        state[stage.name] = {
+            "fingerprint": fingerprint,
+            "outputs": output_digests(stage, cache),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "duration": time.perf_counter() - stage_start,
+        }
+        save_state(state)
+        print(f"✅ [{stage.name}] done in {state[stage.name]['duration']:.1f}s")
+
+    cache.save()
+    print(f"🏁 Pipeline finished in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
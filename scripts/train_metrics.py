@@ -0,0 +1,156 @@
+# 檔案路徑: scripts/train_metrics.py
+# 訓練吞吐量量測：每個 optimizer step 寫一筆 JSONL，訓練結束時輸出摘要
+#   - tokens/s (區分真實 token 與 padding)
+#   - 資料讀取時間 vs forward/backward 時間 vs optimizer 時間
+#   - 峰值記憶體 (有 CUDA 時用 max_memory_allocated，否則用行程 RSS)
+# 不依賴 unsloth，可在 CPU 上搭配小模型與一般的 transformers Trainer 執行。
+import json
+import os
+import resource
+import sys
+import time
+
+import torch
+from transformers import TrainerCallback
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo, hi = int(pos), min(int(pos) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+class ThroughputCallback(TrainerCallback):
+    def __init__(self, log_path="outputs/throughput.jsonl", summary_path=None, pad_token_id=None):
+        self.log_path = log_path
+        self.summary_path = summary_path or os.path.splitext(log_path)[0] + "_summary.json"
+        self.pad_token_id = pad_token_id
+        self.records = []
+        self._log_file = None
+        self._reset_step()
+
+    def _reset_step(self):
+        self._real_tokens = 0
+        self._total_tokens = 0
+        self._fwd_bwd_time = 0.0
+
+    # --- 將 token 計數與 forward/backward 計時掛到 trainer.training_step ---
+    def attach(self, trainer):
+        if self.pad_token_id is None:
+            tokenizer = getattr(trainer, "processing_class", None) or getattr(trainer, "tokenizer", None)
+            self.pad_token_id = getattr(tokenizer, "pad_token_id", None)
+        training_step = trainer.training_step
+
+        def timed_training_step(model, inputs, *args, **kwargs):
+            self.count_tokens(inputs)
+            start = time.perf_counter()
+            loss = training_step(model, inputs, *args, **kwargs)
+            # CUDA kernel 是非同步的，需同步後計時才準確
+            if torch.cuda.is_available():
+                torch.cuda.synchronize()
+            self._fwd_bwd_time += time.perf_counter() - start
+            return loss
+
+        trainer.training_step = timed_training_step
+        trainer.add_callback(self)
+        return self
+
+    def count_tokens(self, inputs):
+        input_ids = inputs["input_ids"]
+        self._total_tokens += input_ids.numel()
+        # packed 模式的 attention_mask 是 4 維的 block mask，無法用來計數
+        if inputs.get("attention_mask") is not None and inputs["attention_mask"].dim() == 2:
+            self._real_tokens += int(inputs["attention_mask"].sum())
+        elif self.pad_token_id is not None:
+            self._real_tokens += int((input_ids != self.pad_token_id).sum())
+        else:
+            self._real_tokens += input_ids.numel()
+
+    def _peak_memory(self):
+        if torch.cuda.is_available():
+            return torch.cuda.max_memory_allocated() / 1024**2, "cuda"
+        # ru_maxrss 在 Linux 是 KB，在 macOS 是 bytes
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024**2 if sys.platform == "darwin" else 1024), "rss"
+
+    # --- Trainer callbacks ---
+    def on_train_begin(self, args, state, control, **kwargs):
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        self._log_file = open(self.log_path, "a")
+        self._train_start = self._last_mark = time.perf_counter()
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        # Trainer 在 on_step_begin 之前就會取出本步所有 micro-batch，所以這段空檔即為資料讀取時間
+        self._step_begin = time.perf_counter()
+        self._data_time = self._step_begin - self._last_mark
+
+    def on_step_end(self, args, state, control, **kwargs):
+        now = time.perf_counter()
+        step_time = now - self._last_mark
+        peak_mb, memory_source = self._peak_memory()
+        record = {
+            "step": state.global_step,
+            "step_time": step_time,
+            "data_time": self._data_time,
+            "fwd_bwd_time": self._fwd_bwd_time,
+            "optimizer_time": max(now - self._step_begin - self._fwd_bwd_time, 0.0),
+            "real_tokens": self._real_tokens,
+            "padded_tokens": self._total_tokens - self._real_tokens,
+            "tokens_per_s": self._total_tokens / step_time if step_time else 0.0,
+            "real_tokens_per_s": self._real_tokens / step_time if step_time else 0.0,
+            "peak_memory_mb": peak_mb,
+            "memory_source": memory_source,
+        }
+        self.records.append(record)
+        self._log_file.write(json.dumps(record) + "\n")
+        self._log_file.flush()
+        self._reset_step()
+        self._last_mark = now
+
+    def on_log(self, args, state, control, **kwargs):
+        # 記錄 / 存檔發生在兩個 step 之間，不應計入下一步的資料讀取時間
+        self._last_mark = time.perf_counter()
+
+    on_save = on_log
+    on_evaluate = on_log
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
+        summary = self.summarize()
+        with open(self.summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        if not summary["steps"]:
+            return
+        print("📈 Throughput summary:")
+        print(f"   Steps: {summary['steps']} | Wall: {summary['wall_time']:.1f}s")
+        print(f"   Tokens/s: {summary['tokens_per_s']:.0f} (real {summary['real_tokens_per_s']:.0f}, padding {summary['padding_ratio']:.1%})")
+        print(f"   Time split: data {summary['data_fraction']:.1%} | fwd/bwd {summary['fwd_bwd_fraction']:.1%} | optimizer {summary['optimizer_fraction']:.1%}")
+        print(f"   Step time p50/p90: {summary['step_time_p50']:.3f}s / {summary['step_time_p90']:.3f}s")
+        print(f"   Peak memory: {summary['peak_memory_mb']:.0f} MB ({summary['memory_source']})")
+        print(f"   Details: {self.log_path}")
+
+    def summarize(self):
+        records = self.records
+        step_time = sum(r["step_time"] for r in records)
+        real = sum(r["real_tokens"] for r in records)
+        total = real + sum(r["padded_tokens"] for r in records)
+        step_times = [r["step_time"] for r in records]
+        return {
+            "steps": len(records),
+            "wall_time": time.perf_counter() - self._train_start if records else 0.0,
+            "real_tokens": real,
+            "padded_tokens": total - real,
+            "padding_ratio": 1 - real / total if total else 0.0,
+            "tokens_per_s": total / step_time if step_time else 0.0,
+            "real_tokens_per_s": real / step_time if step_time else 0.0,
+            "data_fraction": sum(r["data_time"] for r in records) / step_time if step_time else 0.0,
+            "fwd_bwd_fraction": sum(r["fwd_bwd_time"] for r in records) / step_time if step_time else 0.0,
+            "optimizer_fraction": sum(r["optimizer_time"] for r in records) / step_time if step_time else 0.0,
+            "step_time_p50": _percentile(step_times, 0.5),
+            "step_time_p90": _percentile(step_times, 0.9),
+            "peak_memory_mb": max((r["peak_memory_mb"] for r in records), default=0.0),
+            "memory_source": records[-1]["memory_source"] if records else None,
+        }
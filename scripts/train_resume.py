@@ -0,0 +1,69 @@
+# 檔案路徑: scripts/train_resume.py
+# 可中斷 / 可續訓的訓練輔助工具
+#   - latest_checkpoint: 找出 output_dir 下最新且完整的 checkpoint-* (trainer_state.json 最後才寫入，缺少即代表存到一半被砍)
+#   - PreemptionCallback: 收到 SIGTERM 時只設旗標，於下一個 optimizer step 結束時存 checkpoint 並停止訓練
+# 續訓時由 Trainer 還原 optimizer / scheduler / RNG，並以 skip_first_batches 跳過本 epoch 已訓練的 batch；
+# 資料順序只由 seed + epoch 決定 (LengthGroupedBatchSampler、datasets 的 shuffle)，跳過後即與未中斷時完全相同。
+# 不依賴 unsloth，可在 CPU 上搭配小模型與一般的 transformers Trainer 執行。
+import glob
+import json
+import os
+import re
+import signal
+
+from transformers import TrainerCallback
+
+CHECKPOINT_RE = re.compile(r"checkpoint-(\d+)$")
+# 慣例上被 SIGTERM 結束的行程 exit code 為 128 + 15，排程器可據此判斷要重新排入佇列
+PREEMPTED_EXIT_CODE = 128 + signal.SIGTERM
+
+def latest_checkpoint(output_dir):
+    """回傳最新的完整 checkpoint 目錄，沒有則回傳 None。"""
+    checkpoints = []
+    for path in glob.glob(os.path.join(output_dir, "checkpoint-*")):
+        match = CHECKPOINT_RE.search(path)
+        if match and os.path.isfile(os.path.join(path, "trainer_state.json")):
+            checkpoints.append((int(match.group(1)), path))
+    return max(checkpoints)[1] if checkpoints else None
+
+def checkpoint_step(checkpoint):
+    with open(os.path.join(checkpoint, "trainer_state.json")) as f:
+        return json.load(f)["global_step"]
+
+class PreemptionCallback(TrainerCallback):
+    def __init__(self, signals=(signal.SIGTERM,)):
+        self.signals = signals
+        self.preempted = False
+        # 收到訊號且訓練尚未跑完時為 True；呼叫端據此略過最終存檔並以 PREEMPTED_EXIT_CODE 結束
+        self.interrupted = False
+        self._previous = {}
+
+    # --- signal handler 只設旗標，存檔交給 Trainer 在 step 之間完成，避免存到一半的 optimizer 狀態 ---
+    def install(self):
+        for signum in self.signals:
+            self._previous[signum] = signal.signal(signum, self._handle)
+        return self
+
+    def uninstall(self):
+        for signum, handler in self._previous.items():
+            signal.signal(signum, handler)
+        self._previous = {}
+
+    def _handle(self, signum, frame):
+        print(f"\n⏸️  收到 {signal.Signals(signum).name}，將於本 step 結束後存 checkpoint 並停止 (再送一次則立即結束)")
+        self.preempted = True
+        # 第二次訊號交還原本的 handler，卡住時仍可直接砍掉
+        signal.signal(signum, self._previous.get(signum, signal.SIG_DFL))
+
+    # --- Trainer callbacks ---
+    def on_step_end(self, args, state, control, **kwargs):
+        if self.preempted and state.global_step < state.max_steps:
+            self.interrupted = True
+            control.should_save = True
+            control.should_training_stop = True
+        return control
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.uninstall()
+        if self.interrupted:
+            print(f"💾 已存 checkpoint (step {state.global_step})，重新執行即會從此處續訓")
@@ -0,0 +1,393 @@
+# 檔案路徑: scripts/verilog_check.py
+# 快速的 Verilog 結構檢查：純 Python 的 lexer 加上輕量的結構檢查。每個檔案回報：
+#   - lexing 問題 (未結束的註解或字串、無法辨識的字元)
+#   - 不成對的 module/endmodule、begin/end、case/endcase、fork/join、function/task、generate 與括號
+#   - 未宣告的預期埠名稱，以及 header 中沒有方向的埠
+#   - 使用了卻從未宣告的識別字 (continuous assign 的左側視為隱式 net，除非設定了 `default_nettype none)
+#   - 被多個 always 區塊或 continuous assignment 驅動的訊號，以及被驅動的 input
+# 作為低成本的前置過濾 (以 process pool 每秒可檢查數千個檔案)，只有通過的候選才交給真正的模擬器 (若有安裝 Icarus Verilog)。
+#
+# 用法: python scripts/verilog_check.py benchmark_results [--ports clk reset] [--module top] [--iverilog]
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+# 空白與註解也各自成為 (略過的) token，因此可以出現在輸入的結尾
+TOKEN_RE = re.compile(r"""
+    (?:
+      (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+    | (?P<bad_comment>/\*)
+    | (?P<directive>`(?:define|undef|include|timescale|default_nettype|ifdef|ifndef|elsif)\b[^\n]*|`\w+)
+    | (?P<string>"(?:\\.|[^"\\\n])*")
+    | (?P<bad_string>")
+    | (?P<number>\d[\d_]*\s*'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+
+                |'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+
+                |'[01xXzZ]
+                |\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)
+    | (?P<ident>[A-Za-z_][\w$]*|\\\S+)
+    | (?P<system>\$[A-Za-z_][\w$]*)
+    | (?P<op><<<|>>>|===|!==|<=|>=|==|!=|&&|\|\||<<|>>|\*\*|->|\+:|-:|~&|~\||~\^|\^~|::|[-+*/%<>=!~&|^?:;,.\#@(){}\[\]])
+    | (?P<error>.)
+    )
+""", re.VERBOSE | re.DOTALL)
+
+KEYWORDS = frozenset("""
+    always and assign automatic begin buf bufif0 bufif1 case casex casez cmos deassign default defparam
+    disable edge else end endcase endfunction endgenerate endmodule endprimitive endspecify endtable
+    endtask event for force forever fork function generate genvar highz0 highz1 if ifnone initial inout
+    input integer join large localparam macromodule medium module nand negedge nmos nor not notif0 notif1
+    or output parameter pmos posedge primitive pull0 pull1 pulldown pullup rcmos real realtime reg
+    release repeat rnmos rpmos rtran rtranif0 rtranif1 scalared signed small specify specparam strong0
+    strong1 supply0 supply1 table task time tran tranif0 tranif1 tri tri0 tri1 triand trior trireg
+    unsigned uwire vectored wait wand weak0 weak1 while wire wor xnor xor
+    always_comb always_ff always_latch bit byte enum int join_any join_none logic longint shortint
+    typedef unique priority
+""".split())
+
+BLOCK_PAIRS = {
+    "module": "endmodule", "macromodule": "endmodule", "primitive": "endprimitive", "begin": "end",
+    "case": "endcase", "casex": "endcase", "casez": "endcase", "fork": "join", "function": "endfunction",
+    "task": "endtask", "generate": "endgenerate", "specify": "endspecify", "table": "endtable",
+    "(": ")", "[": "]", "{": "}",
+}
+CLOSERS = set(BLOCK_PAIRS.values()) | {"join_any", "join_none"}
+BRACKETS = {"(", "[", "{"}
+DIRECTIONS = {"input", "output", "inout"}
+DECL_KEYWORDS = DIRECTIONS | {
+    "wire", "reg", "logic", "integer", "real", "realtime", "time", "genvar", "parameter", "localparam",
+    "specparam", "tri", "tri0", "tri1", "triand", "trior", "trireg", "wand", "wor", "uwire", "supply0",
+    "supply1", "event", "bit", "byte", "int", "shortint", "longint",
+}
+GATES = {"and", "or", "nand", "nor", "xor", "xnor", "not", "buf", "bufif0", "bufif1", "notif0", "notif1"}
+ALWAYS = {"always", "always_ff", "always_comb", "always_latch"}
+# 會結束前一個 always/assign/initial 敘述的 module item
+MODULE_ITEMS = ALWAYS | DECL_KEYWORDS | {
+    "initial", "assign", "endmodule", "generate", "endgenerate", "function", "task", "defparam",
+}
+STATEMENT_START = {";", "begin", "else", ")", "*", ":", "end", "endcase", "assign", "join", "join_any", "join_none"}
+ASSIGN_OPS = {"=", "<="}
+POOL_THRESHOLD = 64
+
+@dataclass
+class CheckResult:
+    issues: list = field(default_factory=list)
+    modules: list = field(default_factory=list)
+    ports: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.issues
+
+    @property
+    def status(self):
+        if not self.issues:
+            return "PASS"
+        more = f" (+{len(self.issues) - 3} more)" if len(self.issues) > 3 else ""
+        return f"FAIL: {'; '.join(self.issues[:3])}{more}"
+
+def tokenize(code):
+    # 回傳 ([(kind, text, line)], issues)，不含空白與註解
+    tokens, issues = [], []
+    line, pos = 1, 0
+    count = code.count
+    for m in TOKEN_RE.finditer(code):
+        kind = m.lastgroup
+        if kind == "skip":
+            continue
+        start = m.start()
+        line += count("\n", pos, start)
+        pos = start
+        if kind == "bad_comment":
+            issues.append(f"line {line}: unterminated block comment")
+            break
+        if kind == "bad_string":
+            issues.append(f"line {line}: unterminated string")
+        elif kind == "error":
+            issues.append(f"line {line}: unexpected character {m.group(kind)!r}")
+        else:
+            tokens.append((kind, m.group(kind), line))
+    return tokens, issues
+
+def code_fingerprint(code):
+    # token 序列的雜湊：只有註解或排版不同的生成結果會得到相同的值
+    tokens, issues = tokenize(code)
+    text = " ".join(token for _, token, _ in tokens)
+    if issues:
+        # 被略過的字元仍會影響判定結果，因此也納入 key
+        text += "\0" + code
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def _skip_group(tokens, i):
+    # 回傳 tokens[i] 開始的括號群組之後的位置
+    depth = 0
+    for j in range(i, len(tokens)):
+        text = tokens[j][1]
+        if text in BRACKETS:
+            depth += 1
+        elif text in (")", "]", "}"):
+            depth -= 1
+            if depth == 0:
+                return j + 1
+    return len(tokens)
+
+def _scan_decl(tokens, i, declared, directions):
+    # 記錄 tokens[i] 開始的宣告敘述所宣告的名稱，回傳下一個位置
+    direction = tokens[i][1] if tokens[i][1] in DIRECTIONS else None
+    expect, after_eq = True, False
+    j = i + 1
+    while j < len(tokens):
+        kind, text, _ = tokens[j]
+        if text in BRACKETS:
+            j = _skip_group(tokens, j)
+            continue
+        if text in (")", "}", ";"):
+            # ')' 結束 ANSI 埠或參數列表，交給呼叫端處理
+            return j + 1 if text == ";" else j
+        if text == ",":
+            expect, after_eq = True, False
+        elif text == "=":
+            expect, after_eq = False, True
+        elif text in DIRECTIONS:
+            direction, expect = text, True
+        elif kind == "ident" and text not in KEYWORDS and expect and not after_eq:
+            declared.add(text)
+            if direction:
+                directions[text] = direction
+            expect = False
+        j += 1
+    return j
+
+def _collect_declarations(tokens):
+    declared, directions, instances = set(), {}, set()
+    modules, ports = [], {}
+    i = 0
+    while i < len(tokens):
+        kind, text, _ = tokens[i]
+        nxt = tokens[i + 1][1] if i + 1 < len(tokens) else None
+        if text in DECL_KEYWORDS:
+            i = _scan_decl(tokens, i, declared, directions)
+            continue
+        if text in ("module", "macromodule") and nxt:
+            modules.append(nxt)
+            ports[nxt] = _header_ports(tokens, i + 2)
+        elif text in ("function", "task"):
+            # 名稱是 automatic / 型別 / 範圍之後的第一個識別字
+            j = i + 1
+            while j < len(tokens) and (tokens[j][1] in KEYWORDS or tokens[j][1] == "["):
+                j = _skip_group(tokens, j) if tokens[j][1] == "[" else j + 1
+            if j < len(tokens):
+                declared.add(tokens[j][1])
+        elif text in ("begin", "fork", "end") and nxt == ":" and i + 2 < len(tokens):
+            declared.add(tokens[i + 2][1])
+        elif text in ("typedef", "enum"):
+            j = i + 1
+            while j < len(tokens) and tokens[j][1] != ";":
+                if tokens[j][0] == "ident" and tokens[j][1] not in KEYWORDS:
+                    declared.add(tokens[j][1])
+                j += 1
+            i = j
+            continue
+        elif text in GATES and i + 1 < len(tokens) and tokens[i + 1][0] == "ident":
+            declared.add(nxt)
+        elif kind == "ident" and text not in KEYWORDS and i + 1 < len(tokens):
+            # 模組實例化：`type name (...)` 或 `type #(...) name (...)`
+            j = i + 1
+            if nxt == "#" and i + 2 < len(tokens) and tokens[i + 2][1] == "(":
+                j = _skip_group(tokens, i + 2)
+            if j < len(tokens) and tokens[j][0] == "ident" and tokens[j][1] not in KEYWORDS:
+                instances.add(i)
+                declared.add(tokens[j][1])
+        i += 1
+    declared.update(modules)
+    return declared, directions, instances, modules, ports
+
+def _header_ports(tokens, i):
+    # 模組名稱之後的 header 中的埠名稱
+    if i < len(tokens) and tokens[i][1] == "#":
+        i = _skip_group(tokens, i + 1)
+    if i >= len(tokens) or tokens[i][1] != "(":
+        return []
+    end = _skip_group(tokens, i) - 1
+    names, expect = [], True
+    j = i + 1
+    while j < end:
+        kind, text, _ = tokens[j]
+        if text in BRACKETS:
+            j = _skip_group(tokens, j)
+            continue
+        if text == "," or text in DIRECTIONS:
+            expect = True
+        elif kind == "ident" and text not in KEYWORDS and expect:
+            names.append(text)
+            expect = False
+        j += 1
+    return names
+
+def _assignment_targets(tokens, i):
+    # tokens[i] 開始的 `name[...] =`、`name <=` 或 `{a, b} =` 所賦值的名稱
+    kind, text, _ = tokens[i]
+    if kind == "ident" and text not in KEYWORDS:
+        j = i + 1
+        while j < len(tokens) and tokens[j][1] == "[":
+            j = _skip_group(tokens, j)
+        names = [text]
+    elif text == "{":
+        j = _skip_group(tokens, i)
+        names = [t[1] for k, t in enumerate(tokens[i + 1:j - 1], i + 1)
+                 if t[0] == "ident" and t[1] not in KEYWORDS and tokens[k - 1][1] != "["]
+    else:
+        return []
+    return names if j < len(tokens) and tokens[j][1] in ASSIGN_OPS else []
+
+def check_verilog(code, expected_ports=(), target_module=None):
+    tokens, issues = tokenize(code)
+    declared, directions, instances, modules, ports = _collect_declarations(tokens)
+    result = CheckResult(issues, modules, ports)
+    if not modules:
+        issues.append("no module declaration")
+
+    stack = []
+    drivers = defaultdict(set)
+    region = None  # 所在的 always/assign/initial 的 (kind, line, depth)
+    module = None
+    used = {}
+    implicit, nettype_none = set(), False
+    prev = None
+    for i, (kind, text, line) in enumerate(tokens):
+        if kind == "directive" and text.startswith("`default_nettype"):
+            nettype_none = text.split()[1:2] == ["none"]
+        if text in ("module", "macromodule"):
+            module = i
+        if region and text in MODULE_ITEMS and len(stack) <= region[2]:
+            region = None
+        if text in ALWAYS or text in ("assign", "initial"):
+            region = (text, line, len(stack))
+
+        # 敘述層級的 procedural 或 continuous assignment 左側
+        if region and region[0] != "initial" and prev in STATEMENT_START and \
+                (not stack or stack[-1][0] not in BRACKETS):
+            for name in _assignment_targets(tokens, i):
+                drivers[module, name].add(region[:2])
+                if region[0] == "assign" and not nettype_none:
+                    implicit.add(name)
+
+        if text in BLOCK_PAIRS:
+            stack.append((text, line))
+        elif text in CLOSERS:
+            if not stack:
+                issues.append(f"line {line}: '{text}' without matching opener")
+            else:
+                opener, open_line = stack.pop()
+                expected = BLOCK_PAIRS[opener]
+                if text != expected and not (opener == "fork" and text.startswith("join")):
+                    issues.append(f"line {line}: '{text}' closes '{opener}' from line {open_line} (expected '{expected}')")
+            if region and len(stack) < region[2]:
+                region = None
+        elif kind == "ident" and text not in KEYWORDS and prev != "." and i not in instances:
+            used.setdefault(text, line)
+        prev = text
+
+    for opener, open_line in stack:
+        issues.append(f"line {open_line}: '{opener}' is never closed")
+
+    undeclared = sorted((line, name) for name, line in used.items() if name not in declared and name not in implicit)
+    for line, name in undeclared[:5]:
+        issues.append(f"line {line}: '{name}' is not declared")
+
+    for (_, name), sources in sorted(drivers.items()):
+        if directions.get(name) == "input":
+            issues.append(f"input '{name}' is driven")
+        elif len(sources) > 1:
+            lines = ", ".join(str(line) for _, line in sorted(sources, key=lambda s: s[1]))
+            issues.append(f"'{name}' is driven from multiple blocks (lines {lines})")
+
+    header = ports.get(target_module) if target_module else [p for names in ports.values() for p in names]
+    if target_module and target_module not in ports:
+        issues.append(f"module '{target_module}' not found")
+    for name in header or []:
+        if name not in directions:
+            issues.append(f"port '{name}' has no direction declaration")
+    missing = [p for p in expected_ports if p not in (header or [])]
+    if missing:
+        issues.append(f"missing expected port(s): {', '.join(missing)}")
+    return result
+
+def _check_item(item):
+    return check_verilog(*item)
+
+def check_many(items, workers=None):
+    # 檢查 (code, expected_ports, target_module) 項目，數量多時使用 process pool
+    items = list(items)
+    if len(items) < POOL_THRESHOLD or workers == 1:
+        return [_check_item(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_check_item, items, chunksize=max(1, len(items) // (4 * (workers or os.cpu_count() or 1)))))
+
+def simulator_check(code, timeout=60):
+    # 以 Icarus Verilog elaborate 程式碼；沒有安裝 iverilog 時回傳 None
+    iverilog = shutil.which("iverilog")
+    if iverilog is None:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "candidate.v")
+        with open(path, "w") as f:
+            f.write(code)
+        try:
+            result = subprocess.run([iverilog, "-g2012", "-t", "null", path],
+                                    capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return "FAIL: iverilog timed out"
+    if result.returncode == 0:
+        return "PASS"
+    lines = (result.stderr or result.stdout).strip().replace(path + ":", "line ").splitlines()
+    return f"FAIL: {lines[0]}" if lines else "FAIL: iverilog error"
+
+def main():
+    parser = argparse.ArgumentParser(description="Structural Verilog pre-filter with optional iverilog check.")
+    parser.add_argument("paths", nargs="+", help="Verilog files or directories (searched for *.v)")
+    parser.add_argument("--ports", nargs="*", default=[], help="Port names every file must declare")
+    parser.add_argument("--module", default=None, help="Module that must exist and own the ports")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--iverilog", action="store_true", help="Also elaborate passing files with iverilog")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "**", "*.v"), recursive=True)) if os.path.isdir(path) else [path])
+    start = time.perf_counter()
+    codes = []
+    for path in files:
+        with open(path, errors="replace") as f:
+            codes.append(f.read())
+    results = check_many([(code, args.ports, args.module) for code in codes], args.workers)
+    elapsed = time.perf_counter() - start
+
+    report = []
+    for path, code, result in zip(files, codes, results):
+        sim = simulator_check(code) if args.iverilog and result.ok else None
+        report.append({"path": path, "status": result.status, "simulator": sim, "modules": result.modules})
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for row in report:
+            sim = f" | iverilog {row['simulator']}" if row["simulator"] else ""
+            print(f"{row['path']}: {row['status']}{sim}")
+    passed = sum(r.ok for r in results)
+    rate = len(files) / elapsed if elapsed else float("inf")
+    print(f"✅ {passed}/{len(files)} passed structural checks in {elapsed:.2f}s ({rate:.0f} files/s)", file=sys.stderr)
+    sys.exit(0 if passed == len(files) else 1)
+
+if __name__ == "__main__":
+    main()
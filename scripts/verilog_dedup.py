@@ -0,0 +1,188 @@
+# 檔案路徑: scripts/verilog_dedup.py
+# 以 MinHash + LSH 移除近似重複的 Verilog 模組 (由 scripts/2_process_data.py 呼叫)
+import re
+import zlib
+import numpy as np
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+MINHASH_SEED = 3407
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+VERILOG_KEYWORDS = frozenset("""
+always and assign automatic begin buf bufif0 bufif1 case casex casez cmos deassign default defparam
+disable edge else end endcase endfunction endgenerate endmodule endprimitive endspecify endtable
+endtask event for force forever fork function generate genvar highz0 highz1 if ifnone initial inout
+input integer join large localparam macromodule medium module nand negedge nmos nor not notif0 notif1
+or output parameter pmos posedge primitive pull0 pull1 pulldown pullup rcmos real realtime reg release
+repeat rnmos rpmos rtran rtranif0 rtranif1 scalared signed small specify specparam strong0 strong1
+supply0 supply1 table task time tran tranif0 tranif1 tri tri0 tri1 triand trior trireg unsigned vectored
+wait wand weak0 weak1 while wire wor xnor xor logic always_ff always_comb always_latch
+""".split())
+
+_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.S)
+_TOKEN_RE = re.compile(
+    r"[A-Za-z_][A-Za-z0-9_$]*"          # 識別字 / 關鍵字
+    r"|[`$][A-Za-z_][A-Za-z0-9_$]*"     # 編譯指令 / 系統任務
+    r"|\d*'[sS]?[bBoOdDhH][0-9a-fA-FxXzZ_?]+"  # 帶基底的數字
+    r"|\d[\d_]*(?:\.\d+)?"
+    r"|\"(?:\\.|[^\"\\])*\""
+    r"|\S"
+)
+
+# --- 1. 正規化：移除註解與空白，將內部的識別字統一為 ID ---
+# 模組名稱與埠名稱 (以及 header 中的參數) 保留原樣：它們決定一個模組「是什麼」，
+# 全部換成 ID 會讓結構相近但用途不同的模組 (例如各種小型組合電路) 被誤判為重複。
+_MODULE_KEYWORDS = frozenset(("module", "macromodule"))
+_PORT_DIRECTIONS = frozenset(("input", "output", "inout"))
+
+def _is_identifier(token):
+    return (token[0].isalpha() or token[0] == "_") and token not in VERILOG_KEYWORDS
+
+def interface_names(tokens):
+    # module header (到第一個 ';' 為止) 與 input / output / inout 宣告中出現的識別字
+    names, in_interface = set(), False
+    for t in tokens:
+        if t in _MODULE_KEYWORDS or t in _PORT_DIRECTIONS:
+            in_interface = True
+        elif t == ";":
+            in_interface = False
+        elif in_interface and _is_identifier(t):
+            names.add(t)
+    return names
+
+def normalize_verilog(code):
+    tokens = _TOKEN_RE.findall(_COMMENT_RE.sub(" ", code or ""))
+    keep = interface_names(tokens)
+    return ["ID" if _is_identifier(t) and t not in keep else t for t in tokens]
+
+def shingle_hashes(tokens, k=SHINGLE_SIZE):
+    if len(tokens) < k:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    # zlib.crc32 在各行程間結果一致 (內建 hash() 會隨機加鹽)
+    return np.unique(np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)))
+
+# --- 2. MinHash 簽章 ---
+def minhash_permutations(num_perm=NUM_PERM, seed=MINHASH_SEED):
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash_signature(code, perms):
+    a, b = perms
+    hashes = shingle_hashes(normalize_verilog(code))
+    # a, h, b 都小於 2^32，a*h+b 不會超出 uint64
+    phv = (hashes[:, None] * a[None, :] + b[None, :]) % MERSENNE_PRIME & MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+def minhash_batch(batch, column="code", num_perm=NUM_PERM, seed=MINHASH_SEED):
+    perms = minhash_permutations(num_perm, seed)
+    return {"minhash": [minhash_signature(code, perms) for code in batch[column]]}
+
+# --- 3. LSH：依門檻選擇 band 數與每個 band 的列數 ---
+def optimal_lsh_params(threshold, num_perm=NUM_PERM):
+    # 與 datasketch 相同：最小化 false positive 與 false negative 機率的面積和
+    best, best_err = (1, num_perm), float("inf")
+    s_lo = np.linspace(0.0, threshold, 200)
+    s_hi = np.linspace(threshold, 1.0, 200)
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            fp = (1 - (1 - s_lo ** rows) ** bands).mean() * threshold
+            fn = ((1 - s_hi ** rows) ** bands).mean() * (1 - threshold)
+            if fp + fn < best_err:
+                best, best_err = (bands, rows), fp + fn
+    return best
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = np.arange(n)
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x, y):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            # 保留較早出現的樣本作為代表
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+def find_near_duplicates(signatures, threshold):
+    n, num_perm = signatures.shape
+    bands, rows = optimal_lsh_params(threshold, num_perm)
+    uf = _UnionFind(n)
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        for start, count in zip(starts[counts > 1], counts[counts > 1]):
+            members = order[start:start + count]
+            head = members[0]
+            # LSH 只產生候選；以估計的 Jaccard 相似度確認後才合併
+            similarity = (signatures[members[1:]] == signatures[head]).mean(axis=1)
+            for member in members[1:][similarity >= threshold]:
+                uf.union(head, member)
+
+    roots = np.array([uf.find(i) for i in range(n)])
+    return roots, (bands, rows)
+
+# --- 4. 對整個 Dataset 去重，回傳保留的資料與被移除的 cluster 報告 ---
+_MODULE_NAME_RE = re.compile(r"\bmodule\s+([A-Za-z_][A-Za-z0-9_$]*)")
+
+def _module_name(code):
+    match = _MODULE_NAME_RE.search(code or "")
+    return match.group(1) if match else None
+
+def deduplicate(ds, threshold=0.85, column="code", num_perm=NUM_PERM, num_proc=None, batch_size=1000):
+    if len(ds) < 2:
+        return ds, {"threshold": threshold, "total": len(ds), "kept": len(ds), "removed": 0, "removed_fraction": 0.0,
+                    "clusters": []}
+    with_sig = ds.map(
+        minhash_batch,
+        batched=True,
+        batch_size=batch_size,
+        num_proc=num_proc,
+        fn_kwargs={"column": column, "num_perm": num_perm},
+        remove_columns=ds.column_names,
+    )
+    signatures = np.asarray(with_sig.with_format("numpy")["minhash"], dtype=np.uint32)
+    roots, (bands, rows) = find_near_duplicates(signatures, threshold)
+
+    keep = np.flatnonzero(roots == np.arange(len(roots)))
+    clusters = {}
+    for idx in np.flatnonzero(roots != np.arange(len(roots))):
+        clusters.setdefault(int(roots[idx]), []).append(int(idx))
+
+    # 只讀取報告需要的樣本，避免把整欄程式碼載入記憶體
+    needed = sorted(set(clusters) | {i for members in clusters.values() for i in members})
+    names = dict(zip(needed, map(_module_name, ds.select(needed)[column])))
+    report = {
+        "threshold": threshold,
+        "num_perm": num_perm,
+        "bands": bands,
+        "rows_per_band": rows,
+        "total": len(roots),
+        "kept": len(keep),
+        "removed": len(roots) - len(keep),
+        "removed_fraction": (len(roots) - len(keep)) / len(roots),
+        "clusters": [
+            {
+                "kept": kept,
+                "kept_module": names[kept],
+                "removed": members,
+                "removed_modules": [names[i] for i in members],
+            }
+            for kept, members in sorted(clusters.items(), key=lambda kv: -len(kv[1]))
+        ],
+    }
+    return ds.select(keep), report
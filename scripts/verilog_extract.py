@@ -0,0 +1,128 @@
+# 檔案路徑: scripts/verilog_extract.py
+# 從模型輸出擷取 Verilog：一次處理整段文字，或在串流時逐段處理。
+#   VerilogStreamExtractor 逐段接收生成內容，逐行追蹤 Markdown code fence、註解與 module/endmodule 巢狀層級，
+#   目標模組 (指定名稱的模組，或第一個模組) 一結束就回報完成：
+#     - 在 code fence 內：等到 fence 結束，同一個區塊中接在目標之後的輔助模組也會保留
+#     - 沒有 fence 的輸出：在目標的 `endmodule` 處立即完成
+#   呼叫端即可中斷連線，省下模型接著生成的說明或多餘模組。
+import re
+
+CODE_BLOCK = re.compile(r"```(?:verilog|systemverilog|sv|v)?\s*(.*?)```", re.DOTALL)
+MODULE_KEYWORD = re.compile(r"\b(module|macromodule|endmodule)\b(?:\s+(\w+))?")
+# fence 之外的 module 必須位於行首，避免把 "This module ..." 之類的說明當成程式碼
+UNFENCED_MODULE = re.compile(r"^\s*(?:macro)?module\s+\w+")
+
+def extract_verilog(text):
+    # 擷取 Markdown 中第一個 Verilog 區塊，或沒有 fence 的 module 程式碼
+    for block in CODE_BLOCK.findall(text):
+        if "module" in block:
+            return block.strip()
+
+    # 沒有 Markdown 區塊時，改找 module/endmodule
+    if "module" in text and "endmodule" in text:
+        return text.strip()
+
+    return ""
+
+class VerilogStreamExtractor:
+    def __init__(self, target_module=None):
+        self.target_module = target_module
+        self.text = ""
+        self.done = False
+        self._pending = ""
+        self._lines = []
+        self._in_fence = False
+        self._in_comment = False
+        self._depth = 0
+        self._current = None
+        self._target_closed = False
+
+    def feed(self, piece):
+        # 加入串流收到的文字；目標模組完整後回傳 True
+        self.text += piece
+        if self.done:
+            return True
+        self._pending += piece
+        *lines, self._pending = self._pending.split("\n")
+        for line in lines:
+            self._process_line(line)
+            if self.done:
+                break
+        # 結束的 fence 後面不需要換行即可結束區塊
+        if not self.done and self._in_fence and self._target_closed and self._pending.strip().startswith("```"):
+            self.done = True
+        return self.done
+
+    def finish(self):
+        # 串流結束後處理最後一行沒有換行的內容
+        if self._pending and not self.done:
+            self._process_line(self._pending)
+        self._pending = ""
+        return self.done
+
+    @property
+    def code(self):
+        if self._target_closed:
+            return "\n".join(self._lines).strip()
+        return extract_verilog(self.text)
+
+    def _strip_comments(self, line):
+        code = []
+        i = 0
+        while i < len(line):
+            if self._in_comment:
+                end = line.find("*/", i)
+                if end < 0:
+                    break
+                self._in_comment = False
+                i = end + 2
+            elif line.startswith("//", i):
+                break
+            elif line.startswith("/*", i):
+                self._in_comment = True
+                i += 2
+            else:
+                code.append(line[i])
+                i += 1
+        return "".join(code)
+
+    def _process_line(self, line):
+        if line.strip().startswith("```"):
+            if not self._in_fence:
+                self._in_fence = True
+                if not self._target_closed:
+                    # 只保留包含目標模組的區塊
+                    self._lines = []
+            else:
+                self._in_fence = False
+                self.done = self._target_closed
+            return
+
+        if not self._in_fence and self._depth == 0:
+            if not UNFENCED_MODULE.match(line):
+                return
+            self._lines = []
+        self._lines.append(line)
+
+        code = self._strip_comments(line)
+        for keyword, name in MODULE_KEYWORD.findall(code):
+            if keyword == "endmodule":
+                if self._depth == 0:
+                    continue
+                self._depth -= 1
+                if self._depth == 0 and self.target_module in (None, self._current):
+                    self._target_closed = True
+            else:
+                self._depth += 1
+                if self._depth == 1:
+                    self._current = name
+
+        if self._target_closed and not self._in_fence:
+            self.done = True
+
+def extract_code(text, target_module=None):
+    # 對完整的輸出 (例如快取的生成結果) 執行串流擷取
+    extractor = VerilogStreamExtractor(target_module)
+    extractor.feed(text)
+    extractor.finish()
+    return extractor.code
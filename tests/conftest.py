@@ -0,0 +1,29 @@
+# 檔案路徑: tests/conftest.py
+# scripts/ 不是 package，測試直接以模組名稱匯入其中的輔助模組
+import asyncio
+import contextlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+SCRIPTS_DIR = sys.path[0]
+
+def load_script(filename):
+    # 以數字開頭的腳本 (例如 5_benchmark.py) 無法直接 import，改用檔案路徑載入
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].lstrip("0123456789_"),
+                                                  os.path.join(SCRIPTS_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@contextlib.asynccontextmanager
+async def fake_ollama(*argv):
+    # 在目前的 event loop 中啟動替身伺服器 (隨機 port)，回傳 FakeOllama 以便檢查伺服器端的計數
+    from fake_ollama_server import FakeOllama, build_parser
+    app = FakeOllama(build_parser().parse_args(["--latency", "0", "--load-time", "0", *argv]))
+    server = await asyncio.start_server(app.serve_connection, "127.0.0.1", 0)
+    app.url = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+    async with server:
+        yield app
@@ -0,0 +1,57 @@
+# 檔案路徑: tests/preemptible_train.py
+# test_train_resume.py 使用的小型訓練腳本，流程與 3_train_from_local.py 相同：
+# 從最新的 checkpoint 續訓、SIGTERM 時存檔並以 PREEMPTED_EXIT_CODE 結束，跑完才寫 final_adapter。
+# 每個訓練過的 batch 的樣本 id 追加到 <output_dir>/seen.jsonl，用來比對續訓後的資料順序。
+#   python tests/preemptible_train.py OUTPUT_DIR MAX_STEPS
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import torch
+import transformers
+
+from train_resume import PREEMPTED_EXIT_CODE, PreemptionCallback, latest_checkpoint
+
+NUM_SAMPLES = 64
+STEP_DELAY = 0.1
+
+def collate(features):
+    input_ids = torch.stack([f["input_ids"] for f in features])
+    return {"input_ids": input_ids, "labels": input_ids.clone()}
+
+def main(output_dir, max_steps):
+    torch.manual_seed(0)
+    model = transformers.LlamaForCausalLM(transformers.LlamaConfig(
+        vocab_size=128, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2,
+    ))
+    # 第一個 token 即樣本 id
+    dataset = [{"input_ids": torch.tensor([i + 1] + [(i * 7 + j) % 127 + 1 for j in range(7)])}
+               for i in range(NUM_SAMPLES)]
+    args = transformers.TrainingArguments(
+        output_dir=output_dir, per_device_train_batch_size=2, max_steps=max_steps, save_steps=5,
+        save_total_limit=2, logging_steps=1, report_to=[], use_cpu=True, seed=0,
+    )
+    trainer = transformers.Trainer(model=model, args=args, train_dataset=dataset, data_collator=collate)
+    training_step = trainer.training_step
+
+    def logged_training_step(model, inputs, *args, **kwargs):
+        with open(os.path.join(output_dir, "seen.jsonl"), "a") as f:
+            f.write(json.dumps((inputs["input_ids"][:, 0] - 1).tolist()) + "\n")
+        time.sleep(STEP_DELAY)
+        return training_step(model, inputs, *args, **kwargs)
+
+    trainer.training_step = logged_training_step
+    preemption = PreemptionCallback().install()
+    trainer.add_callback(preemption)
+
+    trainer.train(resume_from_checkpoint=latest_checkpoint(output_dir))
+    if preemption.interrupted:
+        sys.exit(PREEMPTED_EXIT_CODE)
+    model.save_pretrained(os.path.join(output_dir, "final_adapter"))
+
+if __name__ == "__main__":
+    main(sys.argv[1], int(sys.argv[2]))
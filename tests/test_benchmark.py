@@ -0,0 +1,91 @@
+# 檔案路徑: tests/test_benchmark.py
+import asyncio
+
+import pytest
+
+from benchmark_suite import ResultLog
+from conftest import fake_ollama, load_script
+from ollama_client import OllamaClient, OllamaError
+
+benchmark = load_script("5_benchmark.py")
+
+class FailingClient:
+    def __init__(self, fail_after=0):
+        self.fail_after = fail_after
+
+    async def generate_stream(self, model, prompt, options=None, keep_alive=None):
+        for i in range(self.fail_after):
+            yield {"response": "module", "done": False}
+        raise OllamaError("POST /api/generate returned 503: server busy", 503)
+
+class Residency:
+    keep_alive = "30m"
+
+    async def ensure_loaded(self, model):
+        return 0.0
+
+def make_ctx(client, unavailable=None):
+    return benchmark.RunContext(client, asyncio.Semaphore(1), True, residency=Residency(),
+                                digests={"m": "d"}, quants={"m": "Q4"}, unavailable=unavailable or {})
+
+BENCH = {"id": "L1_01", "level": "L1", "prompt": "p"}
+
+@pytest.mark.parametrize("fail_after", [0, 3])
+def test_request_errors_become_error_rows(tmp_path, monkeypatch, fail_after):
+    monkeypatch.setattr(benchmark, "OUTPUT_DIR", str(tmp_path))
+    (tmp_path / "m").mkdir()
+    code, row = asyncio.run(benchmark.run_benchmark(make_ctx(FailingClient(fail_after)), "m", BENCH))
+    assert code is None
+    assert row["status"] == "ERROR" and "503" in row["error"]
+
+def test_connection_dropped_mid_stream_becomes_an_error_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "OUTPUT_DIR", str(tmp_path))
+    (tmp_path / "m").mkdir()
+
+    async def main():
+        # 替身伺服器串流 3 個 token 後斷線 (chunked body 讀到空行)
+        async with fake_ollama("--models", "m", "--drop-after", "3") as app, OllamaClient(app.url) as client:
+            return await benchmark.run_benchmark(make_ctx(client), "m", BENCH)
+
+    code, row = asyncio.run(main())
+    assert code is None
+    assert row["status"] == "ERROR" and "interrupted" in row["error"]
+    assert row["gen_tokens"] == 3
+
+def test_unavailable_model_becomes_error_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "OUTPUT_DIR", str(tmp_path))
+    (tmp_path / "m").mkdir()
+    ctx = make_ctx(FailingClient(), unavailable={"m": "model 'm' not found"})
+    _, row = asyncio.run(benchmark.run_benchmark(ctx, "m", BENCH))
+    assert row["status"] == "ERROR" and "not found" in row["error"]
+
+def row(status, sample=0):
+    return {"id": "L1_01", "status": status, "sample": sample, **{m: 1.0 for m in benchmark.LATENCY_METRICS}}
+
+def test_aggregate_leaves_errors_out_of_pass_rates():
+    stats = benchmark.aggregate([row("PASS"), row("FAIL: x", 1), row("ERROR", 2)], ks=[1, 5])
+    assert (stats["count"], stats["passed"], stats["errors"]) == (2, 1, 1)
+    assert stats["pass_at_k"]["pass@1"] == pytest.approx(0.5)
+    # 樣本數不足 k 時不估計
+    assert stats["pass_at_k"]["pass@5"] is None
+
+def test_aggregate_leaves_cached_rows_out_of_latencies():
+    cached = {**row("PASS", 1), "ttft": 9.0, "cached": True}
+    stats = benchmark.aggregate([{**row("PASS"), "cached": False}, cached])
+    # 快取的結果仍計入通過率，但其延遲屬於先前的執行
+    assert (stats["count"], stats["passed"], stats["cached"]) == (2, 2, 1)
+    assert stats["ttft"] == {f"p{q}": 1.0 for q in benchmark.PERCENTILES}
+    assert benchmark.aggregate([cached])["ttft"] is None
+
+def test_pass_at_k():
+    assert benchmark.pass_at_k(10, 0, 1) == 0.0
+    assert benchmark.pass_at_k(10, 10, 5) == 1.0
+    assert benchmark.pass_at_k(10, 3, 1) == pytest.approx(0.3)
+    assert benchmark.pass_at_k(5, 1, 5) == 1.0
+
+def test_resume_retries_errored_rows(tmp_path):
+    log = ResultLog(str(tmp_path / "results.jsonl"))
+    log.reset()
+    log.append({"model": "m", "id": "a", "sample": 0, "status": "NO_CODE", "code": None})
+    log.append({"model": "m", "id": "b", "sample": 0, "status": "ERROR", "error": "503", "code": None})
+    assert set(benchmark.resumable_results(log.path)) == {("m", "a", 0)}
@@ -0,0 +1,88 @@
+# 檔案路徑: tests/test_benchmark_history.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmark_history import BenchmarkHistory, bonferroni, comparability_issues, compare, holm
+from conftest import SCRIPTS_DIR
+
+def result(model, prompt_id, passed, level="L1", tps=50.0, sample=0):
+    return {"model": model, "model_digest": f"sha-{model}", "quant": "Q4_K_M", "id": prompt_id, "level": level,
+            "sample": sample, "status": "PASS" if passed else "FAIL", "cached": False, "ttft": 0.2,
+            "elapsed": 1.0, "prompt_tokens_per_s": 500.0, "gen_tokens_per_s": tps, "gen_tokens": 100}
+
+def suite_results(model, passed_ids, ids, tps=50.0):
+    return [result(model, i, i in passed_ids, level=f"L{n % 3 + 1}", tps=tps + n % 5) for n, i in enumerate(ids)]
+
+IDS = [f"P{i:02d}" for i in range(30)]
+
+@pytest.fixture
+def history(tmp_path):
+    history = BenchmarkHistory(str(tmp_path / "history.sqlite"))
+    yield history
+    history.close()
+
+def test_holm_and_bonferroni():
+    p_values = [0.01, 0.04, 0.03, 0.005]
+    assert holm(p_values) == pytest.approx([0.03, 0.06, 0.06, 0.02])
+    assert bonferroni(p_values) == pytest.approx([0.04, 0.16, 0.12, 0.02])
+    assert holm([0.5, 0.9]) == pytest.approx([1.0, 1.0])
+    assert holm([]) == []
+
+def test_correction_suppresses_a_marginal_finding():
+    # 只有單一難度的通過率略降：單獨檢定顯著，但在多個檢定之間校正後不顯著
+    base, new = [], []
+    for level in ("L1", "L2", "L3"):
+        for i in range(12):
+            base.append({"passed": True, "level": level, "cached": False, "gen_tokens_per_s": 50.0 + i % 3, "ttft": 0.2})
+            new.append({"passed": level != "L3" or i < 7, "level": level, "cached": False,
+                        "gen_tokens_per_s": 50.0 + i % 3, "ttft": 0.2})
+    raw = {f[0]: f for f in compare(base, new, correction="none")}
+    corrected = {f[0]: f for f in compare(base, new)}
+    assert raw["pass_rate L3"][-1] == "REGRESSION"
+    assert corrected["pass_rate L3"][-1] == "-"
+    assert corrected["pass_rate L3"][4] > raw["pass_rate L3"][4]
+
+def test_matching_runs_are_comparable(history):
+    options = {"temperature": 0.8, "seed": 0}
+    history.record_run(suite_results("a", set(IDS[:20]), IDS), samples=1, options=options, early_stop=True)
+    history.record_run(suite_results("b", set(IDS[:18]), IDS), samples=1, options=options, early_stop=True)
+    _, base = history.build_results("a")
+    _, new = history.build_results("b")
+    runs = lambda rows: history.run_settings(r["run_id"] for r in rows)
+    assert comparability_issues(base, new, runs(base), runs(new)) == []
+
+def test_mismatched_runs_are_reported(history):
+    history.record_run(suite_results("a", set(), IDS), samples=1, options={"temperature": 0.8}, early_stop=True)
+    history.record_run(suite_results("b", set(), IDS[:25]), samples=5, options={"temperature": 0.2}, early_stop=False)
+    _, base = history.build_results("a")
+    _, new = history.build_results("b")
+    runs = lambda rows: history.run_settings(r["run_id"] for r in rows)
+    issues = comparability_issues(base, new, runs(base), runs(new))
+    assert len(issues) == 4
+    assert issues[0] == "prompt ids differ: 5 only in base, 0 only in new"
+    assert [issue.split(" differs")[0] for issue in issues[1:]] == ["samples per prompt", "sampling options", "early stop"]
+
+def run_cli(db, *args):
+    return subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, "benchmark_history.py"), "--db", db, *args],
+                          capture_output=True, text=True)
+
+def test_compare_refuses_incomparable_runs_unless_forced(history):
+    history.record_run(suite_results("a", set(IDS), IDS), samples=1, options=None, early_stop=True)
+    history.record_run(suite_results("b", set(IDS[:10]), IDS[:20]), samples=1, options=None, early_stop=False)
+    refused = run_cli(history.path, "compare", "a", "b")
+    assert refused.returncode == 2
+    assert "early stop differs" in refused.stdout and "not comparable" in refused.stdout
+
+    forced = run_cli(history.path, "compare", "a", "b", "--force")
+    assert "on the 20 prompts in common" in forced.stdout
+    assert forced.returncode == 1 and "pass_rate all" in forced.stdout.splitlines()[-1]
+
+def test_compare_passes_identical_builds(history):
+    for model in ("a", "b"):
+        history.record_run(suite_results(model, set(IDS[::2]), IDS), samples=1, options=None, early_stop=True)
+    completed = run_cli(history.path, "compare", "a", "b")
+    assert completed.returncode == 0, completed.stdout
+    assert "No significant regression (alpha 0.05, holm)" in completed.stdout
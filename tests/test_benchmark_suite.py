@@ -0,0 +1,43 @@
+# 檔案路徑: tests/test_benchmark_suite.py
+import os
+
+import pytest
+
+from benchmark_suite import SUITE_PATH, ResultLog, load_suite, parse_shard, select_shard
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_suite(n):
+    return [{"id": f"L1_{i:02d}", "prompt": "p"} for i in range(n)]
+
+@pytest.mark.parametrize("size, count", [(12, 2), (12, 5), (12, 20), (3, 3), (0, 4)])
+def test_shards_are_balanced_and_cover_the_suite(size, count):
+    suite = make_suite(size)
+    shards = [select_shard(suite, i, count) for i in range(1, count + 1)]
+    sizes = [len(shard) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+    assert sorted(bench["id"] for shard in shards for bench in shard) == sorted(b["id"] for b in suite)
+
+def test_shards_do_not_depend_on_file_order():
+    suite = make_suite(7)
+    assert select_shard(suite, 2, 3) == select_shard(suite[::-1], 2, 3)[::-1]
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "2-4"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+def test_bundled_suite_loads():
+    suite = load_suite(os.path.join(ROOT, SUITE_PATH))
+    assert suite and all(bench["level"] and bench["prompt"] for bench in suite)
+
+def test_result_log_drops_partial_last_line(tmp_path):
+    log = ResultLog(str(tmp_path / "results.jsonl"))
+    log.reset()
+    log.append({"model": "m", "id": "a", "sample": 0, "status": "PASS"})
+    with open(log.path, "a") as f:
+        f.write('{"model": "m", "id": "b"')
+    assert list(log.load()) == [("m", "a", 0)]
+    log.append({"model": "m", "id": "b", "sample": 0, "status": "PASS"})
+    assert len(log.load()) == 2
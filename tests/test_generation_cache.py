@@ -0,0 +1,56 @@
+# 檔案路徑: tests/test_generation_cache.py
+import asyncio
+import json
+
+from conftest import fake_ollama, load_script
+from generation_cache import GenerationCache, cache_key
+from ollama_client import OllamaClient
+from test_benchmark import Residency
+
+benchmark = load_script("5_benchmark.py")
+
+def test_cache_key_is_stable_and_covers_early_stop():
+    key = cache_key("digest", "Write a mux", {"temperature": 0.8, "seed": 3}, early_stop=True)
+    # 選項的順序不影響 key；沒有選項與空選項相同
+    assert key == cache_key("digest", "Write a mux", {"seed": 3, "temperature": 0.8}, early_stop=True)
+    assert cache_key("digest", "p") == cache_key("digest", "p", {})
+    # 提前中斷會截斷輸出，必須是 key 的一部分
+    assert key != cache_key("digest", "Write a mux", {"temperature": 0.8, "seed": 3}, early_stop=False)
+    assert key != cache_key("digest", "Write a mux", {"temperature": 0.8, "seed": 4}, early_stop=True)
+    assert key != cache_key("other", "Write a mux", {"temperature": 0.8, "seed": 3}, early_stop=True)
+
+def test_evicts_least_recently_used_above_max_bytes(tmp_path):
+    value = {"response": "x" * 100}
+    size = len(json.dumps(value))
+    cache = GenerationCache(str(tmp_path / "cache.sqlite"), max_bytes=size * 2)
+    cache.put("a", value)
+    cache.put("b", value)
+    # 讀取 a 後 b 成為最久未使用，放入 c 時被逐出
+    assert cache.get("a") == value
+    cache.put("c", value)
+    assert cache.get("b") is None
+    assert cache.get("a") == value and cache.get("c") == value
+    (total,) = cache.db.execute("SELECT SUM(size) FROM generations").fetchone()
+    assert total <= cache.max_bytes
+    cache.close()
+
+def test_refresh_regenerates_and_overwrites_the_entry(tmp_path):
+    cache = GenerationCache(str(tmp_path / "cache.sqlite"))
+    stale = {"response": "```verilog\nmodule stale; endmodule\n```", "metrics": {"ttft": 9.0, "gen_tokens": 1}}
+
+    async def main(refresh):
+        async with fake_ollama("--models", "m") as app, OllamaClient(app.url) as client:
+            digest = (await client.model_info("m"))["digest"]
+            ctx = benchmark.RunContext(client, asyncio.Semaphore(1), True, cache, refresh, residency=Residency(),
+                                       digests={"m": digest}, unavailable={})
+            key = cache_key(digest, "Write a mux", None, early_stop=True)
+            if not refresh:
+                cache.put(key, stale, "m", digest)
+            return key, await benchmark.generate(ctx, "m", "Write a mux")
+
+    key, (output, _, metrics, cached) = asyncio.run(main(refresh=False))
+    assert cached and output == stale["response"] and metrics == stale["metrics"]
+    key, (output, code, metrics, cached) = asyncio.run(main(refresh=True))
+    assert not cached and "stale" not in output and code
+    assert cache.get(key) == {"response": output, "metrics": metrics}
+    cache.close()
@@ -0,0 +1,78 @@
+# 檔案路徑: tests/test_gguf_inspect.py
+import struct
+
+import pytest
+
+from conftest import load_script
+from gguf_inspect import GGUFError, validate_gguf
+
+ALIGNMENT = 32
+# 兩個 F32 [8] (32 bytes) 與一個 Q8_0 [32, 2] (2 blocks × 34 bytes)
+TENSORS = [("token_embd.weight", [8], 0, 0), ("output_norm.weight", [8], 0, 32), ("output.weight", [32, 2], 8, 64)]
+DATA_SIZE = 64 + 68
+
+def string(text):
+    data = text.encode()
+    return struct.pack("<Q", len(data)) + data
+
+def write_gguf(path, tensors=TENSORS, file_type=7, data_size=DATA_SIZE):
+    # 最小的 v3 GGUF：header、metadata (字串 / uint32 / 陣列)、tensor info、對齊後的資料區
+    metadata = [
+        ("general.architecture", 8, string("llama")),
+        ("general.name", 8, string("tiny")),
+        ("general.file_type", 4, struct.pack("<I", file_type)),
+        ("general.alignment", 4, struct.pack("<I", ALIGNMENT)),
+        ("llama.context_length", 4, struct.pack("<I", 2048)),
+        ("tokenizer.ggml.tokens", 9, struct.pack("<IQ", 8, 2) + string("a") + string("b")),
+    ]
+    out = b"GGUF" + struct.pack("<IQQ", 3, len(tensors), len(metadata))
+    for key, value_type, value in metadata:
+        out += string(key) + struct.pack("<I", value_type) + value
+    for name, shape, ggml_type, offset in tensors:
+        out += string(name) + struct.pack(f"<I{len(shape)}QIQ", len(shape), *shape, ggml_type, offset)
+    out += b"\0" * (-len(out) % ALIGNMENT)
+    path.write_bytes(out + b"\0" * data_size)
+    return path
+
+def test_valid_file(tmp_path):
+    gguf = validate_gguf(str(write_gguf(tmp_path / "tiny.gguf")))
+    summary = gguf.summary()
+    assert (summary["version"], summary["architecture"], summary["name"]) == (3, "llama", "tiny")
+    assert summary["file_type"] == "Q8_0" and summary["context_length"] == 2048
+    assert gguf.metadata["tokenizer.ggml.tokens"] == ["a", "b"]
+    assert gguf.data_offset % ALIGNMENT == 0 and gguf.data_offset + DATA_SIZE == gguf.file_size
+    assert summary["n_parameters"] == 8 + 8 + 64
+    assert summary["tensor_types"] == {"F32": {"count": 2, "bytes": 64}, "Q8_0": {"count": 1, "bytes": 68}}
+
+def test_truncated_file(tmp_path):
+    path = write_gguf(tmp_path / "tiny.gguf")
+    data = path.read_bytes()
+    # 少了最後一個 byte 的 tensor 資料
+    path.write_bytes(data[:-1])
+    with pytest.raises(GGUFError, match="truncated, tensor data needs"):
+        validate_gguf(str(path))
+    # 截斷在 metadata 中間
+    path.write_bytes(data[:60])
+    with pytest.raises(GGUFError, match="truncated"):
+        validate_gguf(str(path))
+
+def test_misaligned_offset(tmp_path):
+    tensors = [*TENSORS[:2], ("output.weight", [32, 2], 8, 68)]
+    with pytest.raises(GGUFError, match="output.weight offset 68 is not 32-byte aligned"):
+        validate_gguf(str(write_gguf(tmp_path / "tiny.gguf", tensors, data_size=DATA_SIZE + 4)))
+
+def test_overlapping_tensors(tmp_path):
+    # output_norm 從 token_embd 的中間開始 (仍然對齊)
+    tensors = [("token_embd.weight", [16], 0, 0), *TENSORS[1:]]
+    with pytest.raises(GGUFError, match="output_norm.weight overlaps"):
+        validate_gguf(str(write_gguf(tmp_path / "tiny.gguf", tensors)))
+
+def test_check_gguf_rejects_file_type_mismatch(tmp_path, monkeypatch):
+    # 4_bulk_convert_gguf.py 匯入時會改寫 HF 快取的環境變數，先交給 monkeypatch 以便測試後還原
+    monkeypatch.setenv("HF_HOME", "")
+    monkeypatch.setenv("HUGGINGFACE_HUB_CACHE", "")
+    bulk = load_script("4_bulk_convert_gguf.py")
+    path = str(write_gguf(tmp_path / "tiny.gguf", file_type=15))
+    assert bulk.check_gguf(path, "Q4_K_M").file_type_name == "Q4_K_M"
+    with pytest.raises(GGUFError, match="file type Q4_K_M, expected Q3_K_M"):
+        bulk.check_gguf(path, "Q3_K_M")
@@ -0,0 +1,53 @@
+# 檔案路徑: tests/test_lora_merge.py
+# 以隨機初始化的小模型建立 PEFT LoRA adapter，確認串流合併的結果與 merge_and_unload() 相同
+import pytest
+import torch
+
+from lora_merge import merge_lora_streaming
+
+transformers = pytest.importorskip("transformers")
+peft = pytest.importorskip("peft")
+from safetensors.torch import load_file  # noqa: E402
+
+def tiny_llama():
+    return transformers.LlamaForCausalLM(transformers.LlamaConfig(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2,
+    ))
+
+def tiny_gpt2():
+    # GPT-2 的 Conv1D 權重存成 (in, out)，是 fan_in_fan_out 唯一有效的情況 (nn.Linear 上 PEFT 會自動改回 False)
+    return transformers.GPT2LMHeadModel(transformers.GPT2Config(
+        vocab_size=64, n_embd=32, n_layer=2, n_head=4, n_positions=32,
+    ))
+
+CASES = {
+    "llama": (tiny_llama, dict(target_modules=["q_proj", "v_proj", "down_proj"])),
+    "llama_rslora": (tiny_llama, dict(target_modules=["q_proj", "o_proj", "up_proj"], use_rslora=True)),
+    "llama_alpha_pattern": (tiny_llama, dict(target_modules=["q_proj", "gate_proj"], alpha_pattern={"gate_proj": 32})),
+    "gpt2_fan_in_fan_out": (tiny_gpt2, dict(target_modules=["c_attn", "c_fc"], fan_in_fan_out=True)),
+}
+
+@pytest.mark.parametrize("case", CASES)
+def test_streaming_merge_matches_merge_and_unload(case, tmp_path, monkeypatch):
+    build, lora_kwargs = CASES[case]
+    torch.manual_seed(0)
+    base = build()
+    base.save_pretrained(tmp_path / "base")
+
+    # init_lora_weights=False：B 不為零，合併才會真的改動權重
+    config = peft.LoraConfig(r=4, lora_alpha=8, init_lora_weights=False, **lora_kwargs)
+    model = peft.get_peft_model(base, config)
+    model.save_pretrained(tmp_path / "adapter")
+    expected = {name: tensor.detach() for name, tensor in model.merge_and_unload().state_dict().items()}
+
+    # 小模型只有一個 shard；縮小 ROW_CHUNK 以涵蓋分段寫入
+    monkeypatch.setattr("lora_merge.ROW_CHUNK", 5)
+    merge_lora_streaming(str(tmp_path / "adapter"), str(tmp_path / "merged"), base_model=str(tmp_path / "base"))
+    merged = load_file(tmp_path / "merged" / "model.safetensors")
+    original = load_file(tmp_path / "base" / "model.safetensors")
+
+    changed = [name for name in merged if not torch.equal(merged[name], original[name])]
+    assert changed and all(name.split(".")[-2] in lora_kwargs["target_modules"] for name in changed)
+    for name, tensor in merged.items():
+        torch.testing.assert_close(tensor, expected[name], rtol=1e-5, atol=1e-6)
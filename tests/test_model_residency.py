@@ -0,0 +1,78 @@
+# 檔案路徑: tests/test_model_residency.py
+# ModelResidency 對替身伺服器 (--load-time 模擬載入時間、--max-loaded 1 模擬只放得下一個模型的 VRAM)
+import asyncio
+from datetime import datetime, timezone
+
+from conftest import fake_ollama
+from model_residency import ModelResidency, plan_by_model
+from ollama_client import OllamaClient
+
+LOAD_TIME = 0.2
+SERVER = ("--models", "a", "b", "--load-time", str(LOAD_TIME), "--max-loaded", "1", "--tokens-per-s", "2000")
+# 交錯排列的工作，未分組時每換一次模型就要重新載入
+JOBS = [("a", 0), ("b", 0), ("a", 1), ("b", 1), ("a", 2)]
+
+async def run(client, residency, groups):
+    for n, (model, jobs) in enumerate(groups):
+        # 同一個模型的多個工作同時要求載入，只會載入一次
+        await asyncio.gather(*(residency.ensure_loaded(model) for _ in jobs))
+        for _ in jobs:
+            await client.generate(model, "Write a mux", keep_alive=residency.keep_alive)
+        await residency.release(model, last=n == len(groups) - 1)
+
+def test_grouped_run_loads_each_model_once_and_times_it():
+    async def main():
+        async with fake_ollama(*SERVER) as app, OllamaClient(app.url) as client:
+            residency = ModelResidency(client)
+            groups = plan_by_model(JOBS, key=lambda job: job[0])
+            await run(client, residency, groups)
+            return app, residency, groups, await client.running()
+
+    app, residency, groups, running = asyncio.run(main())
+    assert [model for model, _ in groups] == ["a", "b"]
+    assert [len(jobs) for _, jobs in groups] == [3, 2]
+    # 每個模型只冷啟動一次，沒有來回換入換出
+    assert app.loads == 2
+    assert set(residency.loads) == {"a", "b"}
+    for load in residency.loads.values():
+        assert load["load_time"] >= LOAD_TIME * 0.9 and not load["was_resident"]
+    # 非最後的模型已卸載；最後一個改回閒置的 keep_alive (5m)
+    assert [m["name"] for m in running] == ["b"]
+    remaining = (datetime.fromisoformat(running[0]["expires_at"]) - datetime.now(timezone.utc)).total_seconds()
+    assert 240 < remaining <= 300
+
+def test_interleaved_jobs_swap_models_without_grouping():
+    async def main():
+        async with fake_ollama(*SERVER) as app, OllamaClient(app.url) as client:
+            for model, _ in JOBS:
+                await client.generate(model, "Write a mux")
+            return app
+
+    assert asyncio.run(main()).loads == len(JOBS)
+
+def test_ensure_loaded_times_the_cold_load_only_once():
+    async def main():
+        async with fake_ollama(*SERVER) as app, OllamaClient(app.url) as client:
+            residency = ModelResidency(client)
+            first = await residency.ensure_loaded("a")
+            second = await residency.ensure_loaded("a")
+            return app, first, second
+
+    app, first, second = asyncio.run(main())
+    assert first == second >= LOAD_TIME * 0.9
+    assert app.loads == 1
+
+def test_release_keeps_a_model_that_was_resident_before_the_run():
+    async def main():
+        async with fake_ollama(*SERVER) as app, OllamaClient(app.url) as client:
+            await client.load("a")
+            residency = ModelResidency(client)
+            await residency.ensure_loaded("a")
+            await residency.release("a")
+            # 從未載入 (例如全部來自快取) 的模型不需要處理
+            await residency.release("b")
+            return residency, await client.running()
+
+    residency, running = asyncio.run(main())
+    assert residency.loads["a"]["was_resident"]
+    assert [m["name"] for m in running] == ["a"]
@@ -0,0 +1,75 @@
+# 檔案路徑: tests/test_ollama_client.py
+# OllamaClient 對替身伺服器 (scripts/fake_ollama_server.py，同一個 event loop 內執行) 的並行上限、連線重用與重試
+import asyncio
+from contextlib import aclosing
+
+import pytest
+
+from conftest import fake_ollama
+from ollama_client import OllamaClient, OllamaError
+
+MODEL = "verilog-llama3-q3"
+# 每個 token 5ms：請求夠長，才會真的同時進行
+FAST = ("--tokens-per-s", "200", "--parallel", "8")
+
+async def consume(client, prompt="Write a mux"):
+    async with aclosing(client.generate_stream(MODEL, prompt)) as stream:
+        return [chunk async for chunk in stream]
+
+def test_concurrency_cap_and_connection_reuse():
+    async def main():
+        async with fake_ollama(*FAST) as app, OllamaClient(app.url, concurrency=3) as client:
+            results = await asyncio.gather(*(client.generate(MODEL, f"prompt {i}") for i in range(12)))
+            streams = await asyncio.gather(*(consume(client, f"stream {i}") for i in range(6)))
+            return app, client, results, streams
+
+    app, client, results, streams = asyncio.run(main())
+    assert all(r["done"] and "endmodule" in r["response"] for r in results)
+    assert all(chunks[-1]["done"] for chunks in streams)
+    assert app.max_in_flight == 3
+    assert client.requests == 18
+    # 連線在請求之間重用，從未超過並行上限
+    assert client.connections_opened == app.connections <= 3
+    assert client.retries_used == 0
+
+def test_503_is_retried_with_backoff():
+    async def main():
+        async with fake_ollama(*FAST, "--fail-first", "2") as app, \
+                OllamaClient(app.url, retries=3, backoff=0.01) as client:
+            return app, client, await client.generate(MODEL, "Write a mux")
+
+    app, client, result = asyncio.run(main())
+    assert result["done"]
+    assert client.retries_used == 2
+    assert app.generate_requests == 3
+    assert client.requests == 1
+
+def test_503_gives_up_after_the_last_retry():
+    async def main():
+        async with fake_ollama(*FAST, "--fail-first", "10") as app, \
+                OllamaClient(app.url, retries=2, backoff=0.01) as client:
+            with pytest.raises(OllamaError) as excinfo:
+                await client.generate(MODEL, "Write a mux")
+            return client, excinfo.value
+
+    client, error = asyncio.run(main())
+    assert error.status == 503
+    assert client.retries_used == 2
+
+def test_connection_dropped_mid_stream_raises_ollama_error():
+    async def main():
+        async with fake_ollama(*FAST, "--drop-after", "3") as app, OllamaClient(app.url) as client:
+            received = []
+            with pytest.raises(OllamaError, match="interrupted"):
+                async with aclosing(client.generate_stream(MODEL, "Write a mux")) as stream:
+                    async for chunk in stream:
+                        received.append(chunk)
+            # 斷掉的連線不會回到連線池；之後的請求照常進行
+            app.args.drop_after = -1
+            chunks = await consume(client)
+            return client, received, chunks
+
+    client, received, chunks = asyncio.run(main())
+    assert len(received) == 3 and not any(c["done"] for c in received)
+    assert chunks[-1]["done"]
+    assert client.connections_opened == 2
@@ -0,0 +1,122 @@
+# 檔案路徑: tests/test_pack_tokens.py
+import pytest
+import torch
+
+from pack_tokens import (
+    LengthGroupedBatchSampler, PackedCollator, apply_overlong_policy, block_attention_mask, packed_mask_dtype,
+    summarize_overlong, verify_packed_isolation,
+)
+
+transformers = pytest.importorskip("transformers")
+
+def tiny_llama(implementation):
+    torch.manual_seed(0)
+    config = transformers.LlamaConfig(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, attn_implementation=implementation,
+    )
+    return transformers.LlamaForCausalLM(config)
+
+def test_block_mask_is_causal_within_samples():
+    # 兩個樣本 (3 + 2) 加上 1 個 padding
+    position_ids = torch.tensor([[0, 1, 2, 0, 1, 0]])
+    mask = block_attention_mask(position_ids)[0, 0]
+    expected = torch.tensor([
+        [1, 0, 0, 0, 0, 0],
+        [1, 1, 0, 0, 0, 0],
+        [1, 1, 1, 0, 0, 0],
+        [0, 0, 0, 1, 0, 0],
+        [0, 0, 0, 1, 1, 0],
+        [0, 0, 0, 0, 0, 1],
+    ], dtype=torch.bool)
+    assert torch.equal(mask, expected)
+    additive = block_attention_mask(position_ids, torch.float32)[0, 0]
+    assert torch.equal(additive == 0, expected)
+
+def test_collator_adds_mask_only_when_asked():
+    feature = {"input_ids": torch.arange(1, 6), "position_ids": torch.tensor([0, 1, 2, 0, 1]),
+               "labels": torch.arange(1, 6)}
+    assert "attention_mask" not in PackedCollator(0, 8)([feature])
+    batch = PackedCollator(0, 8, torch.bool)([feature])
+    assert batch["attention_mask"].shape == (1, 1, 8, 8)
+
+@pytest.mark.parametrize("implementation", ["sdpa", "eager"])
+def test_block_mask_isolates_packed_samples(implementation):
+    model = tiny_llama(implementation)
+    collator = PackedCollator(0, 32, packed_mask_dtype(model))
+    assert verify_packed_isolation(model, collator, tolerance=1e-4) < 1e-4
+    assert model.training
+
+def test_leaking_attention_fails_loudly():
+    # 只靠 position_ids 時 SDPA 不會隔離樣本
+    model = tiny_llama("sdpa")
+    with pytest.raises(RuntimeError, match="attend"):
+        verify_packed_isolation(model, PackedCollator(0, 32), tolerance=1e-4)
+
+class CharTokenizer:
+    # 每個字元一個 token，offset_mapping 與字元位置一一對應
+    eos_token_id = 0
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        return {"input_ids": [ord(c) for c in text], "offset_mapping": [(i, i + 1) for i in range(len(text))]}
+
+def encode(text):
+    return CharTokenizer()(text)["input_ids"]
+
+@pytest.mark.parametrize("policy", ["truncate", "drop", "module", "split"])
+def test_sample_of_exactly_max_length_fits(policy):
+    ids = list(range(8))
+    assert apply_overlong_policy(CharTokenizer(), "x" * 8, ids, 8, policy) == ([ids], "fit")
+
+def test_overlong_policies_one_token_past_the_limit():
+    ids = list(range(9))
+    assert apply_overlong_policy(None, "", ids, 8, "truncate") == ([ids[:8]], "truncate")
+    assert apply_overlong_policy(None, "", ids, 8, "drop") == ([], "drop")
+    assert apply_overlong_policy(None, "", ids, 8, "split") == ([ids[:8], ids[8:]], "split")
+    # 剛好是兩倍長時切成兩段，不會多出空的一段
+    assert apply_overlong_policy(None, "", list(range(16)), 8, "split")[0] == [list(range(8)), list(range(8, 16))]
+
+def test_module_policy_cuts_after_the_last_endmodule_that_fits():
+    text = "module a; endmodule module b; endmodule"
+    ids = encode(text)
+    # 第一個 endmodule 結束於第 19 個字元，加上 EOS 剛好 20
+    assert apply_overlong_policy(CharTokenizer(), text, ids, 20, "module") == ([ids[:19] + [0]], "module")
+    # 少一個位置就放不下，退回直接截斷
+    assert apply_overlong_policy(CharTokenizer(), text, ids, 19, "module") == ([ids[:19]], "module_fallback")
+
+def test_summarize_overlong_counts_drops_from_the_total():
+    actions = ["fit", "fit", "truncate", "module", "module_fallback", "split_first", "split", "split", "split_first", "split"]
+    # 9 筆輸入：2 fit、1 truncate、1 module、1 fallback、2 筆被切成 5 段；另有 2 筆被丟棄
+    assert summarize_overlong(actions, total=9) == {
+        "total": 9, "overlong": 7, "truncate": 1, "module": 1, "module_fallback": 1,
+        "split_samples": 2, "split_chunks": 5, "drop": 2,
+    }
+    assert summarize_overlong([], total=3)["drop"] == 3
+
+LENGTHS = [3, 4, 5, 8, 9, 100, 1, 2, 6, 7, 4, 12, 8, 5, 3]
+
+def epoch(sampler, n):
+    sampler.set_epoch(n)
+    return list(sampler)
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_length_grouped_sampler_stays_within_buckets(drop_last):
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=2, boundaries=[8, 4], drop_last=drop_last)
+    batches = epoch(sampler, 0)
+    assert len(batches) == len(sampler)
+    # 邊界值屬於較低的 bucket：1-4、5-8、>8
+    assert all(len({min(2, (LENGTHS[i] - 1) // 4) for i in batch}) == 1 for batch in batches)
+    indices = [i for batch in batches for i in batch]
+    assert len(indices) == len(set(indices))
+    if drop_last:
+        assert all(len(batch) == 2 for batch in batches)
+    else:
+        # 每筆樣本每個 epoch 剛好出現一次
+        assert sorted(indices) == list(range(len(LENGTHS)))
+
+def test_length_grouped_sampler_order_depends_on_seed_and_epoch():
+    sampler = LengthGroupedBatchSampler(LENGTHS, batch_size=2, boundaries=[4, 8])
+    first = epoch(sampler, 0)
+    assert epoch(sampler, 0) == first
+    assert epoch(sampler, 1) != first
+    assert epoch(LengthGroupedBatchSampler(LENGTHS, batch_size=2, boundaries=[4, 8], seed=1), 0) != first
@@ -0,0 +1,48 @@
+# 檔案路徑: tests/test_process_data.py
+import json
+
+import pytest
+
+datasets = pytest.importorskip("datasets")
+
+from conftest import load_script
+
+process_data = load_script("2_process_data.py")
+
+def row(rank, desc="Write a counter", **extra):
+    return json.dumps({"rank": rank, "description": desc, **extra})
+
+# 邊界情況：門檻本身、字串 rank、NaN / Infinity、缺 rank、壞 JSON、非物件 JSON、None、超大整數
+DESCRIPTIONS = [
+    row(18), row(17.99), row("20"), row("18.0"), row("high"), row(None), row([19]),
+    '{"rank": NaN, "description": "nan rank"}', '{"rank": "nan", "description": "nan string"}',
+    '{"rank": Infinity, "description": "inf rank"}', '{"rank": -Infinity}',
+    json.dumps({"description": "missing rank"}), row(25, desc=""), "{not json", "[1, 2]", "", None,
+    '{"rank": 1' + "0" * 400 + "}",
+]
+
+def test_batched_and_per_row_paths_agree_on_edge_ranks(monkeypatch):
+    monkeypatch.setattr(process_data, "NUM_PROC", 1)
+    ds = datasets.Dataset.from_dict({
+        "description": DESCRIPTIONS,
+        "code": [f"module m{i}; endmodule" for i in range(len(DESCRIPTIONS))],
+    })
+    batched, _ = process_data.process_pyranet(ds, min_rank=18)
+    per_row, _ = process_data.process_pyranet(ds, per_row=True, min_rank=18)
+    assert batched.to_list() == per_row.to_list()
+    # 18、"20"、"18.0"、Infinity 與空 description 的 25 通過；NaN 兩條路徑都丟掉
+    assert [r["code"] for r in batched] == [f"module m{i}; endmodule" for i in (0, 2, 3, 9, 12)]
+    assert process_data.DEFAULT_INSTRUCTION in batched[4]["text"]
+
+def test_shard_size_counts_only_selected_rows(tmp_path, monkeypatch):
+    ds = datasets.Dataset.from_dict({"text": ["x" * 1000] * 100})
+    selected = ds.select(range(0, 100, 10))
+    # 底層表仍有 100 筆，但只選了 10 筆
+    assert selected.data.num_rows == 100
+    assert process_data.selected_nbytes(selected) == pytest.approx(selected.flatten_indices().data.nbytes, rel=0.05)
+    assert process_data.selected_nbytes(ds.select([])) == 0
+
+    monkeypatch.setattr(process_data, "MAX_SHARD_BYTES", 4000)
+    manifest = process_data.write_parquet_shards(selected, str(tmp_path), {"pyranet": 10})
+    assert len(manifest["shards"]) == 3
+    assert [s["num_rows"] for s in manifest["shards"]] == [4, 3, 3]
@@ -0,0 +1,89 @@
+# 檔案路徑: tests/test_train_metrics.py
+# 在 CPU 上以隨機初始化的小模型跑幾步一般的 transformers Trainer，檢查 ThroughputCallback 的 JSONL 與摘要
+import json
+import time
+
+import pytest
+import torch
+
+from train_metrics import ThroughputCallback
+
+transformers = pytest.importorskip("transformers")
+
+PAD = 0
+LENGTHS = [5, 9, 3, 12, 7, 4, 10, 6]
+BATCH_SIZE = 2
+GRAD_ACCUM = 2
+# 每個 micro-batch 的 collate 額外延遲，應計入資料讀取時間而非 forward/backward
+DATA_DELAY = 0.05
+
+class SlowPaddingCollator:
+    def __call__(self, features):
+        time.sleep(DATA_DELAY)
+        longest = max(len(f["input_ids"]) for f in features)
+        input_ids = torch.full((len(features), longest), PAD)
+        attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for i, f in enumerate(features):
+            input_ids[i, :len(f["input_ids"])] = torch.tensor(f["input_ids"])
+            attention_mask[i, :len(f["input_ids"])] = 1
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+def run_trainer(output_dir):
+    torch.manual_seed(0)
+    model = transformers.LlamaForCausalLM(transformers.LlamaConfig(
+        vocab_size=64, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, pad_token_id=PAD,
+    ))
+    dataset = [{"input_ids": list(range(1, n + 1))} for n in LENGTHS]
+    args = transformers.TrainingArguments(
+        output_dir=str(output_dir), per_device_train_batch_size=BATCH_SIZE,
+        gradient_accumulation_steps=GRAD_ACCUM, num_train_epochs=1, logging_steps=1,
+        save_strategy="no", report_to=[], use_cpu=True, seed=0,
+    )
+    trainer = transformers.Trainer(model=model, args=args, train_dataset=dataset, data_collator=SlowPaddingCollator())
+    callback = ThroughputCallback(str(output_dir / "throughput.jsonl"), pad_token_id=PAD).attach(trainer)
+    trainer.train()
+    return callback
+
+def test_cpu_trainer_run_writes_step_records_and_summary(tmp_path):
+    callback = run_trainer(tmp_path)
+    with open(tmp_path / "throughput.jsonl") as f:
+        records = [json.loads(line) for line in f]
+    steps = len(LENGTHS) // (BATCH_SIZE * GRAD_ACCUM)
+    assert [r["step"] for r in records] == list(range(1, steps + 1))
+    assert records == callback.records
+
+    # accelerate 的 dataloader 會先多取一個 batch，所以各步的資料時間不均，但總和涵蓋所有 micro-batch
+    micro_batches = len(LENGTHS) // BATCH_SIZE
+    assert sum(r["data_time"] for r in records) >= micro_batches * DATA_DELAY * 0.9
+    for r in records:
+        assert r["fwd_bwd_time"] > 0 and r["optimizer_time"] >= 0
+        assert r["data_time"] + r["fwd_bwd_time"] + r["optimizer_time"] == pytest.approx(r["step_time"], rel=1e-6)
+        assert r["real_tokens_per_s"] == pytest.approx(r["real_tokens"] / r["step_time"])
+        assert r["tokens_per_s"] == pytest.approx((r["real_tokens"] + r["padded_tokens"]) / r["step_time"])
+        assert r["memory_source"] == "rss" and r["peak_memory_mb"] > 0
+    # 一個 epoch 看過每個樣本一次：真實 token 總數與順序無關，padding 則取決於分組
+    real = sum(r["real_tokens"] for r in records)
+    padded = sum(r["padded_tokens"] for r in records)
+    assert real == sum(LENGTHS)
+    assert padded > 0
+
+    with open(tmp_path / "throughput_summary.json") as f:
+        summary = json.load(f)
+    assert summary["steps"] == steps
+    assert summary["real_tokens"] == real and summary["padded_tokens"] == padded
+    assert summary["padding_ratio"] == pytest.approx(padded / (real + padded))
+    fractions = summary["data_fraction"] + summary["fwd_bwd_fraction"] + summary["optimizer_fraction"]
+    assert fractions == pytest.approx(1.0, rel=1e-6)
+    assert summary["data_fraction"] > 0
+    assert summary["step_time_p50"] <= summary["step_time_p90"]
+
+def test_count_tokens_falls_back_to_pad_id_for_block_masks():
+    callback = ThroughputCallback("unused.jsonl", pad_token_id=PAD)
+    input_ids = torch.tensor([[5, 6, 7, PAD], [8, PAD, PAD, PAD]])
+    # packed 模式的 4 維 block mask 不能拿來計數，改看 pad token
+    callback.count_tokens({"input_ids": input_ids, "attention_mask": torch.ones(2, 1, 4, 4, dtype=torch.bool)})
+    assert (callback._real_tokens, callback._total_tokens) == (4, 8)
+    callback.count_tokens({"input_ids": input_ids, "attention_mask": (input_ids != PAD).long()})
+    assert (callback._real_tokens, callback._total_tokens) == (8, 16)
@@ -0,0 +1,89 @@
+# 檔案路徑: tests/test_train_resume.py
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("transformers")
+
+from conftest import load_script
+from train_resume import PREEMPTED_EXIT_CODE, checkpoint_step, latest_checkpoint
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "preemptible_train.py")
+MAX_STEPS = 20
+
+def make_checkpoint(output_dir, step, complete=True):
+    path = output_dir / f"checkpoint-{step}"
+    path.mkdir()
+    if complete:
+        (path / "trainer_state.json").write_text(json.dumps({"global_step": step}))
+    return str(path)
+
+def test_latest_checkpoint_orders_numerically_and_skips_incomplete(tmp_path):
+    assert latest_checkpoint(str(tmp_path)) is None
+    make_checkpoint(tmp_path, 9)
+    expected = make_checkpoint(tmp_path, 10)
+    # 存到一半被砍 (沒有 trainer_state.json) 與名稱不符的目錄都不算
+    make_checkpoint(tmp_path, 100, complete=False)
+    (tmp_path / "checkpoint-200-tmp").mkdir()
+    assert latest_checkpoint(str(tmp_path)) == expected
+    assert checkpoint_step(expected) == 10
+
+def test_bulk_convert_prefers_final_adapter(tmp_path, monkeypatch):
+    # 4_bulk_convert_gguf.py 匯入時會改寫 HF 快取的環境變數，先交給 monkeypatch 以便測試後還原
+    monkeypatch.setenv("HF_HOME", "")
+    monkeypatch.setenv("HUGGINGFACE_HUB_CACHE", "")
+    bulk = load_script("4_bulk_convert_gguf.py")
+    assert bulk.get_latest_checkpoint(str(tmp_path)) is None
+    make_checkpoint(tmp_path, 5, complete=False)
+    assert bulk.get_latest_checkpoint(str(tmp_path)) is None
+    checkpoint = make_checkpoint(tmp_path, 4)
+    assert bulk.get_latest_checkpoint(str(tmp_path)) == checkpoint
+    (tmp_path / "final_adapter").mkdir()
+    assert bulk.get_latest_checkpoint(str(tmp_path)) == str(tmp_path / "final_adapter")
+
+def train(output_dir, stop_after=None):
+    process = subprocess.Popen([sys.executable, TRAIN_SCRIPT, str(output_dir), str(MAX_STEPS)],
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if stop_after is not None:
+        seen = output_dir / "seen.jsonl"
+        deadline = time.monotonic() + 120
+        # 等到真的開始訓練才送訊號 (匯入階段收到 SIGTERM 會直接結束)
+        while not (seen.exists() and len(seen.read_text().splitlines()) >= stop_after):
+            assert process.poll() is None and time.monotonic() < deadline, process.communicate()[0]
+            time.sleep(0.05)
+        process.send_signal(signal.SIGTERM)
+    output = process.communicate(timeout=300)[0]
+    return process.returncode, output
+
+def seen_batches(output_dir):
+    with open(output_dir / "seen.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+def test_sigterm_saves_checkpoint_and_resume_matches_uninterrupted_run(tmp_path):
+    reference_dir, preempted_dir = tmp_path / "reference", tmp_path / "preempted"
+    reference_dir.mkdir()
+    preempted_dir.mkdir()
+    returncode, output = train(reference_dir)
+    assert returncode == 0, output
+
+    returncode, output = train(preempted_dir, stop_after=3)
+    assert returncode == PREEMPTED_EXIT_CODE == 143, output
+    checkpoint = latest_checkpoint(str(preempted_dir))
+    assert checkpoint is not None
+    step = checkpoint_step(checkpoint)
+    assert 3 <= step < MAX_STEPS
+    assert not (preempted_dir / "final_adapter").exists()
+    before = seen_batches(preempted_dir)[:step]
+
+    (preempted_dir / "seen.jsonl").unlink()
+    returncode, output = train(preempted_dir)
+    assert returncode == 0, output
+    assert checkpoint_step(latest_checkpoint(str(preempted_dir))) == MAX_STEPS
+    assert (preempted_dir / "final_adapter").is_dir()
+    # 續訓跳過已訓練的 batch，資料順序與未中斷的執行完全相同
+    assert before + seen_batches(preempted_dir) == seen_batches(reference_dir)
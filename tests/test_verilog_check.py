@@ -0,0 +1,80 @@
+# 檔案路徑: tests/test_verilog_check.py
+import pytest
+
+from verilog_check import check_verilog, code_fingerprint, tokenize
+
+MUX = """module mux2 (
+    input  wire a,
+    input  wire b,
+    input  wire sel,
+    output wire y
+);
+    assign y = sel ? b : a;
+endmodule"""
+PORTS = ["a", "b", "sel", "y"]
+
+# 幾乎所有 .v 檔都以換行或註解結尾，lexer 不能把結尾當成錯誤
+@pytest.mark.parametrize("tail", ["\n", "\n\n   \n", " // done", " // done\n", " /* done */", " /* multi\n line */\n"])
+def test_trailing_whitespace_and_comments(tail):
+    result = check_verilog(MUX + tail, PORTS)
+    assert result.ok, result.status
+
+def test_line_numbers_skip_comments():
+    tokens, issues = tokenize("// one\n/* two\nthree */\nmodule m;\n")
+    assert not issues
+    assert tokens[0] == ("ident", "module", 4)
+
+def test_unterminated_comment_and_stray_character():
+    assert tokenize("module m; /* never closed")[1] == ["line 1: unterminated block comment"]
+    assert tokenize("module m;\n\x01")[1] == ["line 2: unexpected character '\\x01'"]
+
+def test_fingerprint_ignores_layout_and_comments():
+    reformatted = MUX.replace("    assign", "  // drive the output\n  assign") + "\n"
+    assert code_fingerprint(MUX) == code_fingerprint(reformatted)
+    assert code_fingerprint(MUX) != code_fingerprint(MUX.replace("b : a", "a : b"))
+
+def test_structural_failures():
+    assert not check_verilog(MUX.replace("endmodule", ""), PORTS).ok
+    assert not check_verilog(MUX, PORTS + ["clk"]).ok
+
+COUNTER = """module counter (input clk, input rst, input [1:0] op, output reg [3:0] q);
+    always @(posedge clk) begin
+        if (rst) q <= 0;
+        else case (op)
+            2'd0: q <= q + 1;
+            default: q <= q;
+        endcase
+    end
+endmodule"""
+
+def test_counter_passes():
+    assert check_verilog(COUNTER, ["clk", "rst", "q"]).ok
+
+@pytest.mark.parametrize("broken, issue", [
+    # 少了 end：begin 一路開到 endmodule
+    (COUNTER.replace("        endcase\n    end\n", "        endcase\n"), "'endmodule' closes 'begin'"),
+    # 多一個 end
+    (COUNTER.replace("    end\n", "    end\n    end\n"), "'end' closes 'module'"),
+    # endcase 寫成 end
+    (COUNTER.replace("endcase", "end"), "'end' closes 'case'"),
+    (COUNTER.replace("        endcase\n", ""), "'end' closes 'case'"),
+])
+def test_unbalanced_blocks_fail(broken, issue):
+    result = check_verilog(broken)
+    assert not result.ok
+    assert issue in result.status
+
+def test_multiple_drivers_fail():
+    code = COUNTER.replace("endmodule", "    always @(posedge clk) q <= 4'd0;\nendmodule")
+    assert "'q' is driven from multiple blocks (lines 2, 9)" in check_verilog(code).status
+    code = MUX.replace("endmodule", "    assign y = a;\nendmodule")
+    assert "'y' is driven from multiple blocks" in check_verilog(code).status
+    code = MUX.replace("endmodule", "    assign a = b;\nendmodule")
+    assert "input 'a' is driven" in check_verilog(code).status
+
+def test_continuous_assign_declares_an_implicit_net():
+    code = MUX.replace("    assign y = sel ? b : a;", "    assign w = sel ? b : a;\n    assign y = w;")
+    assert check_verilog(code, PORTS).ok
+    # 只在 continuous assign 左側才是隱式宣告；`default_nettype none 之後必須明確宣告
+    assert "'w' is not declared" in check_verilog("`default_nettype none\n" + code, PORTS).status
+    assert "'w' is not declared" in check_verilog(MUX.replace("sel ? b : a", "w"), PORTS).status
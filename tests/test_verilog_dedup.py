@@ -0,0 +1,66 @@
+# 檔案路徑: tests/test_verilog_dedup.py
+import pytest
+
+from verilog_dedup import deduplicate, interface_names, normalize_verilog
+
+datasets = pytest.importorskip("datasets")
+
+COUNTER = """module {name}(input {clk}, input {rst}, output reg [7:0] {out});
+  // next value
+  wire [7:0] {tmp} = {out} + 8'd1;
+  always @(posedge {clk}) begin
+    if ({rst}) {out} <= 8'd0;
+    else {out} <= {tmp};
+  end
+endmodule
+"""
+MUX = """module {name}(input [3:0] {clk}, input {rst}, output [3:0] {out});
+  wire [3:0] {tmp};
+  assign {tmp} = {rst} ? ~{clk} : {clk};
+  assign {out} = {tmp};
+endmodule
+"""
+SHIFT = """module {name}({clk}, {rst}, {out});
+  input {clk};
+  input {rst};
+  output [7:0] {out};
+  reg [7:0] {tmp};
+  always @(posedge {clk}) {tmp} <= {{{tmp}[6:0], {rst}}};
+  assign {out} = {tmp};
+endmodule
+"""
+NAMES = [
+    ("tick", "clear", "value"), ("clk", "reset", "count"), ("sys_clk", "rst_n", "cnt"), ("ck", "clr", "q"),
+    ("pix_clk", "vsync", "line"), ("baud", "abort", "bits"), ("strobe", "flush", "level"), ("clk_i", "rst_i", "dat_o"),
+]
+
+def corpus():
+    # 三種結構 × 8 組不同的模組 / 埠名稱：結構相同但介面不同，都應保留
+    modules = []
+    for kind, template in (("counter", COUNTER), ("mux", MUX), ("shift", SHIFT)):
+        for i, (clk, rst, out) in enumerate(NAMES):
+            modules.append(template.format(name=f"{kind}_{out}_{i}", clk=clk, rst=rst, out=out, tmp="state"))
+    return modules
+
+def test_normalize_keeps_module_and_port_names():
+    code = MUX.format(name="inv_mux", clk="data", rst="invert", out="result", tmp="stage")
+    tokens = normalize_verilog(code)
+    assert {"inv_mux", "data", "invert", "result"} <= set(tokens)
+    assert "stage" not in tokens and tokens.count("ID") == 3
+
+def test_interface_names_cover_non_ansi_ports():
+    code = SHIFT.format(name="sr", clk="clk", rst="din", out="q", tmp="shreg")
+    assert interface_names(normalize_verilog(code)) == {"sr", "clk", "din", "q"}
+
+def test_distinct_modules_survive_and_renamed_copies_are_removed():
+    originals = corpus()
+    # 真正的重複：只改了註解、空白與內部訊號名稱
+    copies = [code.replace("// next value", "// increment").replace("state", "r_next").replace("  ", "    ")
+              for code in originals[::3]]
+    ds = datasets.Dataset.from_dict({"code": originals + copies})
+    kept, report = deduplicate(ds)
+    assert report["total"] == len(originals) + len(copies)
+    assert report["removed"] == len(copies)
+    assert report["removed_fraction"] == pytest.approx(len(copies) / len(ds))
+    assert kept["code"] == originals
+    assert sorted(i for c in report["clusters"] for i in c["removed"]) == list(range(len(originals), len(ds)))
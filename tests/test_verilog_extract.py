@@ -0,0 +1,85 @@
+# 檔案路徑: tests/test_verilog_extract.py
+# 以 Ollama /api/generate 串流格式錄下的 NDJSON (tests/fixtures/streams) 逐 chunk 餵給 extractor
+import asyncio
+import json
+import os
+
+import pytest
+
+from conftest import load_script
+from verilog_extract import VerilogStreamExtractor, extract_code
+
+STREAMS = os.path.join(os.path.dirname(__file__), "fixtures", "streams")
+
+def load_stream(name):
+    with open(os.path.join(STREAMS, f"{name}.ndjson")) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def replay(name, target_module=None):
+    """回傳 (extractor, 完成時已讀的 chunk 數, 總 chunk 數)；未完成時為 None。"""
+    chunks = [c for c in load_stream(name) if not c["done"]]
+    extractor = VerilogStreamExtractor(target_module)
+    for i, chunk in enumerate(chunks, 1):
+        if extractor.feed(chunk["response"]):
+            return extractor, i, len(chunks)
+    extractor.finish()
+    return extractor, (len(chunks) if extractor.done else None), len(chunks)
+
+# (串流, 目標 module, 程式碼應包含, 程式碼不應包含, 完成後是否應還有剩餘 chunk)
+CASES = [
+    ("fenced_with_explanation", None, ["module mux2", "endmodule"], ["always @(*)"], True),
+    ("fenced_helper_after_target", "top", ["module top", "module inverter"], ["```"], True),
+    ("unfenced", None, ["module counter", "endmodule"], ["wraps around"], True),
+    ("prose_mentions_module", None, ["module mux2"], ["multiplexer"], True),
+    ("closing_fence_without_newline", None, ["module mux2", "endmodule"], ["```"], False),
+    ("endmodule_in_comment", None, ["always @(posedge clk) q <= d;", "endmodule"], ["Done."], True),
+    ("named_target_second_block", "mux2", ["module mux2"], ["module tb"], True),
+]
+
+@pytest.mark.parametrize("name, target, present, absent, tail_left", CASES)
+def test_recorded_streams(name, target, present, absent, tail_left):
+    extractor, done_at, total = replay(name, target)
+    assert done_at is not None, "target module never reported complete"
+    assert (done_at < total) == tail_left
+    for text in present:
+        assert text in extractor.code
+    for text in absent:
+        assert text not in extractor.code
+    # 與整段輸出一次抽取 (快取路徑) 的結果一致
+    full = "".join(c["response"] for c in load_stream(name))
+    assert extract_code(full, target) == extractor.code
+
+def test_comment_does_not_close_module_early():
+    extractor, done_at, total = replay("endmodule_in_comment")
+    assert extractor.code.rstrip().endswith("endmodule")
+    assert extractor.code.count("endmodule") == 3
+
+def test_truncated_stream_never_completes():
+    extractor, done_at, _ = replay("truncated")
+    assert done_at is None
+    assert extractor.code == ""
+
+# --- 5_benchmark.run_ollama: 提前中斷時伺服器統計 (prompt-eval) 應標為未知而非 0 ---
+class ReplayClient:
+    def __init__(self, name):
+        self.chunks = load_stream(name)
+
+    async def generate_stream(self, model, prompt, options=None, keep_alive=None):
+        for chunk in self.chunks:
+            yield chunk
+
+@pytest.mark.parametrize("early_stop", [True, False])
+def test_run_ollama_metrics(early_stop):
+    benchmark = load_script("5_benchmark.py")
+    client = ReplayClient("fenced_with_explanation")
+    _, code, metrics = asyncio.run(benchmark.run_ollama(client, "m", "p", early_stop=early_stop))
+    assert "module mux2" in code
+    assert metrics["stopped_early"] == early_stop
+    if early_stop:
+        assert metrics["prompt_tokens"] is None and metrics["prompt_tokens_per_s"] is None
+        assert metrics["total_tokens"] is None
+        assert 0 < metrics["gen_tokens"] < len(client.chunks) - 1
+    else:
+        assert metrics["prompt_tokens"] == 87
+        assert metrics["total_tokens"] == 87 + metrics["gen_tokens"]
+        assert metrics["tail_tokens"] > 0